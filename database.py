@@ -1,10 +1,18 @@
 # database.py (version optimisée)
 import sqlite3
 import os
-import hashlib
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+import copy
+import functools
+import mimetypes
+import queue
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Iterable, Tuple, Callable
 import bcrypt
+from migrate_database import run_migrations
 try:
     from cryptography.fernet import Fernet
     CRYPTO_AVAILABLE = True
@@ -12,6 +20,225 @@ except ImportError:
     print("⚠️ cryptography non installé - chiffrement désactivé")
     CRYPTO_AVAILABLE = False
 
+
+def file_type(filename: str) -> Tuple[str, str]:
+    """Extension normalisée (minuscules, sans point) et type MIME d'un nom de fichier"""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    mime_type = mimetypes.guess_type(filename, strict=False)[0] or 'application/octet-stream'
+    return extension, mime_type
+
+
+def _freeze(value):
+    """Rendre hachables les arguments d'une requête (listes -> tuples)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+class QueryCache:
+    """
+    Cache LRU borné des résultats de lecture
+    
+    Chaque entrée porte la génération d'écriture au moment où la requête a
+    été lancée; toute transaction validée incrémente la génération, ce qui
+    périme d'un coup toutes les entrées antérieures.
+    """
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries: "OrderedDict[Any, Tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] != self.generation:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, copy.deepcopy(entry[1])
+    
+    def put(self, key, value, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return  # Une écriture a eu lieu pendant la requête
+            self._entries[key] = (generation, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self):
+        """Nouvelle génération: toutes les entrées existantes sont périmées"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+def cached_query(method):
+    """Servir une lecture depuis le cache de Database tant qu'aucune écriture n'a eu lieu"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Le thread écrivain lit des données non encore validées: pas de cache
+        if self.writer.in_writer_thread():
+            return method(self, *args, **kwargs)
+        
+        key = (method.__name__, _freeze(args), _freeze(kwargs))
+        hit, value = self.query_cache.get(key)
+        if hit:
+            return value
+        
+        generation = self.query_cache.generation
+        value = method(self, *args, **kwargs)
+        self.query_cache.put(key, value, generation)
+        return value
+    return wrapper
+
+
+class WriteQueue:
+    """
+    Thread écrivain unique de la base de données
+    
+    Les écritures sont mises en file et regroupées: celles qui arrivent à
+    quelques millisecondes d'intervalle partagent une seule transaction, donc
+    un seul fsync. Chaque écriture s'exécute dans un SAVEPOINT, si bien qu'un
+    échec n'annule que l'opération fautive. Les futures ne sont résolues
+    qu'après le commit.
+    """
+    
+    def __init__(self, db: 'Database', coalesce_window: float = 0.005, max_batch: int = 256):
+        self.db = db
+        self.coalesce_window = coalesce_window
+        self.max_batch = max_batch
+        
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        
+        # Blobs à supprimer du disque une fois la transaction validée
+        self.pending_removals: List[str] = []
+    
+    def in_writer_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+    
+    def submit(self, op: Callable, *args, **kwargs) -> Future:
+        """Mettre une écriture en file; la future porte la valeur retournée par `op`"""
+        future = Future()
+        if self.in_writer_thread():
+            # Écriture imbriquée: déjà dans la transaction du lot en cours
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(op(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Base de données fermée")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((future, op, args, kwargs))
+        return future
+    
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                
+                batch = [item]
+                stop = False
+                deadline = time.monotonic() + self.coalesce_window
+                while len(batch) < self.max_batch:
+                    timeout = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                
+                self._commit_batch(batch)
+                if stop:
+                    break
+        finally:
+            self.db.release_connection()
+    
+    def _commit_batch(self, batch):
+        conn = self.db.conn
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, op, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                
+                removals_mark = len(self.pending_removals)
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    outcome = (future, op(*args, **kwargs), None)
+                    conn.execute("RELEASE write_op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    del self.pending_removals[removals_mark:]
+                    outcome = (future, None, e)
+                outcomes.append(outcome)
+            conn.commit()
+            # Les lectures en cache antérieures à ce lot sont périmées
+            self.db.query_cache.invalidate()
+        except Exception as e:
+            # Échec du commit lui-même: aucune écriture du lot n'est appliquée
+            if conn.in_transaction:
+                conn.rollback()
+            self.pending_removals.clear()
+            print(f"❌ Erreur lors de la validation d'un lot d'écritures: {e}")
+            for future, _, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        removals, self.pending_removals = self.pending_removals, []
+        if removals and self.db.on_blobs_released:
+            try:
+                self.db.on_blobs_released(removals)
+            except Exception as e:
+                print(f"⚠️ Impossible de supprimer les blobs libérés: {e}")
+            removals = []
+        for filepath in removals:
+            try:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            except Exception as e:
+                print(f"⚠️ Impossible de supprimer le fichier physique: {e}")
+        
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+    
+    def close(self):
+        """Vider la file puis arrêter le thread écrivain"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+
 class Database:
     """Base de données optimisée avec recherche haute performance"""
     
@@ -23,10 +250,34 @@ class Database:
         'autre': 'Autre'
     }
     
-    def __init__(self, db_path: str = "portal.db"):
+    # Attente maximale d'un verrou d'écriture tenu par un autre thread (secondes)
+    BUSY_TIMEOUT = 30.0
+    
+    def __init__(self, db_path: str = "portal.db",
+                 progress_callback: Optional[Callable[[str, int, int], None]] = None,
+                 file_handler=None):
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        
+        # Lecture des blobs chiffrés par les migrations qui mesurent leur contenu
+        self.file_handler = file_handler
+        
+        # Une connexion par thread (WAL: lectures concurrentes, un seul écrivain)
+        self._local = threading.local()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+        
+        # Toutes les écritures passent par un thread unique (commits groupés)
+        self.writer = WriteQueue(self)
+        
+        # Résultats de lecture partagés par toutes les vues, périmés à chaque écriture
+        self.query_cache = QueryCache()
+        
+        # Appelé après une mise à la corbeille (réveil de la purge en arrière-plan)
+        self.on_trash: Optional[Callable[[], None]] = None
+        
+        # Suppression des blobs libérés après commit; par défaut os.remove,
+        # le gestionnaire de fichiers sait aussi retirer un blob de son pack
+        self.on_blobs_released: Optional[Callable[[List[str]], Any]] = None
         
         if CRYPTO_AVAILABLE:
             self.encryption_key = self._get_or_create_encryption_key()
@@ -36,10 +287,9 @@ class Database:
             self.fernet = None
             
         self.connect()
-        self.migrate_database()
-        self.create_tables()
-        self.create_search_indexes()
-        self.create_default_admin()
+        # Base à jour: une seule lecture de PRAGMA user_version
+        run_migrations(self, progress_callback)
+        self._fts_available = None
     
     def _get_or_create_encryption_key(self) -> bytes:
         """Générer ou récupérer la clé de chiffrement"""
@@ -72,208 +322,119 @@ class Database:
         except:
             return encrypted_data
     
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connexion du thread appelant (ouverte à la première utilisation)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+        return conn
+    
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        """Curseur du thread appelant"""
+        if getattr(self._local, 'cursor', None) is None:
+            self._open_connection()
+        return self._local.cursor
+    
+    def _open_connection(self) -> sqlite3.Connection:
+        # check_same_thread=False uniquement pour que close() puisse fermer les
+        # connexions des autres threads; chaque connexion reste propre à son thread
+        conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        
+        # Optimisations SQLite pour la performance
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = 10000")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        # Désactivées par défaut dans SQLite: sans elles, ON DELETE CASCADE est ignoré
+        conn.execute("PRAGMA foreign_keys = ON")
+        
+        self._local.conn = conn
+        self._local.cursor = conn.cursor()
+        
+        with self._connections_lock:
+            # Libérer les connexions des threads terminés (workers d'import, recherches)
+            for thread in [t for t in self._connections if not t.is_alive()]:
+                self._connections.pop(thread).close()
+            self._connections[threading.current_thread()] = conn
+        return conn
+    
     def connect(self):
         """Établir la connexion à la base de données"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
-            self.conn.row_factory = sqlite3.Row
-            self.cursor = self.conn.cursor()
-            
-            # Optimisations SQLite pour la performance
-            self.cursor.execute("PRAGMA journal_mode = WAL")
-            self.cursor.execute("PRAGMA synchronous = NORMAL")
-            self.cursor.execute("PRAGMA cache_size = 10000")
-            self.cursor.execute("PRAGMA temp_store = MEMORY")
-            
+            self._open_connection()
             print(f"✅ Connexion optimisée à la base de données: {self.db_path}")
         except sqlite3.Error as e:
             print(f"❌ Erreur de connexion à la base de données: {e}")
             raise
     
-    def migrate_database(self):
-        """Migration automatique de la base de données avec support panels"""
-        try:
-            # Vérifier si la table folders existe
-            self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='folders'")
-            folders_exist = self.cursor.fetchone()
-            
-            if folders_exist:
-                # Vérifier si la colonne panel existe
-                self.cursor.execute("PRAGMA table_info(folders)")
-                columns = [column[1] for column in self.cursor.fetchall()]
-                
-                if 'panel' not in columns:
-                    print("🔄 Ajout de la colonne panel aux dossiers...")
-                    self.cursor.execute("ALTER TABLE folders ADD COLUMN panel TEXT DEFAULT 'interface_emp'")
-                    self.conn.commit()
-            
-            # Vérifier la table files
-            self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='files'")
-            if self.cursor.fetchone():
-                self.cursor.execute("PRAGMA table_info(files)")
-                columns = [column[1] for column in self.cursor.fetchall()]
-                
-                # Ajouter file_size si elle n'existe pas
-                if 'file_size' not in columns:
-                    print("🔄 Ajout de la colonne file_size...")
-                    self.cursor.execute("ALTER TABLE files ADD COLUMN file_size INTEGER DEFAULT 0")
-                    
-                    self.cursor.execute("SELECT id, filepath FROM files")
-                    files = self.cursor.fetchall()
-                    
-                    for file_id, filepath in files:
-                        try:
-                            if os.path.exists(filepath):
-                                size = os.path.getsize(filepath)
-                                self.cursor.execute("UPDATE files SET file_size = ? WHERE id = ?", (size, file_id))
-                        except Exception as e:
-                            print(f"⚠️ Erreur calcul taille pour {filepath}: {e}")
-                
-                # Ajouter file_hash si elle n'existe pas
-                if 'file_hash' not in columns:
-                    print("🔄 Ajout de la colonne file_hash...")
-                    self.cursor.execute("ALTER TABLE files ADD COLUMN file_hash TEXT DEFAULT ''")
-                
-                # Ajouter search_text pour la recherche full-text
-                if 'search_text' not in columns:
-                    print("🔄 Ajout de la colonne search_text pour recherche optimisée...")
-                    self.cursor.execute("ALTER TABLE files ADD COLUMN search_text TEXT DEFAULT ''")
-                    
-                    # Populer search_text avec les noms de fichiers existants
-                    self.cursor.execute("UPDATE files SET search_text = LOWER(filename)")
-            
-            # Vérifier la table admins pour bcrypt
-            self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='admins'")
-            if self.cursor.fetchone():
-                self.cursor.execute("PRAGMA table_info(admins)")
-                admin_columns = [column[1] for column in self.cursor.fetchall()]
-                
-                if 'password' in admin_columns and 'password_hash' not in admin_columns:
-                    print("🔄 Migration des mots de passe vers bcrypt...")
-                    self.cursor.execute("ALTER TABLE admins ADD COLUMN password_hash TEXT")
-                    
-                    self.cursor.execute("SELECT id, password FROM admins WHERE password_hash IS NULL OR password_hash = ''")
-                    admins = self.cursor.fetchall()
-                    
-                    for admin_id, old_password in admins:
-                        if old_password:
-                            password_hash = bcrypt.hashpw(old_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-                            self.cursor.execute("UPDATE admins SET password_hash = ? WHERE id = ?", (password_hash, admin_id))
-            
-            self.conn.commit()
-            print("✅ Migration automatique terminée")
-            
-        except Exception as e:
-            print(f"⚠️ Erreur lors de la migration: {e}")
-            self.conn.rollback()
+    def release_connection(self):
+        """Fermer la connexion du thread appelant (fin d'un thread de travail)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        self._local.cursor = None
+        with self._connections_lock:
+            self._connections.pop(threading.current_thread(), None)
+        conn.close()
     
-    def create_tables(self):
-        """Créer les tables nécessaires avec support des panels"""
-        try:
-            # Table admins avec hash bcrypt
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS admins (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email TEXT NOT NULL UNIQUE,
-                    password TEXT,
-                    password_hash TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Table folders avec panel
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS folders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    parent_id INTEGER DEFAULT NULL,
-                    panel TEXT DEFAULT 'interface_emp',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (parent_id) REFERENCES folders(id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Table files avec métadonnées et recherche optimisée
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS files (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    folder_id INTEGER NOT NULL,
-                    filename TEXT NOT NULL,
-                    filepath TEXT NOT NULL,
-                    file_size INTEGER DEFAULT 0,
-                    file_hash TEXT DEFAULT '',
-                    search_text TEXT DEFAULT '',
-                    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE
-                )
-            """)
-            
-            self.conn.commit()
-            print("✅ Tables créées avec succès")
-        except sqlite3.Error as e:
-            print(f"❌ Erreur lors de la création des tables: {e}")
-            raise
+    def submit_write(self, op: Callable, *args, **kwargs) -> Future:
+        """Confier une écriture au thread écrivain; retourne sa future"""
+        return self.writer.submit(op, *args, **kwargs)
     
-    def create_search_indexes(self):
-        """Créer des index optimisés pour la recherche haute performance"""
-        try:
-            # Index principaux pour la recherche
-            search_indexes = [
-                "CREATE INDEX IF NOT EXISTS idx_files_search_text ON files(search_text)",
-                "CREATE INDEX IF NOT EXISTS idx_files_filename_lower ON files(LOWER(filename))",
-                "CREATE INDEX IF NOT EXISTS idx_files_uploaded_at ON files(uploaded_at DESC)",
-                "CREATE INDEX IF NOT EXISTS idx_files_size ON files(file_size)",
-                "CREATE INDEX IF NOT EXISTS idx_files_folder_id ON files(folder_id)",
-                "CREATE INDEX IF NOT EXISTS idx_folders_panel ON folders(panel)",
-                "CREATE INDEX IF NOT EXISTS idx_folders_parent_id ON folders(parent_id)",
-                "CREATE INDEX IF NOT EXISTS idx_folders_name_lower ON folders(LOWER(name))",
-                
-                # Index composite pour recherches complexes
-                "CREATE INDEX IF NOT EXISTS idx_files_folder_filename ON files(folder_id, filename)",
-                "CREATE INDEX IF NOT EXISTS idx_files_size_date ON files(file_size, uploaded_at)",
-                "CREATE INDEX IF NOT EXISTS idx_folders_panel_parent ON folders(panel, parent_id)"
-            ]
-            
-            for index_sql in search_indexes:
-                self.cursor.execute(index_sql)
-            
-            # Créer une vue pour la recherche rapide
-            self.cursor.execute("""
-                CREATE VIEW IF NOT EXISTS v_files_search AS
-                SELECT 
-                    f.id,
-                    f.filename,
-                    f.filepath,
-                    f.file_size,
-                    f.search_text,
-                    f.uploaded_at,
-                    f.folder_id,
-                    fold.name as folder_name,
-                    fold.panel,
-                    fold.parent_id as folder_parent_id
-                FROM files f
-                INNER JOIN folders fold ON f.folder_id = fold.id
-            """)
-            
-            self.conn.commit()
-            print("✅ Index de recherche créés avec succès")
-        except sqlite3.Error as e:
-            print(f"⚠️ Erreur lors de la création des index: {e}")
+    def _write(self, op: Callable, *args, **kwargs):
+        """Exécuter une écriture via le thread écrivain et attendre son résultat"""
+        return self.writer.submit(op, *args, **kwargs).result()
     
-    def create_default_admin(self):
-        """Créer un compte admin par défaut avec bcrypt"""
-        try:
-            self.cursor.execute("SELECT COUNT(*) FROM admins WHERE email = ?", ('admin',))
-            if self.cursor.fetchone()[0] == 0:
-                password_hash = bcrypt.hashpw('admin'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-                self.cursor.execute(
-                    "INSERT INTO admins (email, password, password_hash) VALUES (?, ?, ?)",
-                    ('admin', 'admin', password_hash)
-                )
-                self.conn.commit()
-                print("✅ Admin par défaut créé avec hash bcrypt (admin/admin)")
-        except sqlite3.Error as e:
-            print(f"❌ Erreur lors de la création de l'admin: {e}")
+    def _execute(self, sql: str, params: Iterable = ()) -> int:
+        """Écriture SQL simple (thread écrivain); retourne le nombre de lignes touchées"""
+        self.cursor.execute(sql, params)
+        return self.cursor.rowcount
+    
+    def _executemany(self, sql: str, seq_of_params: Iterable) -> int:
+        """Écriture SQL répétée (thread écrivain); retourne le nombre de lignes touchées"""
+        self.cursor.executemany(sql, seq_of_params)
+        return self.cursor.rowcount
+    
+    @property
+    def fts_available(self) -> bool:
+        """Index plein texte présent (absent si SQLite ne gère pas FTS5/trigram)"""
+        if self._fts_available is None:
+            self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='files_fts'")
+            self._fts_available = self.cursor.fetchone() is not None
+        return self._fts_available
+    
+    def _text_search_conditions(self, fts_column: str, like_column: str, terms: List[str]):
+        """
+        Conditions de recherche de sous-chaînes (tous les termes requis)
+        
+        Les termes de 3 caractères ou plus passent par l'index trigram; les plus
+        courts, qu'un trigram ne peut pas représenter, restent en LIKE.
+        
+        Returns:
+            Tuple (liste de conditions SQL, liste de paramètres)
+        """
+        conditions = []
+        params = []
+        
+        fts_terms = [term for term in terms if len(term) >= 3] if self.fts_available else []
+        if fts_terms:
+            # Chaque terme est une phrase entre guillemets: aucun opérateur FTS5 interprété
+            match = " AND ".join(
+                f'{fts_column} : "{term.replace(chr(34), chr(34) * 2)}"' for term in fts_terms
+            )
+            conditions.append("id IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)")
+            params.append(match)
+        
+        for term in terms:
+            if term not in fts_terms:
+                conditions.append(f"{like_column} LIKE ?")
+                params.append(f"%{term}%")
+        
+        return conditions, params
     
     def authenticate_admin(self, email: str, password: str) -> bool:
         """Authentifier un administrateur avec bcrypt"""
@@ -298,60 +459,77 @@ class Database:
     def create_folder(self, name: str, parent_id: Optional[int] = None, panel: str = 'interface_emp') -> int:
         """Créer un nouveau dossier dans un panel spécifique"""
         try:
-            # Si parent_id existe, hériter du panel du parent
-            if parent_id is not None:
-                parent = self.get_folder(parent_id)
-                if parent:
-                    panel = parent['panel']
-            
-            self.cursor.execute(
-                "INSERT INTO folders (name, parent_id, panel) VALUES (?, ?, ?)",
-                (name, parent_id, panel)
-            )
-            self.conn.commit()
-            return self.cursor.lastrowid
+            return self.create_folder_async(name, parent_id, panel).result()
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de la création du dossier: {e}")
             raise
     
+    def create_folder_async(self, name: str, parent_id: Optional[int] = None,
+                            panel: str = 'interface_emp') -> Future:
+        """Comme create_folder, sans attendre: la future donne l'id du dossier"""
+        return self.submit_write(self._create_folder, name, parent_id, panel)
+    
+    def _create_folder(self, name: str, parent_id: Optional[int], panel: str) -> int:
+        # Si parent_id existe, hériter du panel du parent
+        if parent_id is not None:
+            parent = self.get_folder(parent_id)
+            if parent is None:
+                # Un dossier créé dans un sous-arbre à la corbeille serait effacé
+                # par cascade à la purge, sans libérer les blobs de ses fichiers
+                raise sqlite3.IntegrityError("Dossier parent introuvable ou à la corbeille")
+            panel = parent['panel']
+        
+        self.cursor.execute(
+            "INSERT INTO folders (name, parent_id, panel) VALUES (?, ?, ?)",
+            (name, parent_id, panel)
+        )
+        return self.cursor.lastrowid
+    
+    @cached_query
     def get_folder(self, folder_id: int) -> Optional[Dict[str, Any]]:
         """Récupérer un dossier par son ID"""
         try:
-            self.cursor.execute("SELECT * FROM folders WHERE id = ?", (folder_id,))
+            self.cursor.execute("SELECT * FROM folders WHERE id = ? AND deleted_at IS NULL", (folder_id,))
             row = self.cursor.fetchone()
             return dict(row) if row else None
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de la récupération du dossier: {e}")
             return None
     
+    @cached_query
     def get_all_folders(self, panel: Optional[str] = None) -> List[Dict[str, Any]]:
         """Récupérer tous les dossiers d'un panel spécifique"""
         try:
             if panel:
-                self.cursor.execute("SELECT * FROM folders WHERE panel = ? ORDER BY name ASC", (panel,))
+                self.cursor.execute(
+                    "SELECT * FROM folders WHERE panel = ? AND deleted_at IS NULL ORDER BY name ASC",
+                    (panel,)
+                )
             else:
-                self.cursor.execute("SELECT * FROM folders ORDER BY name ASC")
+                self.cursor.execute("SELECT * FROM folders WHERE deleted_at IS NULL ORDER BY name ASC")
             return [dict(row) for row in self.cursor.fetchall()]
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de la récupération des dossiers: {e}")
             return []
     
+    @cached_query
     def get_subfolders(self, parent_id: Optional[int] = None, panel: Optional[str] = None) -> List[Dict[str, Any]]:
         """Récupérer les sous-dossiers d'un dossier parent dans un panel"""
         try:
             if parent_id is None:
                 if panel:
                     self.cursor.execute(
-                        "SELECT * FROM folders WHERE parent_id IS NULL AND panel = ? ORDER BY name ASC",
+                        "SELECT * FROM folders WHERE parent_id IS NULL AND panel = ? AND deleted_at IS NULL "
+                        "ORDER BY name ASC",
                         (panel,)
                     )
                 else:
                     self.cursor.execute(
-                        "SELECT * FROM folders WHERE parent_id IS NULL ORDER BY name ASC"
+                        "SELECT * FROM folders WHERE parent_id IS NULL AND deleted_at IS NULL ORDER BY name ASC"
                     )
             else:
                 self.cursor.execute(
-                    "SELECT * FROM folders WHERE parent_id = ? ORDER BY name ASC",
+                    "SELECT * FROM folders WHERE parent_id = ? AND deleted_at IS NULL ORDER BY name ASC",
                     (parent_id,)
                 )
             return [dict(row) for row in self.cursor.fetchall()]
@@ -362,72 +540,339 @@ class Database:
     def update_folder(self, folder_id: int, name: str) -> bool:
         """Renommer un dossier"""
         try:
-            self.cursor.execute(
-                "UPDATE folders SET name = ? WHERE id = ?",
-                (name, folder_id)
-            )
-            self.conn.commit()
+            self.update_folder_async(folder_id, name).result()
             return True
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de la mise à jour du dossier: {e}")
             return False
     
-    def delete_folder(self, folder_id: int) -> bool:
-        """Supprimer un dossier et ses fichiers"""
+    def update_folder_async(self, folder_id: int, name: str) -> Future:
+        """Comme update_folder, sans attendre la fin de l'écriture"""
+        return self.submit_write(
+            self._execute, "UPDATE folders SET name = ? WHERE id = ?", (name, folder_id)
+        )
+    
+    def move_folder(self, folder_id: int, new_parent_id: Optional[int]) -> bool:
+        """Déplacer un dossier (et son sous-arbre) sous un nouveau parent"""
         try:
-            self.cursor.execute("SELECT filepath FROM files WHERE folder_id = ?", (folder_id,))
-            files = self.cursor.fetchall()
-            
-            for file in files:
-                try:
-                    if os.path.exists(file['filepath']):
-                        os.remove(file['filepath'])
-                except Exception as e:
-                    print(f"⚠️ Impossible de supprimer le fichier {file['filepath']}: {e}")
+            return self._write(self._move_folder, folder_id, new_parent_id)
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors du déplacement du dossier: {e}")
+            return False
+    
+    def _move_folder(self, folder_id: int, new_parent_id: Optional[int]) -> bool:
+        if new_parent_id is not None:
+            # Refuser de déplacer un dossier dans son propre sous-arbre
+            self.cursor.execute(
+                "SELECT 1 FROM folder_tree WHERE ancestor_id = ? AND descendant_id = ?",
+                (folder_id, new_parent_id)
+            )
+            if self.cursor.fetchone():
+                print("❌ Impossible de déplacer un dossier dans l'un de ses sous-dossiers")
+                return False
             
-            self.cursor.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
-            self.conn.commit()
-            return True
+            # Ni dans un dossier à la corbeille: le sous-arbre y serait perdu
+            self.cursor.execute("SELECT 1 FROM folders WHERE id = ? AND deleted_at IS NULL", (new_parent_id,))
+            if not self.cursor.fetchone():
+                print("❌ Dossier de destination introuvable ou à la corbeille")
+                return False
+        
+        self.cursor.execute(
+            "UPDATE folders SET parent_id = ? WHERE id = ?",
+            (new_parent_id, folder_id)
+        )
+        return True
+    
+    def delete_folder(self, folder_id: int) -> bool:
+        """
+        Mettre un dossier, ses sous-dossiers et leurs fichiers à la corbeille
+        
+        Seuls les dossiers sont marqués, quel que soit le nombre de fichiers.
+        Le dossier peut être restauré (restore_folder) jusqu'à ce que la purge
+        en arrière-plan efface ses fichiers et leurs blobs.
+        """
+        try:
+            trashed = self._write(self._delete_folder, folder_id)
+            self._notify_trash()
+            return trashed
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de la suppression du dossier: {e}")
             return False
     
-    def get_folder_path(self, folder_id: int) -> List[Dict[str, Any]]:
-        """Récupérer le chemin complet d'un dossier (breadcrumb)"""
-        path = []
-        current_id = folder_id
-        
-        while current_id is not None:
-            folder = self.get_folder(current_id)
-            if folder:
-                path.insert(0, folder)
-                current_id = folder['parent_id']
-            else:
-                break
+    def _delete_folder(self, folder_id: int) -> bool:
+        # Le dossier garde sa place (parent_id) pour pouvoir être restauré.
+        # Tout le sous-arbre reçoit la même date, à la microseconde: elle le
+        # distingue des sous-dossiers mis à la corbeille auparavant
+        deleted_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+        self.cursor.execute(
+            "UPDATE folders SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL",
+            (deleted_at, folder_id)
+        )
+        if self.cursor.rowcount == 0:
+            return False
         
-        return path
+        # Les ancêtres ne comptent plus le sous-arbre; ses propres compteurs
+        # ne sont plus tenus et seront recalculés s'il est restauré
+        self._add_to_ancestor_stats(folder_id, -1)
+        self.cursor.execute("""
+            UPDATE folders SET deleted_at = ?
+            WHERE deleted_at IS NULL
+              AND id IN (SELECT descendant_id FROM folder_tree WHERE ancestor_id = ? AND depth > 0)
+        """, (deleted_at, folder_id))
+        return True
     
-    # ==================== GESTION DES FICHIERS ====================
+    def _add_to_ancestor_stats(self, folder_id: int, sign: int):
+        """Ajouter (sign=1) ou retirer (sign=-1) les totaux d'un dossier à ceux de ses ancêtres"""
+        self.cursor.execute("""
+            UPDATE folder_stats SET
+                total_files = total_files + ? * (SELECT total_files FROM folder_stats WHERE folder_id = ?),
+                total_bytes = total_bytes + ? * (SELECT total_bytes FROM folder_stats WHERE folder_id = ?)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = ? AND depth > 0)
+        """, (sign, folder_id, sign, folder_id, folder_id))
+    
+    def restore_folder(self, folder_id: int) -> bool:
+        """
+        Sortir de la corbeille un dossier et le sous-arbre supprimé avec lui
+        
+        Le dossier retrouve sa place, dont le parent doit être hors de la
+        corbeille (restaurer d'abord le parent). Les sous-dossiers et fichiers
+        supprimés séparément avant lui restent à la corbeille.
+        """
+        try:
+            return self._write(self._restore_folder, folder_id)
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la restauration du dossier: {e}")
+            return False
+    
+    def _restore_folder(self, folder_id: int) -> bool:
+        self.cursor.execute("""
+            SELECT fo.deleted_at FROM folders fo
+            LEFT JOIN folders parent ON parent.id = fo.parent_id
+            WHERE fo.id = ? AND fo.deleted_at IS NOT NULL AND parent.deleted_at IS NULL
+        """, (folder_id,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return False
+        
+        self.cursor.execute("""
+            UPDATE folders SET deleted_at = NULL
+            WHERE deleted_at = ?
+              AND id IN (SELECT descendant_id FROM folder_tree WHERE ancestor_id = ?)
+        """, (row['deleted_at'], folder_id))
+        self._rebuild_folder_stats(folder_id)
+        self._add_to_ancestor_stats(folder_id, 1)
+        return True
+    
+    def _notify_trash(self, *_):
+        if self.on_trash:
+            self.on_trash()
+    
+    def rebuild_folder_stats(self) -> int:
+        """
+        Recalculer tous les compteurs de dossiers depuis les tables files et folder_tree
+        
+        Seuls les fichiers hors corbeille, dans des dossiers hors corbeille,
+        sont comptés.
+        
+        Returns:
+            Nombre de dossiers recalculés
+        """
+        return self._write(self._rebuild_folder_stats)
     
-    def add_file(self, folder_id: int, filename: str, filepath: str) -> int:
-        """Ajouter un fichier à la base de données avec métadonnées et recherche optimisée"""
+    def _rebuild_folder_stats(self, folder_id: Optional[int] = None) -> int:
+        # Sans dossier, toute la table; sinon le sous-arbre de folder_id
+        files_scope = tree_scope = folders_scope = ""
+        params = ()
+        if folder_id is not None:
+            subtree = "IN (SELECT descendant_id FROM folder_tree WHERE ancestor_id = ?)"
+            files_scope = f"AND folder_id {subtree}"
+            tree_scope = f"WHERE t.ancestor_id {subtree}"
+            folders_scope = f"WHERE fo.id {subtree}"
+            params = (folder_id,) * 3
         try:
-            file_size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
-            file_hash = self._calculate_file_hash(filepath)
-            
-            # Créer le texte de recherche optimisé
-            search_text = self._create_search_text(filename)
-            
+            if folder_id is None:
+                self.cursor.execute("DELETE FROM folder_stats")
+            # Un dossier à la corbeille ne compte rien, ni pour lui ni pour ses ancêtres
+            self.cursor.execute(f"""
+                INSERT OR REPLACE INTO folder_stats (folder_id, direct_files, direct_bytes, total_files, total_bytes)
+                SELECT fo.id,
+                       COALESCE(direct.files, 0), COALESCE(direct.bytes, 0),
+                       COALESCE(total.files, 0), COALESCE(total.bytes, 0)
+                FROM folders fo
+                LEFT JOIN (
+                    SELECT folder_id, COUNT(*) AS files, SUM(file_size) AS bytes
+                    FROM files WHERE deleted_at IS NULL {files_scope}
+                    GROUP BY folder_id
+                ) direct ON direct.folder_id = fo.id AND fo.deleted_at IS NULL
+                LEFT JOIN (
+                    SELECT t.ancestor_id, COUNT(*) AS files, SUM(f.file_size) AS bytes
+                    FROM folder_tree t
+                    INNER JOIN folders d ON d.id = t.descendant_id AND d.deleted_at IS NULL
+                    INNER JOIN files f ON f.folder_id = t.descendant_id AND f.deleted_at IS NULL
+                    {tree_scope}
+                    GROUP BY t.ancestor_id
+                ) total ON total.ancestor_id = fo.id
+                {folders_scope}
+            """, params)
+            rebuilt = self.cursor.rowcount
+            print(f"✅ Compteurs recalculés pour {rebuilt} dossier(s)")
+            return rebuilt
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors du recalcul des compteurs de dossiers: {e}")
+            raise
+    
+    @cached_query
+    def get_folder_path(self, folder_id: int) -> List[Dict[str, Any]]:
+        """Récupérer le chemin complet d'un dossier (breadcrumb), de la racine au dossier"""
+        try:
+            self.cursor.execute("""
+                SELECT f.* FROM folder_tree t
+                INNER JOIN folders f ON f.id = t.ancestor_id
+                WHERE t.descendant_id = ?
+                ORDER BY t.depth DESC
+            """, (folder_id,))
+            return [dict(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la récupération du chemin: {e}")
+            return []
+    
+    @cached_query
+    def get_folders_stats(self, folder_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """
+        Statistiques de plusieurs dossiers, lues dans les compteurs précalculés
+        
+        Returns:
+            {folder_id: {'file_count', 'total_size', 'direct_files', 'direct_size'}}
+            (file_count et total_size sont récursifs)
+        """
+        stats = {folder_id: {'file_count': 0, 'total_size': 0, 'direct_files': 0, 'direct_size': 0}
+                 for folder_id in folder_ids}
+        if not folder_ids:
+            return stats
+        
+        try:
+            placeholders = ','.join(['?'] * len(folder_ids))
             self.cursor.execute(
-                "INSERT INTO files (folder_id, filename, filepath, file_size, file_hash, search_text) VALUES (?, ?, ?, ?, ?, ?)",
-                (folder_id, filename, filepath, file_size, file_hash, search_text)
+                f"SELECT * FROM folder_stats WHERE folder_id IN ({placeholders})",
+                folder_ids
             )
-            self.conn.commit()
-            return self.cursor.lastrowid
+            for row in self.cursor.fetchall():
+                stats[row['folder_id']] = {
+                    'file_count': row['total_files'],
+                    'total_size': row['total_bytes'],
+                    'direct_files': row['direct_files'],
+                    'direct_size': row['direct_bytes']
+                }
+            return stats
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors du calcul des statistiques de dossiers: {e}")
+            return stats
+    
+    # ==================== GESTION DES FICHIERS ====================
+    
+    def add_file(self, folder_id: int, filename: str, filepath: str,
+                 file_hash: Optional[str] = None, file_size: Optional[int] = None) -> int:
+        """
+        Ajouter un fichier à la base de données avec métadonnées et recherche optimisée
+        
+        Args:
+            folder_id: Dossier de destination
+            filename: Nom d'affichage du fichier
+            filepath: Chemin du blob chiffré
+            file_hash: SHA-256 du contenu en clair (calculé pendant le stockage)
+            file_size: Taille du contenu en clair
+        """
+        try:
+            return self.add_file_async(folder_id, filename, filepath, file_hash, file_size).result()
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de l'ajout du fichier: {e}")
             raise
     
+    def add_file_async(self, folder_id: int, filename: str, filepath: str,
+                       file_hash: Optional[str] = None, file_size: Optional[int] = None) -> Future:
+        """Comme add_file, sans attendre: la future donne l'id du fichier"""
+        # Empreinte et taille viennent du stockage (contenu en clair): hacher
+        # filepath, un blob chiffré, donnerait l'empreinte du chiffré
+        
+        # Créer le texte de recherche optimisé
+        search_text = self._create_search_text(filename)
+        
+        return self.submit_write(
+            self._insert_file,
+            (folder_id, filename, filepath, file_size or 0, file_hash or '', search_text, *file_type(filename))
+        )
+    
+    def _insert_file(self, row: Tuple) -> int:
+        self.cursor.execute(
+            "INSERT INTO files (folder_id, filename, filepath, file_size, file_hash, search_text, extension, mime_type) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            row
+        )
+        file_id = self.cursor.lastrowid
+        self._check_blobs_stored([row[2]])
+        return file_id
+    
+    def add_files_batch(self, rows: Iterable[Tuple[int, str, str, str, int]]) -> List[int]:
+        """
+        Ajouter plusieurs fichiers dans une seule transaction
+        
+        Args:
+            rows: Itérable de (folder_id, filename, filepath, file_hash, file_size),
+                  taille et empreinte étant déjà calculées lors du stockage
+        
+        Returns:
+            Liste des ids créés, dans l'ordre des lignes fournies
+        """
+        rows = [
+            (folder_id, filename, filepath, file_size or 0, file_hash or '',
+             self._create_search_text(filename), *file_type(filename))
+            for folder_id, filename, filepath, file_hash, file_size in rows
+        ]
+        if not rows:
+            return []
+        
+        try:
+            return self.submit_write(self._insert_files, rows).result()
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de l'ajout groupé de fichiers: {e}")
+            raise
+    
+    def _insert_files(self, rows: List[Tuple]) -> List[int]:
+        # Le thread écrivain tient le verrou d'écriture: les ids insérés sont
+        # contigus (AUTOINCREMENT) et se relisent après le dernier id existant
+        self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM files")
+        last_id = self.cursor.fetchone()[0]
+        
+        self.cursor.executemany(
+            "INSERT INTO files (folder_id, filename, filepath, file_size, file_hash, search_text, extension, mime_type) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        
+        self._check_blobs_stored(row[2] for row in rows)
+        
+        self.cursor.execute("SELECT id FROM files WHERE id > ? ORDER BY id", (last_id,))
+        return [row[0] for row in self.cursor.fetchall()]
+    
+    def _check_blobs_stored(self, filepaths: Iterable[str]):
+        """
+        Vérifier, une fois la référence prise (triggers de blobs), que les
+        blobs des lignes insérées sont toujours stockés
+        
+        Un import décide qu'un contenu est un doublon avant d'écrire sa ligne;
+        la suppression des blobs non référencés passe par le thread écrivain
+        (remove_unreferenced_blobs), elle a donc eu lieu avant cette écriture
+        ou aura lieu après, et verra alors la référence. Un blob absent fait
+        échouer l'écriture, qu'un nouvel import stockera à nouveau.
+        """
+        if self.file_handler is None:
+            return
+        missing = [filepath for filepath in set(filepaths) if not self.file_handler.file_exists(filepath)]
+        if missing:
+            raise sqlite3.IntegrityError(
+                f"Blob supprimé pendant l'enregistrement: {os.path.basename(missing[0])}"
+            )
+    
     def _create_search_text(self, filename: str) -> str:
         """Créer un texte de recherche optimisé pour un fichier"""
         # Normaliser le texte pour la recherche
@@ -443,23 +888,59 @@ class Database:
         words = normalized.split()
         return ' '.join(words)
     
-    def _calculate_file_hash(self, filepath: str) -> str:
-        """Calculer le hash SHA256 d'un fichier"""
+    # Curseur de page: (uploaded_at, id) de la dernière ligne renvoyée
+    PageCursor = Tuple[str, int]
+    
+    def _fetch_page(self, query: str, conditions: List[str], params: List[Any],
+                    page_size: int, after: Optional[PageCursor],
+                    prefix: str = "") -> Tuple[List[Dict[str, Any]], Optional[PageCursor]]:
+        """
+        Exécuter une requête paginée par curseur, triée du plus récent au plus ancien
+        
+        La page suivante reprend strictement après `after` grâce à l'index
+        (uploaded_at, id): son coût ne dépend pas de sa position.
+        
+        Returns:
+            (lignes de la page, curseur de la page suivante ou None si c'était la dernière)
+        """
+        conditions = list(conditions)
+        params = list(params)
+        if after is not None:
+            conditions.append(f"({prefix}uploaded_at, {prefix}id) < (?, ?)")
+            params.extend(after)
+        
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {prefix}uploaded_at DESC, {prefix}id DESC LIMIT ?"
+        params.append(page_size + 1)
+        
+        self.cursor.execute(query, params)
+        rows = [dict(row) for row in self.cursor.fetchall()]
+        if len(rows) <= page_size:
+            return rows, None
+        
+        rows = rows[:page_size]
+        return rows, (rows[-1]['uploaded_at'], rows[-1]['id'])
+    
+    @cached_query
+    def get_files_in_folder_page(self, folder_id: int, page_size: int = 100,
+                                 after: Optional[PageCursor] = None
+                                 ) -> Tuple[List[Dict[str, Any]], Optional[PageCursor]]:
+        """Récupérer une page des fichiers d'un dossier (voir _fetch_page)"""
         try:
-            hash_sha256 = hashlib.sha256()
-            with open(filepath, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
-        except Exception as e:
-            print(f"⚠️ Erreur calcul hash: {e}")
-            return ""
+            return self._fetch_page(
+                "SELECT * FROM files", ["folder_id = ?", "deleted_at IS NULL"], [folder_id], page_size, after
+            )
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la récupération des fichiers: {e}")
+            return [], None
     
+    @cached_query
     def get_files_in_folder(self, folder_id: int) -> List[Dict[str, Any]]:
         """Récupérer tous les fichiers d'un dossier"""
         try:
             self.cursor.execute(
-                "SELECT * FROM files WHERE folder_id = ? ORDER BY uploaded_at DESC",
+                "SELECT * FROM files WHERE folder_id = ? AND deleted_at IS NULL ORDER BY uploaded_at DESC, id DESC",
                 (folder_id,)
             )
             return [dict(row) for row in self.cursor.fetchall()]
@@ -467,10 +948,11 @@ class Database:
             print(f"❌ Erreur lors de la récupération des fichiers: {e}")
             return []
     
+    @cached_query
     def get_file(self, file_id: int) -> Optional[Dict[str, Any]]:
         """Récupérer un fichier par son ID"""
         try:
-            self.cursor.execute("SELECT * FROM files WHERE id = ?", (file_id,))
+            self.cursor.execute("SELECT * FROM files WHERE id = ? AND deleted_at IS NULL", (file_id,))
             row = self.cursor.fetchone()
             return dict(row) if row else None
         except sqlite3.Error as e:
@@ -478,31 +960,557 @@ class Database:
             return None
     
     def delete_file(self, file_id: int) -> bool:
-        """Supprimer un fichier"""
+        """Mettre un fichier à la corbeille (son blob est purgé en arrière-plan)"""
         try:
-            file = self.get_file(file_id)
-            if file:
-                try:
-                    if os.path.exists(file['filepath']):
-                        os.remove(file['filepath'])
-                except Exception as e:
-                    print(f"⚠️ Impossible de supprimer le fichier physique: {e}")
-                
-                self.cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
-                self.conn.commit()
-                return True
-            return False
+            return self.delete_file_async(file_id).result()
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de la suppression du fichier: {e}")
             return False
     
+    def delete_file_async(self, file_id: int) -> Future:
+        """Comme delete_file, sans attendre: la future indique si le fichier existait"""
+        future = self.submit_write(self._delete_file, file_id)
+        future.add_done_callback(self._notify_trash)
+        return future
+    
+    def _delete_file(self, file_id: int) -> bool:
+        self.cursor.execute(
+            "UPDATE files SET deleted_at = CURRENT_TIMESTAMP WHERE id = ? AND deleted_at IS NULL",
+            (file_id,)
+        )
+        return self.cursor.rowcount > 0
+    
+    def restore_file(self, file_id: int) -> bool:
+        """Sortir un fichier de la corbeille (son dossier doit être hors de la corbeille)"""
+        try:
+            return self._write(
+                self._execute,
+                "UPDATE files SET deleted_at = NULL WHERE id = ? AND deleted_at IS NOT NULL "
+                "AND folder_id IN (SELECT id FROM folders WHERE deleted_at IS NULL)",
+                (file_id,)
+            ) > 0
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la restauration du fichier: {e}")
+            return False
+    
+    @cached_query
+    def get_trash(self, panel: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Éléments restaurables de la corbeille, du plus récent au plus ancien
+        
+        Returns:
+            {'folders': dossiers supprimés dont le parent est hors corbeille,
+             'files': fichiers supprimés un par un dans un dossier hors corbeille}
+        """
+        try:
+            self.cursor.execute("""
+                SELECT fo.* FROM folders fo
+                LEFT JOIN folders parent ON parent.id = fo.parent_id
+                WHERE fo.deleted_at IS NOT NULL AND parent.deleted_at IS NULL
+                  AND (? IS NULL OR fo.panel = ?)
+                ORDER BY fo.deleted_at DESC
+            """, (panel, panel))
+            folders = [dict(row) for row in self.cursor.fetchall()]
+            self.cursor.execute("""
+                SELECT f.*, fold.name AS folder_name, fold.panel FROM files f
+                INNER JOIN folders fold ON fold.id = f.folder_id
+                WHERE f.deleted_at IS NOT NULL AND fold.deleted_at IS NULL
+                  AND (? IS NULL OR fold.panel = ?)
+                ORDER BY f.deleted_at DESC
+            """, (panel, panel))
+            return {'folders': folders, 'files': [dict(row) for row in self.cursor.fetchall()]}
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la lecture de la corbeille: {e}")
+            return {'folders': [], 'files': []}
+    
+    def purge_trash_batch(self, limit: int = 200, older_than_days: float = 0.0) -> Tuple[int, List[str]]:
+        """
+        Effacer définitivement une partie de la corbeille
+        
+        Seuls les éléments mis à la corbeille depuis plus de `older_than_days`
+        jours sont effacés. Les fichiers (à la corbeille ou dans un dossier à
+        la corbeille) le sont d'abord; les dossiers ensuite, une fois vidés,
+        par cascade depuis la racine de chaque sous-arbre supprimé.
+        
+        Returns:
+            (nombre de lignes effacées, blobs qui ne sont plus référencés
+            et restent à supprimer du disque)
+        """
+        try:
+            return self._write(self._purge_trash_batch, limit, older_than_days)
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la purge de la corbeille: {e}")
+            return 0, []
+    
+    def _purge_trash_batch(self, limit: int, older_than_days: float) -> Tuple[int, List[str]]:
+        # Même format que les dates de mise à la corbeille (fractions de seconde)
+        self.cursor.execute("SELECT strftime('%Y-%m-%d %H:%M:%f', 'now', ?)",
+                            (f"-{older_than_days * 86400:.3f} seconds",))
+        cutoff = self.cursor.fetchone()[0]
+        
+        self.cursor.execute("""
+            SELECT id, filepath FROM files WHERE deleted_at IS NOT NULL AND deleted_at <= ?
+            UNION
+            SELECT f.id, f.filepath FROM folders fo
+            INNER JOIN files f ON f.folder_id = fo.id
+            WHERE fo.deleted_at IS NOT NULL AND fo.deleted_at <= ?
+            LIMIT ?
+        """, (cutoff, cutoff, limit))
+        rows = self.cursor.fetchall()
+        
+        if rows:
+            self.cursor.executemany("DELETE FROM files WHERE id = ?", [(row['id'],) for row in rows])
+            filepaths = {row['filepath'] for row in rows}
+            return len(rows), [filepath for filepath in filepaths if self._release_blob(filepath)]
+        
+        # Racines des sous-arbres supprimés: leur parent est hors corbeille
+        self.cursor.execute("""
+            DELETE FROM folders WHERE id IN (
+                SELECT fo.id FROM folders fo
+                LEFT JOIN folders parent ON parent.id = fo.parent_id
+                WHERE fo.deleted_at IS NOT NULL AND fo.deleted_at <= ? AND parent.deleted_at IS NULL
+                LIMIT ?
+            )
+        """, (cutoff, limit))
+        return self.cursor.rowcount, []
+    
+    def is_blob_referenced(self, filepath: str) -> bool:
+        """Un fichier (même à la corbeille) référence-t-il encore ce blob ?"""
+        self.cursor.execute("SELECT 1 FROM blobs WHERE filepath = ?", (filepath,))
+        return self.cursor.fetchone() is not None
+    
+    def update_files_content(self, rows: Iterable[Tuple[int, str, str, int]]) -> int:
+        """
+        Remplacer le contenu de fichiers existants dans une seule transaction
+        
+        Args:
+            rows: Itérable de (file_id, filepath, file_hash, file_size)
+        
+        Returns:
+            Nombre de fichiers mis à jour
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        
+        try:
+            return self._write(self._update_files_content, rows)
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la mise à jour des fichiers: {e}")
+            raise
+    
+    def _update_files_content(self, rows: List[Tuple[int, str, str, int]]) -> int:
+        placeholders = ",".join("?" * len(rows))
+        self.cursor.execute(
+            f"SELECT DISTINCT filepath FROM files WHERE id IN ({placeholders})",
+            [row[0] for row in rows]
+        )
+        old_filepaths = [row['filepath'] for row in self.cursor.fetchall()]
+        
+        self.cursor.executemany(
+            "UPDATE files SET filepath = ?, file_hash = ?, file_size = ?, uploaded_at = CURRENT_TIMESTAMP WHERE id = ?",
+            [(filepath, file_hash, file_size or 0, file_id) for file_id, filepath, file_hash, file_size in rows]
+        )
+        updated = self.cursor.rowcount
+        self._check_blobs_stored(row[1] for row in rows)
+        
+        # Les anciens contenus ne sont plus référencés par ces fichiers:
+        # suppression physique après le commit du lot (annulée avec lui)
+        for filepath in old_filepaths:
+            if self._release_blob(filepath):
+                self.writer.pending_removals.append(filepath)
+        return updated
+    
+    def _release_blob(self, filepath: str) -> bool:
+        """Oublier un blob qu'aucun fichier ne référence plus; True s'il est à supprimer du disque"""
+        self.cursor.execute("SELECT ref_count FROM blobs WHERE filepath = ?", (filepath,))
+        row = self.cursor.fetchone()
+        if row and row['ref_count'] > 0:
+            return False
+        
+        self.cursor.execute("DELETE FROM blobs WHERE filepath = ?", (filepath,))
+        return True
+    
+    def find_file_by_hash(self, file_hash: str, folder_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Rechercher un fichier existant par l'empreinte de son contenu"""
+        try:
+            if folder_id is None:
+                self.cursor.execute(
+                    "SELECT * FROM files WHERE file_hash = ? AND deleted_at IS NULL LIMIT 1",
+                    (file_hash,)
+                )
+            else:
+                self.cursor.execute(
+                    "SELECT * FROM files WHERE file_hash = ? AND folder_id = ? AND deleted_at IS NULL LIMIT 1",
+                    (file_hash, folder_id)
+                )
+            row = self.cursor.fetchone()
+            return dict(row) if row else None
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la recherche par empreinte: {e}")
+            return None
+    
+    # ==================== INTÉGRITÉ DU STOCKAGE ====================
+    
+    def get_blobs_page(self, after: str = "", limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Page de la table blobs, triée par chemin (parcours complet en mémoire bornée)
+        
+        Returns:
+            Lignes (filepath, file_hash, ref_count, file_count), file_count
+            étant le nombre réel de fichiers qui référencent le blob
+        """
+        try:
+            self.cursor.execute("""
+                SELECT b.filepath, b.file_hash, b.ref_count,
+                       (SELECT COUNT(*) FROM files f WHERE f.filepath = b.filepath) AS file_count
+                FROM blobs b
+                WHERE b.filepath > ?
+                ORDER BY b.filepath
+                LIMIT ?
+            """, (after, limit))
+            return [dict(row) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la lecture des blobs: {e}")
+            return []
+    
+    def count_unregistered_blobs(self) -> int:
+        """Nombre de chemins référencés par des fichiers mais absents de la table blobs"""
+        self.cursor.execute(
+            "SELECT COUNT(DISTINCT filepath) FROM files WHERE filepath NOT IN (SELECT filepath FROM blobs)"
+        )
+        return self.cursor.fetchone()[0]
+    
+    def get_blob_owner(self, filepath: str) -> Optional[Dict[str, Any]]:
+        """Un fichier qui référence le blob (nom, panel, taille, empreinte), pour ses métadonnées"""
+        try:
+            self.cursor.execute("""
+                SELECT f.filename, fo.panel, f.file_size, f.file_hash, f.uploaded_at
+                FROM files f
+                INNER JOIN folders fo ON fo.id = f.folder_id
+                WHERE f.filepath = ?
+                ORDER BY f.deleted_at IS NOT NULL, f.id
+                LIMIT 1
+            """, (filepath,))
+            row = self.cursor.fetchone()
+            return dict(row) if row else None
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la recherche du fichier d'un blob: {e}")
+            return None
+    
+    def get_blobs_to_verify(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Blobs du moins récemment vérifié au plus récemment vérifié"""
+        query = "SELECT filepath, file_hash, verified_at FROM blobs WHERE ref_count > 0 ORDER BY verified_at"
+        params = []
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        self.cursor.execute(query, params)
+        return [dict(row) for row in self.cursor.fetchall()]
+    
+    def record_blob_verifications(self, rows: Iterable[Tuple[str, float, str]]):
+        """
+        Enregistrer le résultat de vérifications
+        
+        Args:
+            rows: Itérable de (filepath, verified_at, verify_error) - erreur vide si le blob est sain
+        """
+        try:
+            self._write(
+                self._executemany,
+                "UPDATE blobs SET verified_at = ?, verify_error = ? WHERE filepath = ?",
+                [(verified_at, error, filepath) for filepath, verified_at, error in rows]
+            )
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de l'enregistrement des vérifications: {e}")
+    
+    def record_blob_hashes(self, rows: Iterable[Tuple[str, str, int]]) -> int:
+        """
+        Enregistrer l'empreinte en clair des blobs dont elle était inconnue
+        
+        Args:
+            rows: Itérable de (filepath, file_hash, file_size) mesurés en déchiffrant le blob
+        
+        Returns:
+            Nombre de blobs renseignés
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        try:
+            return self._write(self._record_blob_hashes, rows)
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de l'enregistrement des empreintes: {e}")
+            return 0
+    
+    def _record_blob_hashes(self, rows: List[Tuple[str, str, int]]) -> int:
+        recorded = 0
+        for filepath, file_hash, file_size in rows:
+            # Une empreinte déjà connue n'est jamais remplacée
+            self.cursor.execute(
+                "UPDATE blobs SET file_hash = ? WHERE filepath = ? AND COALESCE(file_hash, '') = ''",
+                (file_hash, filepath)
+            )
+            if self.cursor.rowcount == 0:
+                continue
+            self.cursor.execute(
+                "UPDATE files SET file_hash = ?, file_size = ? WHERE filepath = ? AND COALESCE(file_hash, '') = ''",
+                (file_hash, file_size, filepath)
+            )
+            recorded += 1
+        return recorded
+    
+    def repair_blob_refs(self) -> int:
+        """
+        Recompter les références de tous les blobs depuis la table files
+        
+        Returns:
+            Nombre de blobs dont le compteur a été corrigé ou créé
+        """
+        return self._write(self._repair_blob_refs)
+    
+    def _repair_blob_refs(self) -> int:
+        self.cursor.execute("""
+            INSERT OR IGNORE INTO blobs (filepath, file_hash, ref_count)
+            SELECT filepath, MAX(file_hash), 0 FROM files GROUP BY filepath
+        """)
+        created = self.cursor.rowcount
+        self.cursor.execute("""
+            UPDATE blobs SET ref_count = (SELECT COUNT(*) FROM files f WHERE f.filepath = blobs.filepath)
+            WHERE ref_count <> (SELECT COUNT(*) FROM files f WHERE f.filepath = blobs.filepath)
+        """)
+        return created + self.cursor.rowcount
+    
+    def release_unreferenced_blobs(self, filepaths: Iterable[str]) -> List[str]:
+        """
+        Oublier les blobs qu'aucun fichier ne référence plus
+        
+        Returns:
+            Chemins à supprimer du disque
+        """
+        return self._write(self._release_unreferenced_blobs, list(filepaths))
+    
+    def _release_unreferenced_blobs(self, filepaths: List[str]) -> List[str]:
+        released = []
+        for filepath in filepaths:
+            self.cursor.execute("SELECT 1 FROM files WHERE filepath = ? LIMIT 1", (filepath,))
+            if self.cursor.fetchone() is None and self._release_blob(filepath):
+                released.append(filepath)
+        return released
+    
+    def remove_unreferenced_blobs(self, filepaths: Iterable[str],
+                                  remove: Callable[[List[str]], int]) -> int:
+        """
+        Supprimer du stockage les blobs qu'aucun fichier ne référence
+        
+        La vérification et la suppression s'exécutent dans le thread écrivain,
+        comme l'enregistrement des fichiers importés: un import qui réutilise
+        un blob existant ne peut pas s'intercaler entre les deux (voir
+        _check_blobs_stored).
+        
+        Args:
+            filepaths: Blobs candidats
+            remove: Suppression effective des blobs non référencés
+                    (par exemple FileHandler.delete_files)
+        
+        Returns:
+            Nombre de blobs supprimés
+        """
+        filepaths = list(filepaths)
+        if not filepaths:
+            return 0
+        try:
+            return self._write(self._remove_unreferenced_blobs, filepaths, remove)
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la suppression des blobs libérés: {e}")
+            return 0
+    
+    def _remove_unreferenced_blobs(self, filepaths: List[str], remove: Callable[[List[str]], int]) -> int:
+        unreferenced = [filepath for filepath in filepaths if not self.is_blob_referenced(filepath)]
+        return remove(unreferenced) if unreferenced else 0
+    
+    def trash_files_by_filepath(self, filepaths: Iterable[str]) -> int:
+        """Mettre à la corbeille les fichiers dont le blob a disparu du disque"""
+        rows = [(filepath,) for filepath in filepaths]
+        if not rows:
+            return 0
+        try:
+            trashed = self._write(
+                self._executemany,
+                "UPDATE files SET deleted_at = CURRENT_TIMESTAMP WHERE filepath = ? AND deleted_at IS NULL",
+                rows
+            )
+            self._notify_trash()
+            return trashed
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la mise à la corbeille: {e}")
+            return 0
+    
+    # ==================== RÉPARTITION DES BLOBS ====================
+    
+    # Blob hors de son adresse de contenu, sauf s'il est déjà réparti sans
+    # empreinte connue (il ne peut pas être renommé)
+    _UNSHARDED_BLOB = "filepath NOT GLOB ? AND (COALESCE(file_hash, '') <> '' OR filepath NOT GLOB ?)"
+    
+    def count_unsharded_blobs(self, sharded_pattern: str, content_pattern: str) -> int:
+        """Nombre de blobs hors de leur place définitive (voir get_unsharded_blobs)"""
+        self.cursor.execute(f"SELECT COUNT(*) FROM blobs WHERE {self._UNSHARDED_BLOB}",
+                            (content_pattern, sharded_pattern))
+        return self.cursor.fetchone()[0]
+    
+    def get_unsharded_blobs(self, sharded_pattern: str, content_pattern: str,
+                            after: str = "", limit: int = 200) -> List[Dict[str, Any]]:
+        """
+        Page triée (filepath, file_hash) des blobs hors de leur place définitive
+        
+        Un blob dont l'empreinte en clair est connue va à son adresse de
+        contenu (motif GLOB content_pattern); les autres sont seulement
+        répartis sous leur nom (motif sharded_pattern).
+        """
+        self.cursor.execute(f"""
+            SELECT filepath, COALESCE(file_hash, '') AS file_hash FROM blobs
+            WHERE filepath > ? AND {self._UNSHARDED_BLOB}
+            ORDER BY filepath
+            LIMIT ?
+        """, (after, content_pattern, sharded_pattern, limit))
+        return [dict(row) for row in self.cursor.fetchall()]
+    
+    def relocate_blobs(self, moves: Iterable[Tuple[str, str]]) -> int:
+        """
+        Repointer les fichiers vers la nouvelle place de leurs blobs, en une transaction
+        
+        Le nouveau chemin doit déjà exister sur le disque; l'ancien est
+        supprimé après le commit du lot.
+        
+        Args:
+            moves: Itérable de (ancien chemin, nouveau chemin)
+        
+        Returns:
+            Nombre de blobs déplacés
+        """
+        moves = list(moves)
+        if not moves:
+            return 0
+        return self._write(self._relocate_blobs, moves)
+    
+    def _relocate_blobs(self, moves: List[Tuple[str, str]]) -> int:
+        relocated = 0
+        for old_filepath, new_filepath in moves:
+            # Même contenu déjà stocké à cette adresse: le blob est partagé
+            self.cursor.execute("SELECT 1 FROM blobs WHERE filepath = ?", (new_filepath,))
+            shared = self.cursor.fetchone() is not None
+            
+            # Les triggers reportent les références sur le nouveau chemin
+            self.cursor.execute("UPDATE files SET filepath = ? WHERE filepath = ?", (new_filepath, old_filepath))
+            if self.cursor.rowcount == 0:
+                continue  # blob libéré entre-temps: laissé à la purge
+            
+            # Le blob garde la date et le résultat de sa dernière vérification
+            if not shared:
+                self.cursor.execute("""
+                    UPDATE blobs SET (verified_at, verify_error) =
+                        (SELECT verified_at, verify_error FROM blobs WHERE filepath = ?)
+                    WHERE filepath = ?
+                """, (old_filepath, new_filepath))
+            if self._release_blob(old_filepath):
+                self.writer.pending_removals.append(old_filepath)
+            relocated += 1
+        return relocated
+    
+    # ==================== SYNCHRONISATION ====================
+    
+    def get_sync_manifest(self, source_root: str, panel: str) -> Dict[str, Dict[str, Any]]:
+        """Récupérer l'état connu des sources d'un dossier synchronisé, indexé par chemin"""
+        try:
+            self.cursor.execute("""
+                SELECT m.*, f.id IS NOT NULL AS file_exists
+                FROM sync_manifest m
+                LEFT JOIN files f ON f.id = m.file_id AND f.deleted_at IS NULL
+                WHERE m.panel = ? AND m.source_root = ?
+            """, (panel, source_root))
+            return {row['source_path']: dict(row) for row in self.cursor.fetchall()}
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la lecture du manifeste: {e}")
+            return {}
+    
+    def save_sync_entries(self, source_root: str, panel: str,
+                          rows: Iterable[Tuple[str, int, int, str, int]]):
+        """
+        Enregistrer l'état de sources synchronisées
+        
+        Args:
+            rows: Itérable de (source_path, file_size, mtime_ns, file_hash, file_id)
+        """
+        try:
+            self._write(self._executemany, """
+                INSERT OR REPLACE INTO sync_manifest
+                (panel, source_path, source_root, file_size, mtime_ns, file_hash, file_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(panel, source_path, source_root, file_size, mtime_ns, file_hash, file_id)
+                  for source_path, file_size, mtime_ns, file_hash, file_id in rows])
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de l'écriture du manifeste: {e}")
+            raise
+    
+    def delete_sync_entries(self, panel: str, source_paths: Iterable[str]):
+        """Oublier des sources qui ont disparu du dossier synchronisé"""
+        try:
+            self._write(
+                self._executemany,
+                "DELETE FROM sync_manifest WHERE panel = ? AND source_path = ?",
+                [(panel, source_path) for source_path in source_paths]
+            )
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors du nettoyage du manifeste: {e}")
+    
     # ==================== RECHERCHE ULTRA-RAPIDE ====================
     
+    def _fast_search_conditions(self, filename: str, extension: str, panel: Optional[str],
+                                include_content: bool) -> Tuple[List[str], List[Any]]:
+        """Conditions de la recherche rapide sur la vue v_files_search"""
+        conditions = []
+        params = []
+        
+        # Recherche par nom - utiliser l'index plein texte
+        if filename.split():
+            search_terms = filename.lower().split()
+            term_conditions, term_params = self._text_search_conditions(
+                "search_text", "search_text", search_terms
+            )
+            name_condition = " AND ".join(term_conditions)
+            
+            if include_content and self.fts_available:
+                # Le nom OU le contenu doit contenir tous les termes
+                content_match = " AND ".join(
+                    f'"{term.replace(chr(34), chr(34) * 2)}"*' for term in search_terms
+                )
+                conditions.append(
+                    f"(({name_condition}) OR id IN (SELECT rowid FROM content_fts WHERE content_fts MATCH ?))"
+                )
+                params.extend(term_params)
+                params.append(content_match)
+            else:
+                conditions.extend(term_conditions)
+                params.extend(term_params)
+        
+        # Filtre par extension (colonne indexée)
+        if extension:
+            conditions.append("extension = ?")
+            params.append(extension.lower())
+        
+        # Filtre par panel
+        if panel:
+            conditions.append("panel = ?")
+            params.append(panel)
+        
+        return conditions, params
+    
     def search_files_fast(self, 
                          filename: str = "", 
                          extension: str = "",
                          panel: Optional[str] = None,
-                         limit: int = 100) -> List[Dict[str, Any]]:
+                         limit: int = 100,
+                         include_content: bool = False) -> List[Dict[str, Any]]:
         """
         Recherche ultra-rapide de fichiers avec cache et index optimisés
         
@@ -511,70 +1519,98 @@ class Database:
             extension: Extension à filtrer
             panel: Panel à filtrer
             limit: Limite de résultats
+            include_content: Chercher aussi dans le texte extrait des documents
             
         Returns:
             Liste des fichiers trouvés
         """
+        results, _ = self.search_files_page(filename, extension, panel, limit, None, include_content)
+        return results
+    
+    @cached_query
+    def search_files_page(self,
+                          filename: str = "",
+                          extension: str = "",
+                          panel: Optional[str] = None,
+                          page_size: int = 50,
+                          after: Optional[PageCursor] = None,
+                          include_content: bool = False
+                          ) -> Tuple[List[Dict[str, Any]], Optional[PageCursor]]:
+        """
+        Recherche rapide paginée par curseur
+        
+        Args:
+            page_size: Nombre de résultats par page
+            after: Curseur renvoyé avec la page précédente (None pour la première)
+            
+        Returns:
+            (résultats de la page, curseur de la page suivante ou None)
+        """
         try:
-            conditions = []
-            params = []
+            conditions, params = self._fast_search_conditions(filename, extension, panel, include_content)
             
             # Utiliser la vue optimisée pour la recherche
             base_query = """
                 SELECT 
                     id, filename, filepath, file_size, uploaded_at,
-                    folder_id, folder_name, panel
+                    extension, mime_type, folder_id, folder_name, panel
                 FROM v_files_search
             """
             
-            # Recherche par nom - utiliser l'index de recherche
-            if filename:
-                search_terms = filename.lower().split()
-                if len(search_terms) == 1:
-                    # Recherche simple - utiliser l'index
-                    conditions.append("search_text LIKE ?")
-                    params.append(f"%{search_terms[0]}%")
-                else:
-                    # Recherche multiple - combiner les termes
-                    term_conditions = []
-                    for term in search_terms:
-                        term_conditions.append("search_text LIKE ?")
-                        params.append(f"%{term}%")
-                    conditions.append("(" + " AND ".join(term_conditions) + ")")
-            
-            # Filtre par extension
-            if extension:
-                conditions.append("filename LIKE ?")
-                params.append(f"%.{extension.lower()}")
-            
-            # Filtre par panel
-            if panel:
-                conditions.append("panel = ?")
-                params.append(panel)
-            
-            # Construire la requête finale
-            if conditions:
-                query = base_query + " WHERE " + " AND ".join(conditions)
-            else:
-                query = base_query
-            
-            query += f" ORDER BY uploaded_at DESC LIMIT {limit}"
-            
             # Exécuter la requête optimisée
             start_time = datetime.now()
-            self.cursor.execute(query, params)
-            results = [dict(row) for row in self.cursor.fetchall()]
+            results, next_cursor = self._fetch_page(base_query, conditions, params, page_size, after)
             end_time = datetime.now()
             
             search_time = (end_time - start_time).total_seconds()
             print(f"🔍 Recherche rapide terminée en {search_time:.3f}s - {len(results)} résultats")
             
-            return results
+            return results, next_cursor
             
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de la recherche rapide: {e}")
-            return []
+            return [], None
     
+    @cached_query
+    def search_facets(self,
+                      filename: str = "",
+                      extension: str = "",
+                      panel: Optional[str] = None,
+                      include_content: bool = False) -> Dict[str, Dict[str, int]]:
+        """
+        Nombre de résultats par panel et par extension pour une recherche
+        
+        Comptes à facettes: le compte d'un panel applique le filtre
+        d'extension mais pas celui de panel (et inversement), pour indiquer
+        ce que donnerait chaque choix. Un seul GROUP BY sur (panel, extension).
+        
+        Returns:
+            {'panel': {panel: nombre}, 'extension': {extension: nombre}, 'total': nombre}
+        """
+        facets = {'panel': {}, 'extension': {}, 'total': 0}
+        try:
+            conditions, params = self._fast_search_conditions(filename, "", None, include_content)
+            query = "SELECT panel, extension, COUNT(*) AS count FROM v_files_search"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " GROUP BY panel, extension"
+            
+            self.cursor.execute(query, params)
+            extension = extension.lower()
+            for row in self.cursor.fetchall():
+                row_panel, row_extension, count = row['panel'], row['extension'], row['count']
+                if not extension or row_extension == extension:
+                    facets['panel'][row_panel] = facets['panel'].get(row_panel, 0) + count
+                if not panel or row_panel == panel:
+                    facets['extension'][row_extension] = facets['extension'].get(row_extension, 0) + count
+                if (not extension or row_extension == extension) and (not panel or row_panel == panel):
+                    facets['total'] += count
+            return facets
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors du calcul des facettes: {e}")
+            return facets
+    
+    @cached_query
     def search_files(self, 
                     filename: str = "", 
                     extension: str = "",
@@ -592,16 +1628,20 @@ class Database:
         
         # Sinon, utiliser la recherche complète
         try:
-            conditions = []
+            # Ni les fichiers à la corbeille, ni ceux d'un dossier à la corbeille
+            conditions = ["deleted_at IS NULL", "folder_id IN (SELECT id FROM folders WHERE deleted_at IS NULL)"]
             params = []
             
             if filename:
-                conditions.append("LOWER(filename) LIKE ?")
-                params.append(f"%{filename.lower()}%")
+                term_conditions, term_params = self._text_search_conditions(
+                    "filename", "LOWER(filename)", [filename.lower()]
+                )
+                conditions.extend(term_conditions)
+                params.extend(term_params)
             
             if extension:
-                conditions.append("LOWER(filename) LIKE ?")
-                params.append(f"%.{extension.lower()}")
+                conditions.append("extension = ?")
+                params.append(extension.lower())
             
             if date_from:
                 conditions.append("uploaded_at >= ?")
@@ -612,11 +1652,8 @@ class Database:
                 params.append(date_to.isoformat())
             
             if folder_id is not None:
-                folder_ids = self._get_all_subfolder_ids(folder_id)
-                folder_ids.append(folder_id)
-                placeholders = ','.join(['?'] * len(folder_ids))
-                conditions.append(f"folder_id IN ({placeholders})")
-                params.extend(folder_ids)
+                conditions.append("folder_id IN (SELECT descendant_id FROM folder_tree WHERE ancestor_id = ?)")
+                params.append(folder_id)
             
             # Filtre par panel
             if panel:
@@ -650,44 +1687,98 @@ class Database:
             print(f"❌ Erreur lors de la recherche: {e}")
             return []
     
+    @cached_query
+    def get_content_index_status(self) -> Dict[str, int]:
+        """Avancement de l'indexation du contenu (nombre de fichiers par statut)"""
+        try:
+            self.cursor.execute("""
+                SELECT COALESCE(c.status, 'pending') AS status, COUNT(*) AS count
+                FROM files f
+                LEFT JOIN file_contents c ON c.file_id = f.id
+                WHERE f.deleted_at IS NULL
+                GROUP BY COALESCE(c.status, 'pending')
+            """)
+            status = {'pending': 0, 'done': 0, 'error': 0, 'unsupported': 0}
+            status.update({row['status']: row['count'] for row in self.cursor.fetchall()})
+            status['total'] = sum(status.values())
+            return status
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la lecture de l'indexation: {e}")
+            return {'pending': 0, 'done': 0, 'error': 0, 'unsupported': 0, 'total': 0}
+    
+    def retry_content_errors(self) -> int:
+        """Remettre en file les fichiers dont l'extraction a échoué (ou dont l'extracteur manquait)"""
+        try:
+            return self._write(
+                self._execute,
+                "DELETE FROM file_contents WHERE status = 'error' OR (status = 'unsupported' AND last_error != '')"
+            )
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la relance de l'indexation: {e}")
+            return 0
+    
     def _get_all_subfolder_ids(self, folder_id: int) -> List[int]:
-        """Récupérer récursivement tous les IDs des sous-dossiers"""
-        subfolder_ids = []
-        subfolders = self.get_subfolders(folder_id)
-        
-        for subfolder in subfolders:
-            subfolder_ids.append(subfolder['id'])
-            subfolder_ids.extend(self._get_all_subfolder_ids(subfolder['id']))
-        
-        return subfolder_ids
+        """Récupérer tous les IDs des sous-dossiers (toutes profondeurs)"""
+        self.cursor.execute(
+            "SELECT descendant_id FROM folder_tree WHERE ancestor_id = ? AND depth > 0 ORDER BY depth",
+            (folder_id,)
+        )
+        return [row[0] for row in self.cursor.fetchall()]
     
+    @cached_query
     def count_files_in_folder(self, folder_id: int, recursive: bool = False) -> int:
         """Compter les fichiers dans un dossier"""
         try:
-            if not recursive:
-                self.cursor.execute(
-                    "SELECT COUNT(*) as count FROM files WHERE folder_id = ?",
-                    (folder_id,)
-                )
-                return self.cursor.fetchone()[0]
-            else:
-                count = self.count_files_in_folder(folder_id, recursive=False)
-                subfolders = self.get_subfolders(folder_id)
-                for subfolder in subfolders:
-                    count += self.count_files_in_folder(subfolder['id'], recursive=True)
-                return count
+            column = "total_files" if recursive else "direct_files"
+            self.cursor.execute(
+                f"SELECT {column} FROM folder_stats WHERE folder_id = ?",
+                (folder_id,)
+            )
+            row = self.cursor.fetchone()
+            return row[0] if row else 0
         except sqlite3.Error as e:
             print(f"❌ Erreur lors du comptage des fichiers: {e}")
             return 0
     
+    @cached_query
+    def get_folder_size(self, folder_id: int, recursive: bool = True) -> int:
+        """Taille totale (en clair) des fichiers d'un dossier"""
+        try:
+            column = "total_bytes" if recursive else "direct_bytes"
+            self.cursor.execute(
+                f"SELECT {column} FROM folder_stats WHERE folder_id = ?",
+                (folder_id,)
+            )
+            row = self.cursor.fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors du calcul de la taille du dossier: {e}")
+            return 0
+    
+    @cached_query
+    def get_files_by_panel_page(self, panel: str, page_size: int = 100,
+                                after: Optional[PageCursor] = None
+                                ) -> Tuple[List[Dict[str, Any]], Optional[PageCursor]]:
+        """Récupérer une page des fichiers d'un panel (voir _fetch_page)"""
+        try:
+            return self._fetch_page(
+                "SELECT f.* FROM files f INNER JOIN folders fold ON f.folder_id = fold.id",
+                ["fold.panel = ?", "f.deleted_at IS NULL", "fold.deleted_at IS NULL"],
+                [panel], page_size, after, prefix="f."
+            )
+        except sqlite3.Error as e:
+            print(f"❌ Erreur lors de la récupération des fichiers du panel: {e}")
+            return [], None
+    
+    @cached_query
     def get_files_by_panel(self, panel: str) -> List[Dict[str, Any]]:
         """Récupérer tous les fichiers d'un panel spécifique"""
         try:
             self.cursor.execute("""
                 SELECT f.* FROM files f
                 INNER JOIN folders fold ON f.folder_id = fold.id
-                WHERE fold.panel = ?
-                ORDER BY f.uploaded_at DESC
+                WHERE fold.panel = ? AND f.deleted_at IS NULL AND fold.deleted_at IS NULL
+                ORDER BY f.uploaded_at DESC, f.id DESC
             """, (panel,))
             return [dict(row) for row in self.cursor.fetchall()]
         except sqlite3.Error as e:
@@ -695,8 +1786,19 @@ class Database:
             return []
     
     def close(self):
-        """Fermer la connexion à la base de données"""
-        if self.conn:
-            self.conn.close()
+        """Terminer les écritures en file puis fermer les connexions de tous les threads"""
+        self.writer.close()
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        self._local.conn = None
+        self._local.cursor = None
+        
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        if connections:
             print("✅ Connexion à la base de données fermée")
 
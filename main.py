@@ -11,6 +11,7 @@ Version: 5.0.0 - Système multi-panels avec interface d'accueil
 
 import sys
 import os
+import threading
 
 # Ajouter le répertoire parent au path pour les imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -30,6 +31,10 @@ except ImportError as e:
 from tkinter import messagebox
 from database import Database
 from utils.file_handler import FileHandler
+from utils.content_indexer import ContentIndexer
+from utils.trash_purger import TrashPurger
+from utils.storage_scrubber import StorageScrubber
+from utils.shard_migrator import ShardMigrator
 try:
     from utils.notifications import NotificationManager
     NOTIFICATIONS_AVAILABLE = True
@@ -71,6 +76,10 @@ class PortalApplication:
         
         self.db = None
         self.file_handler = None
+        self.content_indexer = None
+        self.trash_purger = None
+        self.storage_scrubber = None
+        self.shard_migrator = None
         self.notification_manager = None
         
         # État de l'application
@@ -80,11 +89,15 @@ class PortalApplication:
         self.folder_history = []
         self.is_admin_authenticated = False
         
+        # Initialiser le gestionnaire de fichiers (les migrations de la base
+        # déchiffrent les anciens blobs pour mesurer leur contenu)
+        self.init_file_handler()
+        
         # Initialiser la base de données
         self.init_database()
         
-        # Initialiser le gestionnaire de fichiers
-        self.init_file_handler()
+        # Lancer les tâches de fond sur le stockage
+        self.start_background_jobs()
         
         # Initialiser le gestionnaire de notifications
         if NOTIFICATIONS_AVAILABLE:
@@ -95,11 +108,14 @@ class PortalApplication:
         
         # Afficher l'interface d'accueil
         self.show_home()
+        
+        # Proposer la reprise des imports interrompus
+        self.root.after(1500, self.check_interrupted_imports)
     
     def init_database(self):
         """Initialiser la connexion à la base de données"""
         try:
-            self.db = Database("portal.db")
+            self.db = Database("portal.db", file_handler=self.file_handler)
             print("✅ Base de données initialisée avec support des panels")
         except Exception as e:
             messagebox.showerror(
@@ -120,6 +136,125 @@ class PortalApplication:
             )
             sys.exit(1)
     
+    def start_background_jobs(self):
+        """Démarrer les tâches de fond sur le stockage et la base"""
+        try:
+            # Migrer les anciens fichiers (Fernet, non compressés) en arrière-plan
+            self.file_handler.start_legacy_conversion(
+                on_complete=lambda stats: self.root.after(0, lambda: self.on_legacy_conversion_done(stats))
+            )
+            
+            # Extraire le texte des documents pour la recherche dans le contenu
+            self.content_indexer = ContentIndexer(
+                self.file_handler,
+                self.db,
+                on_pass_complete=lambda count: self.root.after(0, lambda: self.on_content_indexed(count))
+            )
+            self.content_indexer.start()
+            
+            # Effacer en arrière-plan les dossiers et fichiers mis à la corbeille
+            self.trash_purger = TrashPurger(self.file_handler, self.db)
+            self.db.on_trash = self.trash_purger.wake
+            self.db.on_blobs_released = self.file_handler.discard_blobs
+            self.trash_purger.start()
+            
+            # Ranger les anciens blobs dans l'arborescence répartie, une fois
+            # la conversion Fernet terminée (elle réécrit les fichiers en place)
+            self.shard_migrator = ShardMigrator(
+                self.file_handler,
+                self.db,
+                on_complete=lambda count: self.root.after(0, lambda: self.on_blobs_sharded(count))
+            )
+            
+            # Contrôler périodiquement la cohérence base / métadonnées / blobs
+            self.storage_scrubber = StorageScrubber(
+                self.file_handler,
+                self.db,
+                on_complete=lambda report: self.root.after(0, lambda: self.on_storage_scrubbed(report))
+            )
+            self.storage_scrubber.start()
+        except Exception as e:
+            messagebox.showerror(
+                "Erreur Critique",
+                f"Impossible de démarrer les tâches de fond:\n\n{e}"
+            )
+            sys.exit(1)
+
+    def on_legacy_conversion_done(self, stats: dict):
+        """Signaler la fin de la migration des anciens fichiers"""
+        self.shard_migrator.start()
+        if stats['converted'] == 0:
+            return
+
+        reclaimed = self.file_handler.format_file_size(stats['reclaimed'])
+        if self.notification_manager:
+            self.notification_manager.show_app_notification(
+                "♻️ Stockage optimisé",
+                f"{stats['converted']} fichier(s) convertis • {reclaimed} récupérés"
+            )
+
+    def on_blobs_sharded(self, count: int):
+        """Signaler la fin de la réorganisation du stockage"""
+        if self.notification_manager:
+            self.notification_manager.show_app_notification(
+                "📦 Stockage réorganisé",
+                f"{count} fichier(s) rangé(s) dans la nouvelle arborescence"
+            )
+
+    def on_content_indexed(self, count: int):
+        """Signaler la fin d'une passe d'indexation du contenu"""
+        if self.notification_manager:
+            self.notification_manager.show_app_notification(
+                "📑 Contenu indexé",
+                f"{count} document(s) consultable(s) par leur contenu"
+            )
+    
+    def on_storage_scrubbed(self, report: dict):
+        """Signaler les incohérences trouvées par la vérification du stockage"""
+        problems = StorageScrubber.problem_count(report)
+        if problems and self.notification_manager:
+            self.notification_manager.show_app_notification(
+                "🩺 Vérification du stockage",
+                f"{problems} incohérence(s) détectée(s) • python migrate_database.py --scrub --repair"
+            )
+    
+    def check_interrupted_imports(self):
+        """Proposer de reprendre les imports interrompus lors de la dernière session"""
+        journals = self.file_handler.interrupted_import_jobs()
+        if not journals:
+            return
+        
+        remaining = sum(max(journal.total - journal.processed, 0) for journal in journals)
+        resume = messagebox.askyesno(
+            "Import interrompu",
+            f"⚠️ {len(journals)} import(s) n'ont pas pu se terminer.\n\n"
+            f"📄 Environ {remaining} fichier(s) restant(s) à importer.\n\n"
+            f"Reprendre maintenant ? (Non = abandonner)"
+        )
+        
+        if not resume:
+            for journal in journals:
+                self.file_handler.discard_import_job(journal)
+            return
+        
+        def worker():
+            imported = 0
+            for journal in journals:
+                imported += self.file_handler.resume_import_job(journal, self.db)
+            self.root.after(0, lambda: self.on_import_resumed(imported))
+            self.content_indexer.wake()
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def on_import_resumed(self, imported: int):
+        """Signaler la fin de la reprise des imports"""
+        if self.notification_manager:
+            self.notification_manager.show_app_notification(
+                "🔁 Import repris",
+                f"{imported} fichier(s) importé(s)"
+            )
+        self.refresh_content()
+
     def setup_main_window(self):
         """Configurer la fenêtre principale"""
         self.root.title("Portail Document - SNTP")
@@ -677,9 +812,21 @@ class PortalApplication:
             print(f"❌ Erreur fatale: {e}")
             messagebox.showerror("Erreur Fatale", str(e))
             self.cleanup()
+        else:
+            # Fermeture normale: supprimer aussi les copies temporaires restantes
+            self.cleanup()
     
     def cleanup(self):
         """Nettoyer les ressources avant de quitter"""
+        # Arrêter toutes les tâches de fond, puis attendre leurs threads avant de fermer la base
+        jobs = [job for job in (self.storage_scrubber, self.shard_migrator,
+                                self.trash_purger, self.content_indexer) if job]
+        for job in jobs:
+            job.stop()
+        for job in jobs:
+            job.join(timeout=5)
+        if self.file_handler:
+            self.file_handler.temp_files.close()
         if self.db:
             self.db.close()
         print("👋 Application fermée")
@@ -713,4 +860,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # Requis pour le pool de processus de l'import dans un exécutable figé
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
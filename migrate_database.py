@@ -1,103 +1,972 @@
+"""
+Migrations versionnées du schéma de la base de données
+
+Chaque étape de MIGRATIONS est appliquée une seule fois, dans l'ordre; le
+numéro de la dernière étape appliquée est conservé dans PRAGMA user_version.
+Un démarrage sur une base à jour se limite donc à la lecture de ce numéro.
+
+Les étapes restent idempotentes (CREATE ... IF NOT EXISTS, colonnes vérifiées)
+pour les bases créées avant le versionnement, qui partent de la version 0.
+
+Utilisation en ligne de commande:
+    python migrate_database.py [portal.db] [--uploads uploads]
+    python migrate_database.py [portal.db] --rebuild-folder-stats [--uploads uploads]
+    python migrate_database.py [portal.db] --scrub [--repair] [--uploads uploads]
+    python migrate_database.py [portal.db] --shard [--uploads uploads]
+"""
+
 import sqlite3
 import os
-import hashlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import bcrypt
+
+# Progression d'une étape longue: (description, traités, total)
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    return cursor.fetchone() is not None
 
-def migrate_database(db_path="portal.db"):
-    """Migrer la base de données pour ajouter les nouvelles colonnes"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+
+def _table_columns(cursor, name: str) -> list:
+    cursor.execute(f"PRAGMA table_info({name})")
+    return [column[1] for column in cursor.fetchall()]
+
+
+def _migrate_legacy_columns(db, progress_callback=None):
+    """Colonnes ajoutées aux bases créées par les premières versions"""
+    cursor = db.cursor
     
-    try:
-        # Vérifier si les colonnes existent déjà
-        cursor.execute("PRAGMA table_info(files)")
-        columns = [column[1] for column in cursor.fetchall()]
+    if _table_exists(cursor, 'folders') and 'panel' not in _table_columns(cursor, 'folders'):
+        print("🔄 Ajout de la colonne panel aux dossiers...")
+        cursor.execute("ALTER TABLE folders ADD COLUMN panel TEXT DEFAULT 'interface_emp'")
+    
+    if _table_exists(cursor, 'files'):
+        columns = _table_columns(cursor, 'files')
         
-        # Ajouter file_size si elle n'existe pas
+        # Tailles et empreintes sont calculées par _backfill_files
         if 'file_size' not in columns:
-            print("Ajout de la colonne file_size...")
+            print("🔄 Ajout de la colonne file_size...")
             cursor.execute("ALTER TABLE files ADD COLUMN file_size INTEGER DEFAULT 0")
-            
-            # Calculer les tailles des fichiers existants
-            cursor.execute("SELECT id, filepath FROM files")
-            files = cursor.fetchall()
-            
-            for file_id, filepath in files:
-                try:
-                    if os.path.exists(filepath):
-                        size = os.path.getsize(filepath)
-                        cursor.execute("UPDATE files SET file_size = ? WHERE id = ?", (size, file_id))
-                        print(f"Taille mise à jour pour le fichier ID {file_id}: {size} bytes")
-                except Exception as e:
-                    print(f"Erreur calcul taille pour {filepath}: {e}")
         
-        # Ajouter file_hash si elle n'existe pas
         if 'file_hash' not in columns:
-            print("Ajout de la colonne file_hash...")
+            print("🔄 Ajout de la colonne file_hash...")
             cursor.execute("ALTER TABLE files ADD COLUMN file_hash TEXT DEFAULT ''")
-            
-            # Calculer les hash des fichiers existants
-            cursor.execute("SELECT id, filepath FROM files")
-            files = cursor.fetchall()
-            
-            for file_id, filepath in files:
-                try:
-                    if os.path.exists(filepath):
-                        file_hash = calculate_file_hash(filepath)
-                        cursor.execute("UPDATE files SET file_hash = ? WHERE id = ?", (file_hash, file_id))
-                        print(f"Hash calculé pour le fichier ID {file_id}: {file_hash[:16]}...")
-                except Exception as e:
-                    print(f"Erreur calcul hash pour {filepath}: {e}")
         
-        # Vérifier la table admins pour bcrypt
-        cursor.execute("PRAGMA table_info(admins)")
-        admin_columns = [column[1] for column in cursor.fetchall()]
+        # Ajouter search_text pour la recherche full-text
+        if 'search_text' not in columns:
+            print("🔄 Ajout de la colonne search_text pour recherche optimisée...")
+            cursor.execute("ALTER TABLE files ADD COLUMN search_text TEXT DEFAULT ''")
+            cursor.execute("UPDATE files SET search_text = LOWER(filename)")
+    
+    # Vérifier la table admins pour bcrypt
+    if _table_exists(cursor, 'admins'):
+        admin_columns = _table_columns(cursor, 'admins')
         
         if 'password' in admin_columns and 'password_hash' not in admin_columns:
-            print("Migration des mots de passe vers bcrypt...")
-            
-            # Ajouter la nouvelle colonne
+            print("🔄 Migration des mots de passe vers bcrypt...")
             cursor.execute("ALTER TABLE admins ADD COLUMN password_hash TEXT")
             
-            # Migrer les mots de passe existants
-            import bcrypt
-            cursor.execute("SELECT id, password FROM admins WHERE password_hash IS NULL")
+            cursor.execute("SELECT id, password FROM admins WHERE password_hash IS NULL OR password_hash = ''")
             admins = cursor.fetchall()
             
             for admin_id, old_password in admins:
-                password_hash = bcrypt.hashpw(old_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-                cursor.execute("UPDATE admins SET password_hash = ? WHERE id = ?", (password_hash, admin_id))
-                print(f"Mot de passe migré pour admin ID {admin_id}")
+                if old_password:
+                    password_hash = bcrypt.hashpw(old_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+                    cursor.execute("UPDATE admins SET password_hash = ? WHERE id = ?", (password_hash, admin_id))
+
+
+def _create_core_tables(db, progress_callback=None):
+    """Tables admins, folders et files"""
+    cursor = db.cursor
+    
+    # Table admins avec hash bcrypt
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS admins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL UNIQUE,
+            password TEXT,
+            password_hash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Table folders avec panel
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS folders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            parent_id INTEGER DEFAULT NULL,
+            panel TEXT DEFAULT 'interface_emp',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (parent_id) REFERENCES folders(id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Table files avec métadonnées et recherche optimisée
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            folder_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            filepath TEXT NOT NULL,
+            file_size INTEGER DEFAULT 0,
+            file_hash TEXT DEFAULT '',
+            search_text TEXT DEFAULT '',
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE
+        )
+    """)
+
+
+def _create_folder_tree(db, progress_callback=None):
+    """Table de fermeture de l'arborescence: une ligne par couple (ancêtre, descendant)"""
+    cursor = db.cursor
+    tree_exists = _table_exists(cursor, 'folder_tree')
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS folder_tree (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_folder_tree_descendant ON folder_tree(descendant_id, depth)"
+    )
+    
+    # SQLite n'accepte pas de CTE dans un trigger: la fermeture est
+    # maintenue par jointure sur les lignes du parent
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_folders_tree_insert AFTER INSERT ON folders
+        BEGIN
+            INSERT INTO folder_tree (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, NEW.id, depth + 1 FROM folder_tree WHERE descendant_id = NEW.parent_id
+            UNION ALL
+            SELECT NEW.id, NEW.id, 0;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_folders_tree_delete AFTER DELETE ON folders
+        BEGIN
+            DELETE FROM folder_tree WHERE descendant_id = OLD.id OR ancestor_id = OLD.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_folders_tree_move AFTER UPDATE OF parent_id ON folders
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            -- Détacher le sous-arbre de ses anciens ancêtres
+            DELETE FROM folder_tree
+            WHERE descendant_id IN (SELECT descendant_id FROM folder_tree WHERE ancestor_id = NEW.id)
+              AND ancestor_id NOT IN (SELECT descendant_id FROM folder_tree WHERE ancestor_id = NEW.id);
+            -- Le rattacher sous les ancêtres du nouveau parent
+            INSERT INTO folder_tree (ancestor_id, descendant_id, depth)
+            SELECT super.ancestor_id, sub.descendant_id, super.depth + sub.depth + 1
+            FROM folder_tree super, folder_tree sub
+            WHERE super.descendant_id = NEW.parent_id AND sub.ancestor_id = NEW.id;
+        END
+    """)
+    
+    if not tree_exists:
+        # Base existante: construire la fermeture depuis parent_id
+        cursor.execute("""
+            INSERT OR IGNORE INTO folder_tree (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+                SELECT id, id, 0 FROM folders
+                UNION ALL
+                SELECT tree.ancestor_id, f.id, tree.depth + 1
+                FROM folders f JOIN tree ON f.parent_id = tree.descendant_id
+            )
+            SELECT ancestor_id, descendant_id, depth FROM tree
+        """)
+
+
+def _create_blobs(db, progress_callback=None):
+    """Table blobs: un contenu chiffré stocké une seule fois, compté par référence"""
+    cursor = db.cursor
+    blobs_exist = _table_exists(cursor, 'blobs')
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            filepath TEXT PRIMARY KEY,
+            file_hash TEXT DEFAULT '',
+            ref_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # Les références sont maintenues par triggers sur la table files
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_blob_ref_insert AFTER INSERT ON files
+        BEGIN
+            INSERT OR IGNORE INTO blobs (filepath, file_hash, ref_count)
+            VALUES (NEW.filepath, NEW.file_hash, 0);
+            UPDATE blobs SET ref_count = ref_count + 1 WHERE filepath = NEW.filepath;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_blob_ref_delete AFTER DELETE ON files
+        BEGIN
+            UPDATE blobs SET ref_count = ref_count - 1 WHERE filepath = OLD.filepath;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_blob_ref_update AFTER UPDATE OF filepath ON files
+        WHEN OLD.filepath <> NEW.filepath
+        BEGIN
+            UPDATE blobs SET ref_count = ref_count - 1 WHERE filepath = OLD.filepath;
+            INSERT OR IGNORE INTO blobs (filepath, file_hash, ref_count)
+            VALUES (NEW.filepath, NEW.file_hash, 0);
+            UPDATE blobs SET ref_count = ref_count + 1 WHERE filepath = NEW.filepath;
+        END
+    """)
+    
+    if not blobs_exist:
+        # Base existante: compter les références actuelles
+        cursor.execute("""
+            INSERT OR IGNORE INTO blobs (filepath, file_hash, ref_count)
+            SELECT filepath, MAX(file_hash), COUNT(*) FROM files GROUP BY filepath
+        """)
+
+
+def _create_folder_stats(db, progress_callback=None):
+    """
+    Compteurs agrégés par dossier (directs et récursifs), tenus par triggers
+    
+    Ceux d'une base existante sont calculés par _add_trash, une fois les
+    fichiers à la corbeille exclus.
+    """
+    cursor = db.cursor
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS folder_stats (
+            folder_id INTEGER PRIMARY KEY,
+            direct_files INTEGER NOT NULL DEFAULT 0,
+            direct_bytes INTEGER NOT NULL DEFAULT 0,
+            total_files INTEGER NOT NULL DEFAULT 0,
+            total_bytes INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_folders_stats_insert AFTER INSERT ON folders
+        BEGIN
+            INSERT OR IGNORE INTO folder_stats (folder_id) VALUES (NEW.id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_folders_stats_delete AFTER DELETE ON folders
+        BEGIN
+            DELETE FROM folder_stats WHERE folder_id = OLD.id;
+        END
+    """)
+    # Déplacement: les ancêtres d'un parent ne font pas partie du sous-arbre
+    # déplacé, leurs lignes de fermeture sont donc stables quel que soit
+    # l'ordre d'exécution avec trg_folders_tree_move
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_folders_stats_move AFTER UPDATE OF parent_id ON folders
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            UPDATE folder_stats SET
+                total_files = total_files - (SELECT total_files FROM folder_stats WHERE folder_id = NEW.id),
+                total_bytes = total_bytes - (SELECT total_bytes FROM folder_stats WHERE folder_id = NEW.id)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = OLD.parent_id);
+            UPDATE folder_stats SET
+                total_files = total_files + (SELECT total_files FROM folder_stats WHERE folder_id = NEW.id),
+                total_bytes = total_bytes + (SELECT total_bytes FROM folder_stats WHERE folder_id = NEW.id)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = NEW.parent_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_stats_insert AFTER INSERT ON files
+        BEGIN
+            UPDATE folder_stats SET
+                direct_files = direct_files + 1,
+                direct_bytes = direct_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id = NEW.folder_id;
+            UPDATE folder_stats SET
+                total_files = total_files + 1,
+                total_bytes = total_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = NEW.folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_stats_delete AFTER DELETE ON files
+        BEGIN
+            UPDATE folder_stats SET
+                direct_files = direct_files - 1,
+                direct_bytes = direct_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id = OLD.folder_id;
+            UPDATE folder_stats SET
+                total_files = total_files - 1,
+                total_bytes = total_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = OLD.folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_stats_update AFTER UPDATE OF folder_id, file_size ON files
+        BEGIN
+            UPDATE folder_stats SET
+                direct_files = direct_files - 1,
+                direct_bytes = direct_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id = OLD.folder_id;
+            UPDATE folder_stats SET
+                total_files = total_files - 1,
+                total_bytes = total_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = OLD.folder_id);
+            UPDATE folder_stats SET
+                direct_files = direct_files + 1,
+                direct_bytes = direct_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id = NEW.folder_id;
+            UPDATE folder_stats SET
+                total_files = total_files + 1,
+                total_bytes = total_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = NEW.folder_id);
+        END
+    """)
+
+
+def _create_contents_and_sync(db, progress_callback=None):
+    """Texte extrait des documents et manifeste de synchronisation"""
+    cursor = db.cursor
+    
+    # Texte extrait du contenu des documents (indexation en arrière-plan)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS file_contents (
+            file_id INTEGER PRIMARY KEY,
+            file_hash TEXT DEFAULT '',
+            status TEXT NOT NULL,
+            content TEXT DEFAULT '',
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT DEFAULT '',
+            next_attempt_at REAL DEFAULT 0,
+            updated_at REAL,
+            FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_contents_delete AFTER DELETE ON files
+        BEGIN
+            DELETE FROM file_contents WHERE file_id = OLD.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_contents_update AFTER UPDATE OF filepath ON files
+        WHEN OLD.filepath <> NEW.filepath
+        BEGIN
+            DELETE FROM file_contents WHERE file_id = OLD.id;
+        END
+    """)
+    
+    # Manifeste de synchronisation: état des sources au dernier import
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_manifest (
+            panel TEXT NOT NULL,
+            source_path TEXT NOT NULL,
+            source_root TEXT NOT NULL,
+            file_size INTEGER DEFAULT 0,
+            mtime_ns INTEGER DEFAULT 0,
+            file_hash TEXT DEFAULT '',
+            file_id INTEGER,
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (panel, source_path)
+        )
+    """)
+
+
+def _create_search_indexes(db, progress_callback=None):
+    """Index optimisés pour la recherche et vue v_files_search"""
+    cursor = db.cursor
+    
+    # Index de l'ancien script de migration, couverts par ceux ci-dessous
+    cursor.execute("DROP INDEX IF EXISTS idx_files_filename")
+    cursor.execute("DROP INDEX IF EXISTS idx_files_uploaded_at")
+    
+    search_indexes = [
+        "CREATE INDEX IF NOT EXISTS idx_files_search_text ON files(search_text)",
+        "CREATE INDEX IF NOT EXISTS idx_files_filename_lower ON files(LOWER(filename))",
+        "CREATE INDEX IF NOT EXISTS idx_files_size ON files(file_size)",
+        "CREATE INDEX IF NOT EXISTS idx_files_folder_id ON files(folder_id)",
+        "CREATE INDEX IF NOT EXISTS idx_files_file_hash ON files(file_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_sync_manifest_root ON sync_manifest(panel, source_root)",
+        "CREATE INDEX IF NOT EXISTS idx_file_contents_hash ON file_contents(file_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_folders_panel ON folders(panel)",
+        "CREATE INDEX IF NOT EXISTS idx_folders_parent_id ON folders(parent_id)",
+        "CREATE INDEX IF NOT EXISTS idx_folders_name_lower ON folders(LOWER(name))",
         
-        # Créer les index pour optimiser la recherche
-        print("Création des index...")
-        try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_filename ON files(filename)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_uploaded_at ON files(uploaded_at)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_size ON files(file_size)")
-            print("Index créés avec succès")
-        except Exception as e:
-            print(f"Erreur lors de la création des index: {e}")
+        # Index composite pour recherches complexes
+        "CREATE INDEX IF NOT EXISTS idx_files_folder_filename ON files(folder_id, filename)",
+        "CREATE INDEX IF NOT EXISTS idx_files_size_date ON files(file_size, uploaded_at)",
+        "CREATE INDEX IF NOT EXISTS idx_folders_panel_parent ON folders(panel, parent_id)",
         
-        conn.commit()
-        print("✅ Migration terminée avec succès!")
+        # Index de pagination par curseur (uploaded_at, id)
+        "CREATE INDEX IF NOT EXISTS idx_files_uploaded_id ON files(uploaded_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_files_folder_uploaded_id ON files(folder_id, uploaded_at DESC, id DESC)"
+    ]
+    
+    for index_sql in search_indexes:
+        cursor.execute(index_sql)
+    
+    # Créer une vue pour la recherche rapide
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS v_files_search AS
+        SELECT
+            f.id,
+            f.filename,
+            f.filepath,
+            f.file_size,
+            f.search_text,
+            f.uploaded_at,
+            f.folder_id,
+            fold.name as folder_name,
+            fold.panel,
+            fold.parent_id as folder_parent_id
+        FROM files f
+        INNER JOIN folders fold ON f.folder_id = fold.id
+    """)
+
+
+def _create_fulltext_index(db, progress_callback=None):
+    """
+    Index plein texte FTS5 des noms de fichiers et du contenu des documents
+    
+    Le trigram permet la recherche de sous-chaînes sans parcourir la table,
+    contrairement à LIKE '%terme%'. Les tables sont synchronisées par triggers.
+    Sans FTS5/trigram (SQLite < 3.34), l'étape est ignorée et la recherche
+    reste en LIKE.
+    """
+    cursor = db.cursor
+    cursor.execute("SAVEPOINT fulltext")
+    try:
+        fts_exists = _table_exists(cursor, 'files_fts')
+        
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                search_text, filename,
+                content='files', content_rowid='id',
+                tokenize='trigram'
+            )
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_files_fts_insert AFTER INSERT ON files
+            BEGIN
+                INSERT INTO files_fts (rowid, search_text, filename)
+                VALUES (NEW.id, NEW.search_text, NEW.filename);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_files_fts_delete AFTER DELETE ON files
+            BEGIN
+                INSERT INTO files_fts (files_fts, rowid, search_text, filename)
+                VALUES ('delete', OLD.id, OLD.search_text, OLD.filename);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_files_fts_update AFTER UPDATE OF filename, search_text ON files
+            BEGIN
+                INSERT INTO files_fts (files_fts, rowid, search_text, filename)
+                VALUES ('delete', OLD.id, OLD.search_text, OLD.filename);
+                INSERT INTO files_fts (rowid, search_text, filename)
+                VALUES (NEW.id, NEW.search_text, NEW.filename);
+            END
+        """)
+        
+        if not fts_exists:
+            # Base existante: indexer les fichiers déjà présents
+            print("🔄 Construction de l'index plein texte...")
+            cursor.execute("INSERT INTO files_fts (files_fts) VALUES ('rebuild')")
         
+        # Contenu des documents: recherche par mots (préfixes), sans accents
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS content_fts USING fts5(
+                content,
+                content='file_contents', content_rowid='file_id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_contents_fts_insert AFTER INSERT ON file_contents
+            BEGIN
+                INSERT INTO content_fts (rowid, content) VALUES (NEW.file_id, NEW.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_contents_fts_delete AFTER DELETE ON file_contents
+            BEGIN
+                INSERT INTO content_fts (content_fts, rowid, content) VALUES ('delete', OLD.file_id, OLD.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_contents_fts_update AFTER UPDATE OF content ON file_contents
+            BEGIN
+                INSERT INTO content_fts (content_fts, rowid, content) VALUES ('delete', OLD.file_id, OLD.content);
+                INSERT INTO content_fts (rowid, content) VALUES (NEW.file_id, NEW.content);
+            END
+        """)
+        cursor.execute("RELEASE fulltext")
+    except sqlite3.Error as e:
+        print(f"⚠️ Index plein texte indisponible, recherche par LIKE: {e}")
+        cursor.execute("ROLLBACK TO fulltext")
+        cursor.execute("RELEASE fulltext")
+
+
+def _create_default_admin(db, progress_callback=None):
+    """Créer un compte admin par défaut avec bcrypt"""
+    cursor = db.cursor
+    cursor.execute("SELECT COUNT(*) FROM admins WHERE email = ?", ('admin',))
+    if cursor.fetchone()[0] == 0:
+        password_hash = bcrypt.hashpw('admin'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        cursor.execute(
+            "INSERT INTO admins (email, password, password_hash) VALUES (?, ?, ?)",
+            ('admin', 'admin', password_hash)
+        )
+        print("✅ Admin par défaut créé avec hash bcrypt (admin/admin)")
+
+
+def _measure_blob(file_handler, filepath: str):
+    """Taille et SHA-256 en clair d'un blob chiffré (None s'il est illisible)"""
+    try:
+        return file_handler.measure_file(filepath)
     except Exception as e:
-        print(f"❌ Erreur lors de la migration: {e}")
-        conn.rollback()
-        raise
+        print(f"⚠️ Blob illisible, empreinte inconnue: {filepath} ({e})")
+        return None
+
+
+def _backfill_files(db, progress_callback: Optional[ProgressCallback] = None,
+                    batch_size: int = 500):
+    """
+    Calculer taille et empreinte en clair des fichiers enregistrés avant
+    l'adressage par contenu
+    
+    Ces fichiers n'ont pas d'empreinte, ou une taille et une empreinte
+    calculées sur le fichier chiffré: sans leur empreinte en clair, un
+    nouvel import du même document n'est pas reconnu comme un doublon et
+    les totaux des dossiers comptent les octets chiffrés. Un blob adressé
+    par contenu porte dans son nom l'identifiant de son empreinte en clair;
+    tous les autres sont mesurés.
+    
+    Les blobs sont déchiffrés en parallèle par le gestionnaire de fichiers
+    (db.file_handler), sans écrire le contenu en clair. Sans gestionnaire,
+    la taille enregistrée est conservée et les empreintes sont vidées; le
+    vérificateur du stockage mesure ensuite ces blobs (record_blob_hashes).
+    L'étape est validée d'un seul bloc par run_migrations; une interruption
+    la reprend depuis le début.
+    """
+    cursor = db.cursor
+    if db.file_handler is None:
+        # Impossible de distinguer une empreinte en clair d'une empreinte
+        # du fichier chiffré sans la clé: aucune n'est conservée
+        cursor.execute("UPDATE files SET file_hash = '' WHERE COALESCE(file_hash, '') != ''")
+        cleared = cursor.rowcount
+        cursor.execute("UPDATE blobs SET file_hash = '' WHERE COALESCE(file_hash, '') != ''")
+        if cleared:
+            print(f"⚠️ {cleared} empreinte(s) à recalculer par le vérificateur du stockage")
+        return
+    
+    cursor.execute("SELECT DISTINCT filepath, file_hash FROM files")
+    rows = cursor.fetchall()
+    pending = [
+        row['filepath'] for row in rows
+        if not row['file_hash']
+        or os.path.basename(row['filepath']) != f"{db.file_handler.blob_id(row['file_hash'])}.enc"
+    ]
+    total = len(pending)
+    if total == 0:
+        return
+    
+    print(f"🔄 Calcul des empreintes de {total} fichier(s)...")
+    done = 0
+    workers = min(8, (os.cpu_count() or 1) * 2)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, total, batch_size):
+            batch = pending[start:start + batch_size]
+            updates = []
+            measures = executor.map(lambda path: _measure_blob(db.file_handler, path), batch)
+            for filepath, measured in zip(batch, measures):
+                if measured is None:
+                    # Blob illisible: une empreinte chiffrée serait prise
+                    # pour une empreinte en clair, la laisser inconnue
+                    cursor.execute("UPDATE files SET file_hash = '' WHERE filepath = ?", (filepath,))
+                    cursor.execute("UPDATE blobs SET file_hash = '' WHERE filepath = ?", (filepath,))
+                    continue
+                size, file_hash = measured
+                updates.append((size, file_hash, filepath))
+            
+            cursor.executemany("UPDATE files SET file_size = ?, file_hash = ? WHERE filepath = ?", updates)
+            cursor.executemany("UPDATE blobs SET file_hash = ? WHERE filepath = ?",
+                               [(file_hash, filepath) for _, file_hash, filepath in updates])
+            
+            done += len(batch)
+            print(f"🔄 Empreintes: {done}/{total}")
+            if progress_callback:
+                progress_callback("Calcul des empreintes", done, total)
+
+
+def _add_file_type_columns(db, progress_callback=None):
+    """Extension normalisée et type MIME, indexés pour le filtrage et les facettes"""
+    from database import file_type
+    
+    cursor = db.cursor
+    columns = _table_columns(cursor, 'files')
+    if 'extension' not in columns:
+        cursor.execute("ALTER TABLE files ADD COLUMN extension TEXT DEFAULT ''")
+    if 'mime_type' not in columns:
+        cursor.execute("ALTER TABLE files ADD COLUMN mime_type TEXT DEFAULT ''")
+    
+    cursor.execute("SELECT id, filename FROM files")
+    cursor.executemany(
+        "UPDATE files SET extension = ?, mime_type = ? WHERE id = ?",
+        [(*file_type(row['filename']), row['id']) for row in cursor.fetchall()]
+    )
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_extension ON files(extension, uploaded_at DESC, id DESC)")
+    
+    # La vue de recherche expose les nouvelles colonnes
+    cursor.execute("DROP VIEW IF EXISTS v_files_search")
+    cursor.execute("""
+        CREATE VIEW v_files_search AS
+        SELECT
+            f.id,
+            f.filename,
+            f.filepath,
+            f.file_size,
+            f.search_text,
+            f.extension,
+            f.mime_type,
+            f.uploaded_at,
+            f.folder_id,
+            fold.name as folder_name,
+            fold.panel,
+            fold.parent_id as folder_parent_id
+        FROM files f
+        INNER JOIN folders fold ON f.folder_id = fold.id
+    """)
+
+
+def _add_trash(db, progress_callback=None):
+    """
+    Corbeille: suppression logique des dossiers et fichiers (deleted_at)
+    
+    Un élément supprimé est seulement marqué: il peut être restauré, puis
+    il est effacé en arrière-plan une fois le délai de conservation écoulé
+    (utils/trash_purger.py). Les lignes orphelines laissées par les
+    suppressions antérieures, quand les clés étrangères n'étaient pas
+    appliquées, sont mises à la corbeille pour que leurs blobs soient purgés.
+    """
+    cursor = db.cursor
+    for table in ('folders', 'files'):
+        if 'deleted_at' not in _table_columns(cursor, table):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN deleted_at TIMESTAMP DEFAULT NULL")
+    
+    # Index partiels: seule la corbeille y figure
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_folders_trash ON folders(deleted_at) WHERE deleted_at IS NOT NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_trash ON files(deleted_at) WHERE deleted_at IS NOT NULL")
+    
+    # Orphelins: dossiers sans parent, leurs sous-arbres, fichiers sans dossier
+    cursor.execute("""
+        UPDATE folders SET parent_id = NULL, deleted_at = CURRENT_TIMESTAMP
+        WHERE parent_id IS NOT NULL AND parent_id NOT IN (SELECT id FROM folders)
+    """)
+    cursor.execute("""
+        UPDATE folders SET deleted_at = CURRENT_TIMESTAMP
+        WHERE deleted_at IS NULL AND id IN (
+            SELECT t.descendant_id FROM folder_tree t
+            INNER JOIN folders fo ON fo.id = t.ancestor_id
+            WHERE fo.deleted_at IS NOT NULL
+        )
+    """)
+    cursor.execute("""
+        UPDATE files SET deleted_at = CURRENT_TIMESTAMP
+        WHERE folder_id NOT IN (SELECT id FROM folders)
+    """)
+    
+    # Un fichier à la corbeille sort des compteurs dès son marquage, pas
+    # lors de sa purge. Un dossier à la corbeille garde sa place pour être
+    # restauré, mais ses ancêtres ne comptent plus son sous-arbre: les
+    # fichiers qu'il contient ne modifient plus aucun compteur (ceux du
+    # sous-arbre sont recalculés à la restauration, Database.restore_folder)
+    for trigger in ('insert', 'delete', 'trash', 'restore', 'update'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_files_stats_{trigger}")
+    cursor.execute("""
+        CREATE TRIGGER trg_files_stats_insert AFTER INSERT ON files
+        WHEN (SELECT deleted_at FROM folders WHERE id = NEW.folder_id) IS NULL
+        BEGIN
+            UPDATE folder_stats SET
+                direct_files = direct_files + 1,
+                direct_bytes = direct_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id = NEW.folder_id;
+            UPDATE folder_stats SET
+                total_files = total_files + 1,
+                total_bytes = total_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = NEW.folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_files_stats_delete AFTER DELETE ON files
+        WHEN OLD.deleted_at IS NULL AND (SELECT deleted_at FROM folders WHERE id = OLD.folder_id) IS NULL
+        BEGIN
+            UPDATE folder_stats SET
+                direct_files = direct_files - 1,
+                direct_bytes = direct_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id = OLD.folder_id;
+            UPDATE folder_stats SET
+                total_files = total_files - 1,
+                total_bytes = total_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = OLD.folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_files_stats_trash AFTER UPDATE OF deleted_at ON files
+        WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL
+          AND (SELECT deleted_at FROM folders WHERE id = OLD.folder_id) IS NULL
+        BEGIN
+            UPDATE folder_stats SET
+                direct_files = direct_files - 1,
+                direct_bytes = direct_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id = OLD.folder_id;
+            UPDATE folder_stats SET
+                total_files = total_files - 1,
+                total_bytes = total_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = OLD.folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_files_stats_restore AFTER UPDATE OF deleted_at ON files
+        WHEN OLD.deleted_at IS NOT NULL AND NEW.deleted_at IS NULL
+          AND (SELECT deleted_at FROM folders WHERE id = NEW.folder_id) IS NULL
+        BEGIN
+            UPDATE folder_stats SET
+                direct_files = direct_files + 1,
+                direct_bytes = direct_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id = NEW.folder_id;
+            UPDATE folder_stats SET
+                total_files = total_files + 1,
+                total_bytes = total_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = NEW.folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_files_stats_update AFTER UPDATE OF folder_id, file_size ON files
+        WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NULL
+        BEGIN
+            UPDATE folder_stats SET
+                direct_files = direct_files - 1,
+                direct_bytes = direct_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id = OLD.folder_id
+              AND (SELECT deleted_at FROM folders WHERE id = OLD.folder_id) IS NULL;
+            UPDATE folder_stats SET
+                total_files = total_files - 1,
+                total_bytes = total_bytes - COALESCE(OLD.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = OLD.folder_id)
+              AND (SELECT deleted_at FROM folders WHERE id = OLD.folder_id) IS NULL;
+            UPDATE folder_stats SET
+                direct_files = direct_files + 1,
+                direct_bytes = direct_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id = NEW.folder_id
+              AND (SELECT deleted_at FROM folders WHERE id = NEW.folder_id) IS NULL;
+            UPDATE folder_stats SET
+                total_files = total_files + 1,
+                total_bytes = total_bytes + COALESCE(NEW.file_size, 0)
+            WHERE folder_id IN (SELECT ancestor_id FROM folder_tree WHERE descendant_id = NEW.folder_id)
+              AND (SELECT deleted_at FROM folders WHERE id = NEW.folder_id) IS NULL;
+        END
+    """)
+    db._rebuild_folder_stats()
+    
+    # La recherche ignore la corbeille
+    cursor.execute("DROP VIEW IF EXISTS v_files_search")
+    cursor.execute("""
+        CREATE VIEW v_files_search AS
+        SELECT
+            f.id,
+            f.filename,
+            f.filepath,
+            f.file_size,
+            f.search_text,
+            f.extension,
+            f.mime_type,
+            f.uploaded_at,
+            f.folder_id,
+            fold.name as folder_name,
+            fold.panel,
+            fold.parent_id as folder_parent_id
+        FROM files f
+        INNER JOIN folders fold ON f.folder_id = fold.id
+        WHERE f.deleted_at IS NULL AND fold.deleted_at IS NULL
+    """)
+
+
+def _add_blob_verification(db, progress_callback=None):
+    """Date et résultat de la dernière vérification de chaque blob (utils/storage_scrubber.py)"""
+    cursor = db.cursor
+    columns = _table_columns(cursor, 'blobs')
+    if 'verified_at' not in columns:
+        cursor.execute("ALTER TABLE blobs ADD COLUMN verified_at REAL DEFAULT 0")
+    if 'verify_error' not in columns:
+        cursor.execute("ALTER TABLE blobs ADD COLUMN verify_error TEXT DEFAULT ''")
+    
+    # Les blobs jamais ou le plus anciennement vérifiés passent en premier
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_blobs_verified_at ON blobs(verified_at)")
+    # Comptage exact des références d'un blob
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_filepath ON files(filepath)")
+
+
+def _add_sharded_layout(db, progress_callback=None):
+    """
+    Arborescence répartie des blobs (utils/shard_migrator.py)
+    
+    Le déplacement d'un blob change files.filepath sans changer le contenu:
+    le texte extrait n'est plus oublié que si l'empreinte change aussi.
+    """
+    cursor = db.cursor
+    cursor.execute("DROP TRIGGER IF EXISTS trg_files_contents_update")
+    cursor.execute("""
+        CREATE TRIGGER trg_files_contents_update AFTER UPDATE OF filepath ON files
+        WHEN OLD.filepath <> NEW.filepath AND OLD.file_hash IS NOT NEW.file_hash
+        BEGIN
+            DELETE FROM file_contents WHERE file_id = OLD.id;
+        END
+    """)
+
+
+# Étapes dans l'ordre d'application; la version d'une base est l'indice de
+# la dernière étape appliquée. Ne jamais réordonner: ajouter à la fin.
+MIGRATIONS = [
+    ("Colonnes historiques", _migrate_legacy_columns),
+    ("Tables principales", _create_core_tables),
+    ("Arborescence (table de fermeture)", _create_folder_tree),
+    ("Références des blobs", _create_blobs),
+    ("Compteurs de dossiers", _create_folder_stats),
+    ("Contenu des documents et synchronisation", _create_contents_and_sync),
+    ("Index de recherche", _create_search_indexes),
+    ("Index plein texte", _create_fulltext_index),
+    ("Admin par défaut", _create_default_admin),
+    ("Empreintes des fichiers", _backfill_files),
+    ("Extension et type des fichiers", _add_file_type_columns),
+    ("Corbeille", _add_trash),
+    ("Vérification des blobs", _add_blob_verification),
+    ("Arborescence répartie des blobs", _add_sharded_layout),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def run_migrations(db, progress_callback: Optional[ProgressCallback] = None) -> int:
+    """
+    Appliquer les étapes manquantes à la base ouverte par `db`
+    
+    Chaque étape est validée avec son numéro de version: une migration
+    interrompue reprend à l'étape où elle s'est arrêtée.
+    
+    Returns:
+        Version du schéma après migration
+    """
+    cursor = db.cursor
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return version
+    
+    for number, (description, step) in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f"🔄 Migration {number}/{SCHEMA_VERSION}: {description}")
+        try:
+            # Transaction explicite: sqlite3 n'en ouvre pas pour les CREATE/ALTER
+            cursor.execute("BEGIN")
+            step(db, progress_callback)
+            # PRAGMA n'accepte pas de paramètre lié; number est un entier
+            cursor.execute(f"PRAGMA user_version = {int(number)}")
+            db.conn.commit()
+        except Exception as e:
+            db.conn.rollback()
+            print(f"❌ Erreur lors de la migration {number} ({description}): {e}")
+            raise
+    
+    print(f"✅ Schéma de la base à jour (version {SCHEMA_VERSION})")
+    return SCHEMA_VERSION
+
+
+def migrate_database(db_path="portal.db", upload_dir="uploads"):
+    """Migrer une base de données sans lancer l'application"""
+    from database import Database
+    from utils.file_handler import FileHandler
+    
+    # Les migrations lisent les blobs chiffrés (empreintes en clair)
+    file_handler = FileHandler(upload_dir)
+    try:
+        Database(db_path, file_handler=file_handler).close()
+    finally:
+        file_handler.temp_files.close()
+
+
+def rebuild_folder_stats(db_path="portal.db", upload_dir="uploads"):
+    """Recalculer les compteurs agrégés des dossiers (table folder_stats)"""
+    from database import Database
+    from utils.file_handler import FileHandler
+    
+    file_handler = FileHandler(upload_dir)
+    db = Database(db_path, file_handler=file_handler)
+    try:
+        db.rebuild_folder_stats()
     finally:
-        conn.close()
+        file_handler.temp_files.close()
+        db.close()
 
-def calculate_file_hash(filepath: str) -> str:
-    """Calculer le hash SHA256 d'un fichier"""
+
+def scrub_storage(db_path="portal.db", upload_dir="uploads", repair=False):
+    """Vérifier en une passe complète la base, les métadonnées et les blobs chiffrés"""
+    from database import Database
+    from utils.file_handler import FileHandler
+    from utils.storage_scrubber import StorageScrubber
+    
+    file_handler = FileHandler(upload_dir)
+    db = Database(db_path, file_handler=file_handler)
+    db.on_blobs_released = file_handler.discard_blobs
     try:
-        hash_sha256 = hashlib.sha256()
-        with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
-    except Exception:
-        return ""
+        # Ligne de commande: tous les blobs, sans limite de débit
+        StorageScrubber(file_handler, db, max_bytes_per_second=None).run(repair=repair, verify_limit=None)
+    finally:
+        file_handler.temp_files.close()
+        db.close()
+
+
+def shard_storage(db_path="portal.db", upload_dir="uploads"):
+    """Ranger sans attendre tous les blobs dans l'arborescence répartie"""
+    from database import Database
+    from utils.file_handler import FileHandler
+    from utils.shard_migrator import ShardMigrator
+    
+    file_handler = FileHandler(upload_dir)
+    db = Database(db_path, file_handler=file_handler)
+    db.on_blobs_released = file_handler.discard_blobs
+    try:
+        ShardMigrator(file_handler, db, batch_size=1000, pause=0).migrate()
+    finally:
+        file_handler.temp_files.close()
+        db.close()
+
 
 if __name__ == "__main__":
-    migrate_database()
+    args = sys.argv[1:]
+    upload_dir = "uploads"
+    if "--uploads" in args:
+        index = args.index("--uploads")
+        upload_dir = args[index + 1]
+        del args[index:index + 2]
+    
+    positional = [arg for arg in args if not arg.startswith("--")]
+    db_path = positional[0] if positional else "portal.db"
+    
+    if "--rebuild-folder-stats" in args:
+        rebuild_folder_stats(db_path, upload_dir)
+    elif "--scrub" in args:
+        scrub_storage(db_path, upload_dir, repair="--repair" in args)
+    elif "--shard" in args:
+        shard_storage(db_path, upload_dir)
+    else:
+        migrate_database(db_path, upload_dir)
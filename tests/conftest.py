@@ -0,0 +1,160 @@
+# tests/conftest.py
+"""
+Fixtures communes: base et stockage chiffré dans un répertoire temporaire
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import uuid
+
+import pytest
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from utils.file_handler import FileHandler
+
+# Schéma créé par la première version de l'application (avant les migrations)
+BASELINE_SCHEMA = """
+    CREATE TABLE admins (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        password TEXT,
+        password_hash TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE folders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        parent_id INTEGER DEFAULT NULL,
+        panel TEXT DEFAULT 'interface_emp',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (parent_id) REFERENCES folders(id) ON DELETE CASCADE
+    );
+    CREATE TABLE files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        folder_id INTEGER NOT NULL,
+        filename TEXT NOT NULL,
+        filepath TEXT NOT NULL,
+        file_size INTEGER DEFAULT 0,
+        file_hash TEXT DEFAULT '',
+        search_text TEXT DEFAULT '',
+        uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE
+    );
+    CREATE INDEX idx_files_folder_id ON files(folder_id);
+    CREATE INDEX idx_folders_parent_id ON folders(parent_id);
+    CREATE VIEW v_files_search AS
+    SELECT f.id, f.filename, f.filepath, f.file_size, f.search_text, f.uploaded_at, f.folder_id,
+           fold.name as folder_name, fold.panel, fold.parent_id as folder_parent_id
+    FROM files f
+    INNER JOIN folders fold ON f.folder_id = fold.id;
+"""
+
+# Documents de la base historique: (dossier, nom, contenu en clair)
+LEGACY_DOCUMENTS = [
+    ("Racine", "doc0.pdf", b"%PDF-1.4 contenu A" * 1000),
+    ("Sous", "doc1.pdf", b"%PDF-1.4 contenu B" * 2000),
+    ("Racine", "doc2.docx", os.urandom(70 * 1024)),
+    ("Sous", "doc3.pdf", b"%PDF-1.4 contenu D" * 50),
+    ("Racine", "copie.pdf", b"%PDF-1.4 contenu A" * 1000),  # même contenu que doc0.pdf
+]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Répertoire de travail isolé (Database lit encryption.key dans le répertoire courant)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def file_handler(workdir):
+    handler = FileHandler(str(workdir / "uploads"))
+    yield handler
+    handler.temp_files.close()
+
+
+@pytest.fixture
+def db(workdir, file_handler):
+    database = Database(str(workdir / "portal.db"), file_handler=file_handler)
+    database.on_blobs_released = file_handler.discard_blobs
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def metadata_db(workdir):
+    """Base sans stockage: les chemins de blobs enregistrés restent fictifs"""
+    database = Database(str(workdir / "portal.db"))
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def make_source(workdir):
+    """Créer un fichier source à importer"""
+    source_dir = workdir / "src"
+    source_dir.mkdir()
+
+    def make(name: str, content: bytes) -> str:
+        path = source_dir / name
+        path.write_bytes(content)
+        return str(path)
+    return make
+
+
+@pytest.fixture
+def legacy_store(workdir):
+    """
+    Base et stockage tels que les écrivait la première version: blobs Fernet
+    nommés {uuid}_{sha8}.enc par panel, taille et empreinte du fichier chiffré
+
+    Returns:
+        {nom du fichier: contenu en clair}
+    """
+    upload_dir = workdir / "uploads"
+    panel_dir = upload_dir / ".encrypted" / "interface_emp"
+    panel_dir.mkdir(parents=True)
+    key = Fernet.generate_key()
+    (upload_dir / ".encryption.key").write_bytes(key)
+
+    conn = sqlite3.connect(str(workdir / "portal.db"))
+    conn.executescript(BASELINE_SCHEMA)
+    folders = {"Racine": conn.execute("INSERT INTO folders (name) VALUES ('Racine')").lastrowid}
+    folders["Sous"] = conn.execute("INSERT INTO folders (name, parent_id) VALUES ('Sous', ?)",
+                                   (folders["Racine"],)).lastrowid
+
+    metadata = {}
+    for folder, filename, content in LEGACY_DOCUMENTS:
+        file_id = str(uuid.uuid4())
+        encrypted_filename = f"{file_id}_{hashlib.sha256(filename.encode()).hexdigest()[:8]}.enc"
+        token = Fernet(key).encrypt(content)
+        filepath = panel_dir / encrypted_filename
+        filepath.write_bytes(token)
+        conn.execute(
+            "INSERT INTO files (folder_id, filename, filepath, file_size, file_hash, search_text) VALUES (?, ?, ?, ?, ?, ?)",
+            (folders[folder], filename, str(filepath), len(token), hashlib.sha256(token).hexdigest(), filename)
+        )
+        metadata[encrypted_filename] = {'original_name': filename, 'panel': 'interface_emp',
+                                        'size': len(content), 'created_at': 0, 'file_id': file_id}
+    conn.commit()
+    conn.close()
+    (upload_dir / ".metadata.json").write_text(json.dumps(metadata), encoding='utf-8')
+
+    return {filename: content for _, filename, content in LEGACY_DOCUMENTS}
+
+
+@pytest.fixture
+def upgraded(legacy_store, workdir):
+    """Ouvrir la base historique avec l'application courante (migrations comprises)"""
+    file_handler = FileHandler(str(workdir / "uploads"))
+    db = Database(str(workdir / "portal.db"), file_handler=file_handler)
+    db.on_blobs_released = file_handler.discard_blobs
+    yield file_handler, db, legacy_store
+    db.close()
+    file_handler.temp_files.close()
@@ -0,0 +1,131 @@
+# tests/test_dedup.py
+"""
+Stockage adressé par contenu: doublons et compteurs de références à
+travers la corbeille et la purge
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+from utils.file_handler import store_blob
+from utils.pack_store import PACK_THRESHOLD
+from utils.trash_purger import TrashPurger
+
+SMALL = b"petit document " * 100
+LARGE = os.urandom(PACK_THRESHOLD + 1000)
+
+
+def _ref_count(db, filepath):
+    row = db.cursor.execute("SELECT ref_count FROM blobs WHERE filepath = ?", (filepath,)).fetchone()
+    return row['ref_count'] if row else None
+
+
+def _purge(file_handler, db):
+    return TrashPurger(file_handler, db, pause=0, retention_days=0).purge_pending()
+
+
+def _import(file_handler, db, folder_id, path, name):
+    stored = file_handler.store_file(path, name)
+    file_id = db.add_file(folder_id, name, stored['filepath'], stored['file_hash'], stored['file_size'])
+    return stored, file_id
+
+
+@pytest.mark.parametrize("content", [SMALL, LARGE], ids=["empaquete", "isole"])
+def test_duplicate_shares_blob_until_last_reference_is_purged(file_handler, db, make_source, content):
+    folder_id = db.create_folder("Racine")
+    first, first_id = _import(file_handler, db, folder_id, make_source("a.pdf", content), "a.pdf")
+    second, second_id = _import(file_handler, db, folder_id, make_source("b.pdf", content), "b.pdf")
+
+    assert first['is_duplicate'] is False
+    assert second['is_duplicate'] is True
+    assert second['filepath'] == first['filepath']
+    filepath = first['filepath']
+    assert _ref_count(db, filepath) == 2
+    assert (filepath in file_handler.packs) == (content is SMALL)
+
+    # À la corbeille, le fichier référence encore le blob
+    assert db.delete_file(first_id)
+    assert _ref_count(db, filepath) == 2
+    assert db.restore_file(first_id)
+    assert db.delete_file(first_id)
+
+    _purge(file_handler, db)
+    assert _ref_count(db, filepath) == 1
+    assert file_handler.file_exists(filepath)
+    assert file_handler.hash_file(filepath) == first['file_hash']
+
+    assert db.delete_file(second_id)
+    _purge(file_handler, db)
+    assert _ref_count(db, filepath) is None
+    assert not file_handler.file_exists(filepath)
+
+    # Le même contenu réimporté après la purge est de nouveau stocké
+    again, _ = _import(file_handler, db, folder_id, make_source("c.pdf", content), "c.pdf")
+    assert again['is_duplicate'] is False
+    assert again['filepath'] == filepath
+    assert file_handler.hash_file(filepath) == first['file_hash']
+
+
+
+@pytest.mark.parametrize("content", [SMALL, LARGE], ids=["empaquete", "isole"])
+def test_duplicate_purged_before_its_row_is_written_is_rejected(file_handler, db, make_source, content):
+    folder_id = db.create_folder("Racine")
+    first, first_id = _import(file_handler, db, folder_id, make_source("a.pdf", content), "a.pdf")
+    # Le doublon est reconnu, puis la purge passe avant l'écriture de sa ligne
+    second = file_handler.store_file(make_source("b.pdf", content), "b.pdf")
+    assert second['is_duplicate'] is True
+    assert db.delete_file(first_id)
+    _purge(file_handler, db)
+    assert not file_handler.file_exists(first['filepath'])
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db.add_file(folder_id, "b.pdf", second['filepath'], second['file_hash'], second['file_size'])
+    assert db.get_files_in_folder(folder_id) == []
+    assert _ref_count(db, first['filepath']) is None
+
+
+def test_purge_keeps_blob_referenced_again_by_an_import(file_handler, db, make_source):
+    folder_id = db.create_folder("Racine")
+    first, first_id = _import(file_handler, db, folder_id, make_source("a.pdf", LARGE), "a.pdf")
+    assert db.delete_file(first_id)
+    # La ligne du doublon est écrite avant que la purge ne vérifie le blob
+    _import(file_handler, db, folder_id, make_source("b.pdf", LARGE), "b.pdf")
+
+    _purge(file_handler, db)
+    assert _ref_count(db, first['filepath']) == 1
+    assert file_handler.hash_file(first['filepath']) == first['file_hash']
+def test_purge_of_trashed_folder_releases_blobs(file_handler, db, make_source):
+    root = db.create_folder("Racine")
+    sub = db.create_folder("Sous", root)
+    stored, _ = _import(file_handler, db, sub, make_source("a.pdf", LARGE), "a.pdf")
+    _import(file_handler, db, root, make_source("b.pdf", LARGE), "b.pdf")
+    assert _ref_count(db, stored['filepath']) == 2
+
+    assert db.delete_folder(sub)
+    _purge(file_handler, db)
+    assert db.get_folder(sub) is None
+    assert _ref_count(db, stored['filepath']) == 1
+    assert file_handler.file_exists(stored['filepath'])
+
+
+def test_parallel_import_stores_identical_files_once(file_handler, db, make_source):
+    folder_id = db.create_folder("Racine")
+    paths = [make_source(f"copie{i}.pdf", SMALL) for i in range(3)] + [make_source("autre.pdf", LARGE)]
+
+    assert file_handler.import_files(paths, db, folder_id) == 4
+
+    files = db.get_files_in_folder(folder_id)
+    assert len(files) == 4
+    filepaths = {row['filename']: row['filepath'] for row in files}
+    assert len({filepaths[f"copie{i}.pdf"] for i in range(3)}) == 1
+    assert _ref_count(db, filepaths["copie0.pdf"]) == 3
+    assert _ref_count(db, filepaths["autre.pdf"]) == 1
+    assert db.cursor.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 2
+
+    # Un petit doublon déjà empaqueté est reconnu avant tout chiffrement
+    stored = store_blob(paths[0], file_handler.objects_dir, file_handler.encryption_key,
+                        packs_index=file_handler.metadata_file)
+    assert stored['is_duplicate'] is True
+    assert 'packed_data' not in stored
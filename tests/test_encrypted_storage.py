@@ -0,0 +1,155 @@
+# tests/test_encrypted_storage.py
+"""
+Format .enc: aller-retour chiffrement/déchiffrement, anciens formats
+(Fernet, version 1) et compression par segment
+"""
+
+import hashlib
+import io
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+from utils import encrypted_storage
+from utils.encrypted_storage import (
+    CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD, FORMAT_VERSION, HEADER_SIZE,
+    _AAD_LENGTH, _SIZE_FIELD, EncryptedReader, decrypt_stream, encrypt_stream, read_header, reencrypt_stream
+)
+
+MASTER_KEY = Fernet.generate_key()
+SEGMENT_SIZE = 4096
+
+COMPRESSIBLE = b"%PDF-1.4 texte repetitif " * 2000
+RANDOM = os.urandom(3 * SEGMENT_SIZE + 123)
+
+
+def _encrypt(plain: bytes, **kwargs) -> bytes:
+    dest = io.BytesIO()
+    encrypt_stream(io.BytesIO(plain), dest, MASTER_KEY, segment_size=SEGMENT_SIZE, **kwargs)
+    return dest.getvalue()
+
+
+def _decrypt(data: bytes):
+    dest = io.BytesIO()
+    size, digest = decrypt_stream(io.BytesIO(data), dest, MASTER_KEY)
+    return dest.getvalue(), size, digest
+
+
+@pytest.mark.parametrize("codec", [CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD])
+@pytest.mark.parametrize("plain", [b"", b"x", COMPRESSIBLE, RANDOM], ids=["vide", "un-octet", "texte", "aleatoire"])
+def test_round_trip(codec, plain):
+    data = _encrypt(plain, codec=codec)
+    header = read_header(io.BytesIO(data))
+    assert header['version'] == FORMAT_VERSION
+    assert header['plaintext_size'] == len(plain)
+    # Sans le module zstandard, zstd est remplacé par zlib
+    if codec == CODEC_ZSTD and encrypted_storage.zstandard is None:
+        assert header['codec'] == CODEC_ZLIB
+    else:
+        assert header['codec'] == codec
+
+    decrypted, size, digest = _decrypt(data)
+    assert decrypted == plain
+    assert size == len(plain)
+    assert digest == hashlib.sha256(plain).hexdigest()
+
+
+def test_compression_shrinks_compressible_content():
+    assert len(_encrypt(COMPRESSIBLE, codec=CODEC_ZLIB)) < len(_encrypt(COMPRESSIBLE, codec=CODEC_NONE)) // 10
+
+
+def test_legacy_fernet_is_readable_and_converted():
+    token = Fernet(MASTER_KEY).encrypt(COMPRESSIBLE)
+    assert read_header(io.BytesIO(token)) is None
+    assert _decrypt(token)[0] == COMPRESSIBLE
+
+    converted = io.BytesIO()
+    size, digest = reencrypt_stream(io.BytesIO(token), converted, MASTER_KEY)
+    assert (size, digest) == (len(COMPRESSIBLE), hashlib.sha256(COMPRESSIBLE).hexdigest())
+    header = read_header(io.BytesIO(converted.getvalue()))
+    assert header['version'] == FORMAT_VERSION
+    assert header['codec'] != CODEC_NONE
+    assert _decrypt(converted.getvalue())[0] == COMPRESSIBLE
+
+
+def test_version_1_is_readable_and_converted(monkeypatch):
+    # Fichier écrit avant la compression: octet de codec réservé, à zéro
+    monkeypatch.setattr(encrypted_storage, 'FORMAT_VERSION', 1)
+    legacy = _encrypt(COMPRESSIBLE)
+    monkeypatch.undo()
+
+    header = read_header(io.BytesIO(legacy))
+    assert header['version'] == 1
+    assert header['codec'] == CODEC_NONE
+    assert _decrypt(legacy)[0] == COMPRESSIBLE
+
+    converted = io.BytesIO()
+    reencrypt_stream(io.BytesIO(legacy), converted, MASTER_KEY)
+    assert read_header(io.BytesIO(converted.getvalue()))['version'] == FORMAT_VERSION
+    assert _decrypt(converted.getvalue())[0] == COMPRESSIBLE
+
+
+def test_tampered_segment_is_rejected():
+    data = bytearray(_encrypt(RANDOM))
+    data[HEADER_SIZE + 40] ^= 0x01
+    with pytest.raises(ValueError):
+        _decrypt(bytes(data))
+
+
+def test_truncated_file_is_rejected():
+    data = _encrypt(RANDOM)
+    with pytest.raises(ValueError):
+        _decrypt(data[:-SEGMENT_SIZE])
+
+
+def _with_plaintext_size(data: bytes, size: int) -> bytes:
+    return data[:_AAD_LENGTH] + _SIZE_FIELD.pack(size) + data[_AAD_LENGTH + _SIZE_FIELD.size:]
+
+
+@pytest.mark.parametrize("codec", [CODEC_NONE, CODEC_ZLIB])
+@pytest.mark.parametrize("delta", [-1, -SEGMENT_SIZE, 1, SEGMENT_SIZE], ids=["-1", "-segment", "+1", "+segment"])
+def test_edited_plaintext_size_is_rejected(codec, delta):
+    # La taille de l'en-tête n'est pas dans les données associées: les
+    # segments authentifiés doivent la contredire
+    data = _with_plaintext_size(_encrypt(RANDOM, codec=codec), len(RANDOM) + delta)
+    with pytest.raises(ValueError):
+        _decrypt(data)
+
+    reader = EncryptedReader(io.BytesIO(data), MASTER_KEY)
+    with pytest.raises(ValueError):
+        reader.read()
+    reader.close()
+
+
+def test_edited_size_of_empty_file_is_rejected():
+    with pytest.raises(ValueError):
+        _decrypt(_with_plaintext_size(_encrypt(b""), 10))
+
+
+def test_wrong_key_is_rejected():
+    data = _encrypt(RANDOM)
+    with pytest.raises(ValueError):
+        decrypt_stream(io.BytesIO(data), io.BytesIO(), Fernet.generate_key())
+
+
+@pytest.mark.parametrize("codec", [CODEC_NONE, CODEC_ZLIB])
+def test_reader_random_access(codec):
+    plain = (COMPRESSIBLE if codec else RANDOM)[:3 * SEGMENT_SIZE + 123]
+    reader = EncryptedReader(io.BytesIO(_encrypt(plain, codec=codec)), MASTER_KEY)
+    assert reader.size == len(plain)
+
+    # Lectures à cheval sur des segments, dans le désordre
+    for offset, length in [(SEGMENT_SIZE - 10, 20), (0, 5), (2 * SEGMENT_SIZE + 100, 500), (len(plain) - 3, 10)]:
+        reader.seek(offset)
+        assert reader.read(length) == plain[offset:offset + length]
+    reader.seek(-7, io.SEEK_END)
+    assert reader.read() == plain[-7:]
+    reader.close()
+
+
+def test_reader_legacy_fernet():
+    reader = EncryptedReader(io.BytesIO(Fernet(MASTER_KEY).encrypt(RANDOM)), MASTER_KEY)
+    reader.seek(SEGMENT_SIZE)
+    assert reader.read(100) == RANDOM[SEGMENT_SIZE:SEGMENT_SIZE + 100]
+    reader.close()
@@ -0,0 +1,41 @@
+# tests/test_import_journal.py
+"""
+Journal de reprise des imports: sources enregistrées, échecs définitifs
+et suppression du journal terminé
+"""
+
+import os
+
+from utils.import_journal import ImportJournal, list_interrupted_jobs
+
+
+def test_failed_sources_survive_reload_and_complete_the_journal(tmp_path):
+    journal = ImportJournal.create(str(tmp_path), 'files', {'sources': []}, total=3)
+    journal.record_done([("/src/a.pdf", 1)])
+    journal.record_failed([("/src/b.pdf", "illisible")])
+    journal.close()
+
+    loaded = ImportJournal.load(journal.path)
+    assert loaded.completed == {"/src/a.pdf"}
+    assert loaded.failed == {"/src/b.pdf": "illisible"}
+    assert loaded.is_done("/src/b.pdf")
+    assert not loaded.is_done("/src/c.pdf")
+    assert not loaded.is_complete
+
+    loaded.record_failed([("/src/c.pdf", "illisible")])
+    assert loaded.is_complete
+    loaded.close()
+
+
+def test_import_with_unreadable_source_finishes_its_journal(file_handler, db, make_source, workdir):
+    folder_id = db.create_folder("Racine")
+    good = make_source("a.pdf", b"document lisible " * 100)
+    # Un dossier nommé comme un PDF ne peut pas être lu
+    broken = workdir / "src" / "casse.pdf"
+    broken.mkdir()
+
+    assert file_handler.import_files([good, str(broken)], db, folder_id) == 1
+
+    assert [row['filename'] for row in db.get_files_in_folder(folder_id)] == ["a.pdf"]
+    assert list_interrupted_jobs(file_handler.jobs_dir) == []
+    assert os.listdir(file_handler.jobs_dir) == []
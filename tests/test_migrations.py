@@ -0,0 +1,130 @@
+# tests/test_migrations.py
+"""
+Migrations du schéma appliquées à une base créée par la première version
+"""
+
+import hashlib
+import os
+import sqlite3
+
+from database import Database
+from migrate_database import SCHEMA_VERSION, run_migrations
+from utils.file_handler import FileHandler
+from utils.shard_migrator import ShardMigrator
+from utils.storage_scrubber import StorageScrubber
+
+
+def _files(db):
+    db.cursor.execute("SELECT * FROM files ORDER BY id")
+    return {row['filename']: dict(row) for row in db.cursor.fetchall()}
+
+
+def test_schema_reaches_current_version(upgraded):
+    _, db, _ = upgraded
+    assert db.cursor.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    # Nouvelle ouverture: aucune étape à rejouer
+    assert run_migrations(db) == SCHEMA_VERSION
+
+
+def test_backfill_stores_plaintext_size_and_hash(upgraded):
+    file_handler, db, contents = upgraded
+    files = _files(db)
+    for filename, content in contents.items():
+        assert files[filename]['file_size'] == len(content)
+        assert files[filename]['file_hash'] == hashlib.sha256(content).hexdigest()
+        assert file_handler.hash_file(files[filename]['filepath']) == files[filename]['file_hash']
+
+    db.cursor.execute("SELECT filepath, file_hash, ref_count FROM blobs")
+    blobs = {row['filepath']: row for row in db.cursor.fetchall()}
+    assert len(blobs) == len(contents)
+    for row in files.values():
+        assert blobs[row['filepath']]['file_hash'] == row['file_hash']
+        assert blobs[row['filepath']]['ref_count'] == 1
+
+
+def test_folder_stats_count_plaintext_bytes(upgraded):
+    _, db, contents = upgraded
+    files = _files(db)
+    root = files['doc0.pdf']['folder_id']
+    sub = files['doc1.pdf']['folder_id']
+    in_sub = ['doc1.pdf', 'doc3.pdf']
+
+    stats = db.get_folders_stats([root, sub])
+    assert stats[sub] == {
+        'file_count': 2, 'total_size': sum(len(contents[name]) for name in in_sub),
+        'direct_files': 2, 'direct_size': sum(len(contents[name]) for name in in_sub)
+    }
+    assert stats[root]['file_count'] == len(contents)
+    assert stats[root]['total_size'] == sum(len(content) for content in contents.values())
+    assert stats[root]['direct_files'] == len(contents) - 2
+
+
+def test_unreadable_blob_keeps_unknown_hash(legacy_store, workdir):
+    db_path = str(workdir / "portal.db")
+    file_handler = FileHandler(str(workdir / "uploads"))
+    conn = sqlite3.connect(db_path)
+    filepath = conn.execute("SELECT filepath FROM files WHERE filename = 'doc3.pdf'").fetchone()[0]
+    conn.close()
+    with open(filepath, 'wb') as f:
+        f.write(b"illisible")
+
+    db = Database(db_path, file_handler=file_handler)
+    try:
+        files = _files(db)
+        # L'empreinte du fichier chiffré ne doit pas passer pour une empreinte en clair
+        assert files['doc3.pdf']['file_hash'] == ''
+        assert files['doc0.pdf']['file_hash'] == hashlib.sha256(legacy_store['doc0.pdf']).hexdigest()
+    finally:
+        db.close()
+        file_handler.temp_files.close()
+
+
+def test_backfill_without_file_handler_leaves_blobs_to_the_scrubber(legacy_store, workdir):
+    db_path = str(workdir / "portal.db")
+    conn = sqlite3.connect(db_path)
+    recorded = dict(conn.execute("SELECT filename, file_size FROM files"))
+    conn.close()
+
+    db = Database(db_path)
+    try:
+        files = _files(db)
+        assert {filename: row['file_size'] for filename, row in files.items()} == recorded
+        assert {row['file_hash'] for row in files.values()} == {''}
+    finally:
+        db.close()
+
+    file_handler = FileHandler(str(workdir / "uploads"))
+    db = Database(db_path, file_handler=file_handler)
+    try:
+        StorageScrubber(file_handler, db, max_bytes_per_second=None).run(repair=True, verify_limit=None)
+        for filename, row in _files(db).items():
+            assert row['file_hash'] == hashlib.sha256(legacy_store[filename]).hexdigest()
+            assert row['file_size'] == len(legacy_store[filename])
+    finally:
+        db.close()
+        file_handler.temp_files.close()
+
+
+def test_legacy_duplicates_share_one_content_address(upgraded):
+    file_handler, db, contents = upgraded
+    file_handler.convert_legacy_files()
+    ShardMigrator(file_handler, db, pause=0).migrate()
+
+    files = _files(db)
+    assert files['copie.pdf']['filepath'] == files['doc0.pdf']['filepath']
+    for filename, content in contents.items():
+        filepath = files[filename]['filepath']
+        assert os.path.basename(filepath) == f"{file_handler.blob_id(files[filename]['file_hash'])}.enc"
+        assert file_handler.file_exists(filepath)
+        assert file_handler.hash_file(filepath) == hashlib.sha256(content).hexdigest()
+
+    db.cursor.execute("SELECT ref_count FROM blobs WHERE filepath = ?", (files['doc0.pdf']['filepath'],))
+    assert db.cursor.fetchone()['ref_count'] == 2
+
+    # Un nouvel import du même document est reconnu comme doublon
+    source = os.path.join(os.getcwd(), "doc0.pdf")
+    with open(source, 'wb') as f:
+        f.write(contents['doc0.pdf'])
+    stored = file_handler.store_file(source, "doc0.pdf")
+    assert stored['is_duplicate'] is True
+    assert stored['filepath'] == files['doc0.pdf']['filepath']
@@ -0,0 +1,100 @@
+# tests/test_pagination.py
+"""
+Pagination par curseur (uploaded_at, id): bornes des pages et égalités de date
+"""
+
+import pytest
+
+
+def _add_files(db, folder_id, count, prefix="rapport"):
+    rows = [(folder_id, f"{prefix}{i:03}.pdf", f"/blobs/{prefix}{folder_id}-{i}.enc", f"{i:064x}", 10)
+            for i in range(count)]
+    return db.add_files_batch(rows)
+
+
+def _all_pages(fetch, page_size):
+    pages = []
+    after = None
+    while True:
+        rows, after = fetch(page_size=page_size, after=after)
+        pages.append([row['id'] for row in rows])
+        if after is None:
+            return pages
+        assert len(pages) <= 100, "la pagination ne se termine pas"
+
+
+@pytest.fixture
+def folder(metadata_db):
+    folder_id = metadata_db.create_folder("Racine")
+    ids = _add_files(metadata_db, folder_id, 25)
+    # Trois dates distinctes, dont une partagée par plusieurs fichiers
+    update = lambda sql, params: metadata_db._write(metadata_db._execute, sql, params)
+    update("UPDATE files SET uploaded_at = '2024-01-01 10:00:00' WHERE id <= ?", (ids[9],))
+    update("UPDATE files SET uploaded_at = '2024-06-01 10:00:00' WHERE id > ? AND id <= ?", (ids[9], ids[19]))
+    update("UPDATE files SET uploaded_at = '2025-01-01 10:00:00' WHERE id > ?", (ids[19],))
+    return folder_id, ids
+
+
+def _expected_order(db, folder_id):
+    db.cursor.execute(
+        "SELECT id FROM files WHERE folder_id = ? AND deleted_at IS NULL ORDER BY uploaded_at DESC, id DESC",
+        (folder_id,)
+    )
+    return [row['id'] for row in db.cursor.fetchall()]
+
+
+@pytest.mark.parametrize("page_size", [1, 4, 5, 10, 24, 25, 26, 100])
+def test_pages_cover_every_file_once_in_order(metadata_db, folder, page_size):
+    folder_id, ids = folder
+    pages = _all_pages(lambda **kw: metadata_db.get_files_in_folder_page(folder_id, **kw), page_size)
+
+    assert [file_id for page in pages for file_id in page] == _expected_order(metadata_db, folder_id)
+    assert all(len(page) == page_size for page in pages[:-1])
+    # Un total multiple de la taille de page ne produit pas de page vide
+    assert 0 < len(pages[-1]) <= page_size
+    assert len(pages) == -(-len(ids) // page_size)
+
+
+def test_cursor_ignores_file_added_before_it(metadata_db, folder):
+    folder_id, ids = folder
+    first, after = metadata_db.get_files_in_folder_page(folder_id, page_size=10)
+    # Un ajout plus récent que le curseur n'apparaît pas dans la suite
+    added = _add_files(metadata_db, folder_id, 1, prefix="nouveau")
+    following, after = metadata_db.get_files_in_folder_page(folder_id, page_size=100, after=after)
+
+    seen = [row['id'] for row in first] + [row['id'] for row in following]
+    assert after is None
+    assert sorted(seen) == sorted(ids)
+    assert added[0] not in seen
+
+
+def test_trashed_files_are_skipped(metadata_db, folder):
+    folder_id, ids = folder
+    for file_id in ids[::3]:
+        assert metadata_db.delete_file(file_id)
+
+    pages = _all_pages(lambda **kw: metadata_db.get_files_in_folder_page(folder_id, **kw), 4)
+    listed = [file_id for page in pages for file_id in page]
+    assert listed == _expected_order(metadata_db, folder_id)
+    assert not set(listed) & set(ids[::3])
+
+
+def test_empty_folder(metadata_db):
+    folder_id = metadata_db.create_folder("Vide")
+    assert metadata_db.get_files_in_folder_page(folder_id, page_size=10) == ([], None)
+
+
+def test_panel_pages(metadata_db, folder):
+    folder_id, ids = folder
+    other = metadata_db.create_folder("Autre", panel='autre')
+    _add_files(metadata_db, other, 3)
+
+    pages = _all_pages(lambda **kw: metadata_db.get_files_by_panel_page('interface_emp', **kw), 7)
+    assert sorted(file_id for page in pages for file_id in page) == sorted(ids)
+
+
+def test_search_pages(metadata_db, folder):
+    folder_id, ids = folder
+    pages = _all_pages(lambda **kw: metadata_db.search_files_page("rapport", **kw), 6)
+    found = [file_id for page in pages for file_id in page]
+    assert found == _expected_order(metadata_db, folder_id)
@@ -0,0 +1,95 @@
+# tests/test_query_cache.py
+"""
+Cache des lectures: invalidation à chaque écriture validée
+"""
+
+from database import QueryCache
+
+
+def test_cache_entry_expires_with_generation():
+    cache = QueryCache()
+    cache.put('cle', [1, 2], cache.generation)
+    assert cache.get('cle') == (True, [1, 2])
+
+    cache.invalidate()
+    assert cache.get('cle') == (False, None)
+
+
+def test_result_computed_during_a_write_is_not_cached():
+    cache = QueryCache()
+    generation = cache.generation
+    cache.invalidate()  # écriture validée pendant la lecture
+    cache.put('cle', 'périmé', generation)
+    assert cache.get('cle') == (False, None)
+
+
+def test_cached_values_are_copies():
+    cache = QueryCache()
+    cache.put('cle', {'noms': ['a']}, cache.generation)
+    cache.get('cle')[1]['noms'].append('b')
+    assert cache.get('cle') == (True, {'noms': ['a']})
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2)
+    cache.put('a', 1, cache.generation)
+    cache.put('b', 2, cache.generation)
+    cache.get('a')
+    cache.put('c', 3, cache.generation)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+
+
+def test_reads_are_served_from_cache_until_a_write(metadata_db):
+    folder_id = metadata_db.create_folder("Racine")
+    assert metadata_db.get_files_in_folder(folder_id) == []
+    generation = metadata_db.query_cache.generation
+    metadata_db.get_files_in_folder(folder_id)
+    assert metadata_db.query_cache.generation == generation
+
+    file_id = metadata_db.add_file(folder_id, "a.pdf", "/blobs/a.enc", "a" * 64, 10)
+    assert metadata_db.query_cache.generation > generation
+    assert [row['id'] for row in metadata_db.get_files_in_folder(folder_id)] == [file_id]
+
+
+def test_every_kind_of_write_refreshes_reads(metadata_db):
+    root = metadata_db.create_folder("Racine")
+    assert metadata_db.get_subfolders(root) == []
+    sub = metadata_db.create_folder("Sous", root)
+    assert [row['id'] for row in metadata_db.get_subfolders(root)] == [sub]
+
+    metadata_db.update_folder(sub, "Renommé")
+    assert metadata_db.get_folder(sub)['name'] == "Renommé"
+
+    assert metadata_db.get_folders_stats([root])[root]['file_count'] == 0
+    file_id = metadata_db.add_file(sub, "a.pdf", "/blobs/a.enc", "a" * 64, 10)
+    assert metadata_db.get_folders_stats([root])[root] == {
+        'file_count': 1, 'total_size': 10, 'direct_files': 0, 'direct_size': 0
+    }
+    assert metadata_db.get_file(file_id)['filename'] == "a.pdf"
+
+    assert metadata_db.delete_file(file_id)
+    assert metadata_db.get_file(file_id) is None
+    assert [row['id'] for row in metadata_db.get_trash()['files']] == [file_id]
+    assert metadata_db.get_folders_stats([root])[root]['file_count'] == 0
+
+    assert metadata_db.restore_file(file_id)
+    assert metadata_db.get_trash()['files'] == []
+    assert metadata_db.get_folders_stats([root])[root]['file_count'] == 1
+
+    other = metadata_db.create_folder("Autre")
+    assert metadata_db.move_folder(sub, other)
+    assert metadata_db.get_subfolders(root) == []
+    assert metadata_db.get_folders_stats([other])[other]['file_count'] == 1
+
+    assert metadata_db.delete_folder(other)
+    assert metadata_db.get_folder(other) is None
+    assert [row['id'] for row in metadata_db.get_trash()['folders']] == [other]
+
+
+def test_async_write_is_visible_once_its_future_resolves(metadata_db):
+    folder_id = metadata_db.create_folder("Racine")
+    assert metadata_db.get_folder(folder_id)['name'] == "Racine"
+    metadata_db.update_folder_async(folder_id, "Nouveau nom").result()
+    assert metadata_db.get_folder(folder_id)['name'] == "Nouveau nom"
@@ -0,0 +1,49 @@
+# tests/test_storage_scrubber.py
+"""
+Vérification du stockage: aucune fausse corruption sur des blobs hérités
+"""
+
+import hashlib
+
+from utils.storage_scrubber import StorageScrubber
+
+
+def _scrub(file_handler, db, repair=False):
+    scrubber = StorageScrubber(file_handler, db, max_bytes_per_second=None, orphan_grace=0)
+    return scrubber.run(repair=repair, verify_limit=None)
+
+
+def test_legacy_blobs_are_not_reported_corrupt(upgraded):
+    file_handler, db, contents = upgraded
+    report = _scrub(file_handler, db)
+    assert report['corrupt']['count'] == 0
+    assert report['verified'] == len(contents)
+
+    file_handler.convert_legacy_files()
+    report = _scrub(file_handler, db)
+    assert report['corrupt']['count'] == 0
+
+
+def test_tampered_blob_is_reported_corrupt(upgraded):
+    file_handler, db, _ = upgraded
+    filepath = db.cursor.execute("SELECT filepath FROM files WHERE filename = 'doc1.pdf'").fetchone()[0]
+    with open(filepath, 'r+b') as f:
+        f.seek(10)
+        f.write(b"XX")
+
+    report = _scrub(file_handler, db)
+    assert report['corrupt']['count'] == 1
+    assert filepath in report['corrupt']['examples']
+
+
+def test_repair_records_unknown_hashes(upgraded):
+    file_handler, db, contents = upgraded
+    db.cursor.execute("UPDATE files SET file_hash = '' WHERE filename = 'doc1.pdf'")
+    db.cursor.execute("UPDATE blobs SET file_hash = '' WHERE filepath IN "
+                      "(SELECT filepath FROM files WHERE filename = 'doc1.pdf')")
+    db.conn.commit()
+
+    report = _scrub(file_handler, db, repair=True)
+    assert report['corrupt']['count'] == 0
+    row = db.cursor.execute("SELECT file_hash FROM files WHERE filename = 'doc1.pdf'").fetchone()
+    assert row['file_hash'] == hashlib.sha256(contents['doc1.pdf']).hexdigest()
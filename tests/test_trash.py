@@ -0,0 +1,86 @@
+# tests/test_trash.py
+"""
+Corbeille: mise à la corbeille d'un sous-arbre, restauration et purge
+"""
+
+import sqlite3
+
+import pytest
+
+from utils.trash_purger import TrashPurger
+
+
+def _tree(db):
+    root = db.create_folder("Racine")
+    sub = db.create_folder("Sous", root)
+    leaf = db.create_folder("Feuille", sub)
+    db.add_file(sub, "a.pdf", "/blobs/a.enc", "a" * 64, 100)
+    db.add_file(leaf, "b.pdf", "/blobs/b.enc", "b" * 64, 50)
+    return root, sub, leaf
+
+
+def test_trashed_folder_keeps_its_place_and_is_restored(metadata_db):
+    root, sub, leaf = _tree(metadata_db)
+    assert metadata_db.get_folders_stats([root])[root]['total_size'] == 150
+
+    assert metadata_db.delete_folder(sub)
+    assert metadata_db.get_subfolders(root) == []
+    assert metadata_db.get_folders_stats([root])[root] == {
+        'file_count': 0, 'total_size': 0, 'direct_files': 0, 'direct_size': 0
+    }
+    row = metadata_db.cursor.execute("SELECT parent_id FROM folders WHERE id = ?", (sub,)).fetchone()
+    assert row['parent_id'] == root
+    # Seule la racine du sous-arbre est proposée à la restauration
+    assert [folder['id'] for folder in metadata_db.get_trash()['folders']] == [sub]
+
+    assert metadata_db.restore_folder(sub)
+    assert [folder['id'] for folder in metadata_db.get_subfolders(root)] == [sub]
+    assert [folder['id'] for folder in metadata_db.get_subfolders(sub)] == [leaf]
+    assert metadata_db.get_folders_stats([root, sub, leaf]) == {
+        root: {'file_count': 2, 'total_size': 150, 'direct_files': 0, 'direct_size': 0},
+        sub: {'file_count': 2, 'total_size': 150, 'direct_files': 1, 'direct_size': 100},
+        leaf: {'file_count': 1, 'total_size': 50, 'direct_files': 1, 'direct_size': 50},
+    }
+
+
+def test_separately_trashed_subfolder_stays_in_trash(metadata_db):
+    root, sub, leaf = _tree(metadata_db)
+    assert metadata_db.delete_folder(leaf)
+    assert metadata_db.delete_folder(sub)
+
+    assert metadata_db.restore_folder(sub)
+    assert metadata_db.get_subfolders(sub) == []
+    assert [folder['id'] for folder in metadata_db.get_trash()['folders']] == [leaf]
+    assert metadata_db.get_folders_stats([root])[root]['total_size'] == 100
+
+
+def test_restore_requires_live_parent(metadata_db):
+    root, sub, leaf = _tree(metadata_db)
+    assert metadata_db.delete_folder(leaf)
+    assert metadata_db.delete_folder(root)
+    assert not metadata_db.restore_folder(leaf)
+
+
+def test_folder_cannot_be_created_in_trash(metadata_db):
+    root, sub, leaf = _tree(metadata_db)
+    assert metadata_db.delete_folder(sub)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        metadata_db.create_folder("Nouveau", leaf)
+    with pytest.raises(sqlite3.IntegrityError):
+        metadata_db.create_folder("Nouveau", sub)
+    count = metadata_db.cursor.execute("SELECT COUNT(*) FROM folders WHERE name = 'Nouveau'").fetchone()[0]
+    assert count == 0
+
+
+def test_purge_respects_retention(file_handler, metadata_db):
+    root, sub, _ = _tree(metadata_db)
+    assert metadata_db.delete_folder(sub)
+
+    assert TrashPurger(file_handler, metadata_db, pause=0, retention_days=7).purge_pending() == 0
+    assert metadata_db.cursor.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 2
+
+    TrashPurger(file_handler, metadata_db, pause=0, retention_days=0).purge_pending()
+    assert metadata_db.cursor.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 0
+    assert [row['id'] for row in metadata_db.cursor.execute("SELECT id FROM folders")] == [root]
+    assert metadata_db.get_trash() == {'folders': [], 'files': []}
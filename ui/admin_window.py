@@ -3,6 +3,8 @@ from tkinter import messagebox, filedialog
 from tkinterdnd2 import DND_FILES
 from typing import Callable, Optional
 import os
+
+from utils.trash_purger import TRASH_RETENTION_DAYS
 class AdminWindow:
     """Fenêtre d'administration modernisée avec support des panels"""
    
@@ -140,6 +142,7 @@ class AdminWindow:
             ("➕ Nouveau Dossier", "#28a745", "#1e7e34", self.create_folder),
             ("📂 Importer Dossier", "#1f538d", "#14375e", self.import_folder),
             ("📄 Importer Fichiers", "#17a2b8", "#138496", self.import_files),
+            ("♻️ Corbeille", "#fd7e14", "#dc6a0c", self.open_trash),
             ("🔄 Rafraîchir", "#6c757d", "#5a6268", self.load_folders)
         ]
        
@@ -177,8 +180,14 @@ class AdminWindow:
         for widget in self.folders_list.winfo_children():
             widget.destroy()
        
-        # Charger les dossiers racine du panel
-        root_folders = self.db.get_subfolders(None, panel=self.panel)
+        # Charger toute l'arborescence du panel en une fois, groupée par parent
+        all_folders = self.db.get_all_folders(panel=self.panel)
+        self.folder_children = {}
+        for folder in all_folders:
+            self.folder_children.setdefault(folder['parent_id'], []).append(folder)
+        self.folder_stats = self.db.get_folders_stats([folder['id'] for folder in all_folders])
+        
+        root_folders = self.folder_children.get(None, [])
        
         if not root_folders:
             ctk.CTkLabel(
@@ -217,7 +226,7 @@ class AdminWindow:
         name_frame.pack(side="left")
        
         # Récupérer les sous-dossiers pour vérifier s'il y en a
-        subfolders = self.db.get_subfolders(folder['id'])
+        subfolders = self.folder_children.get(folder['id'], [])
         has_subfolders = len(subfolders) > 0
        
         if has_subfolders:
@@ -262,7 +271,7 @@ class AdminWindow:
             anchor="w"
         ).pack(anchor="w")
        
-        file_count = self.db.count_files_in_folder(folder['id'], recursive=True)
+        file_count = self.folder_stats.get(folder['id'], {}).get('file_count', 0)
         ctk.CTkLabel(
             info_frame,
             text=f"{file_count} fichier{'s' if file_count > 1 else ''} • ID: {folder['id']}",
@@ -513,14 +522,15 @@ class AdminWindow:
         response = messagebox.askyesno(
             "Confirmation",
             f"⚠️ Supprimer '{folder['name']}' ?\n\n"
-            "Tous les fichiers et sous-dossiers seront supprimés.",
+            "Tous les fichiers et sous-dossiers iront à la corbeille.\n"
+            f"♻️ Restaurables pendant {TRASH_RETENTION_DAYS} jours, puis effacés définitivement.",
             icon='warning'
         )
        
         if response:
             try:
                 self.db.delete_folder(folder_id)
-                messagebox.showinfo("Succès", "✅ Dossier supprimé")
+                messagebox.showinfo("Succès", "✅ Dossier mis à la corbeille")
                 self.load_folders()
                 self.on_changes()
             except Exception as e:
@@ -536,6 +546,16 @@ class AdminWindow:
         file_window = ctk.CTkToplevel(self.root)
         FileManagerWindow(file_window, self.db, self.file_handler, folder, self.on_changes)
    
+    def open_trash(self):
+        """Afficher la corbeille du panel"""
+        trash_window = ctk.CTkToplevel(self.root)
+        TrashWindow(trash_window, self.db, self.panel, self.on_trash_restored)
+   
+    def on_trash_restored(self):
+        """Rafraîchir après une restauration"""
+        self.load_folders()
+        self.on_changes()
+   
     def import_folder(self):
         """Importer un dossier"""
         folder_path = filedialog.askdirectory(title="Sélectionner un dossier")
@@ -732,20 +752,21 @@ class AdminWindow:
             folder = self.db.get_folder(folder_id)
             folder_name = folder['name'] if folder else "Racine"
            
+            rows = []
             for file_path in file_paths:
                 filename = os.path.basename(file_path)
                
                 if self.file_handler.is_allowed_file(filename):
                     # Sauvegarder le fichier
-                    success, dest_path = self.file_handler.save_file(
+                    stored = self.file_handler.store_file(
                         file_path,
                         filename,
-                        folder_name
+                        self.panel
                     )
                    
-                    if success:
-                        self.db.add_file(folder_id, filename, dest_path)
-                        success_count += 1
+                    if stored:
+                        rows.append((folder_id, filename, stored['filepath'],
+                                     stored['file_hash'], stored['file_size']))
                         print(f"✅ Fichier importé: {filename}")
                     else:
                         error_count += 1
@@ -754,6 +775,9 @@ class AdminWindow:
                     error_count += 1
                     print(f"⚠️ Extension non autorisée: {filename}")
            
+            # Enregistrer tous les fichiers en une seule transaction
+            success_count = len(self.db.add_files_batch(rows))
+           
             # Messages de résultat
             if error_count == 0:
                 messagebox.showinfo(
@@ -781,6 +805,9 @@ class AdminWindow:
 class FileManagerWindow:
     """Fenêtre de gestion des fichiers modernisée"""
    
+    # Fichiers affichés par page (la suite est chargée à la demande)
+    FILES_PAGE_SIZE = 100
+   
     def __init__(self, root: ctk.CTkToplevel, db, file_handler, folder: dict, on_changes: Callable):
         self.root = root
         self.db = db
@@ -868,11 +895,11 @@ class FileManagerWindow:
         self.selected_file_id = None
    
     def load_files(self):
-        """Charger les fichiers"""
+        """Charger la première page des fichiers"""
         for widget in self.files_list.winfo_children():
             widget.destroy()
        
-        files = self.db.get_files_in_folder(self.folder['id'])
+        files, self.files_cursor = self.db.get_files_in_folder_page(self.folder['id'], self.FILES_PAGE_SIZE)
        
         if not files:
             ctk.CTkLabel(
@@ -885,6 +912,33 @@ class FileManagerWindow:
        
         for file in files:
             self.create_file_card(file)
+        self.add_load_more_button()
+       
+    def add_load_more_button(self):
+        """Proposer la page suivante des fichiers s'il en reste"""
+        if self.files_cursor is None:
+            return
+       
+        button = ctk.CTkButton(
+            self.files_list,
+            text="⬇️ Afficher plus de fichiers",
+            height=35,
+            font=ctk.CTkFont(size=12),
+            fg_color=("#6c757d", "#5a6268"),
+            hover_color=("#7c858d", "#6a7278"),
+            command=lambda: self.load_more_files(button)
+        )
+        button.pack(pady=10)
+       
+    def load_more_files(self, button):
+        """Charger et afficher la page suivante des fichiers"""
+        button.destroy()
+        files, self.files_cursor = self.db.get_files_in_folder_page(
+            self.folder['id'], self.FILES_PAGE_SIZE, self.files_cursor
+        )
+        for file in files:
+            self.create_file_card(file)
+        self.add_load_more_button()
    
     def create_file_card(self, file: dict):
         """Créer une carte de fichier"""
@@ -920,7 +974,7 @@ class FileManagerWindow:
         ).pack(anchor="w")
        
         try:
-            size = os.path.getsize(file['filepath']) if os.path.exists(file['filepath']) else 0
+            size = file.get('file_size') or self.file_handler.get_file_size(file['filepath'])
             size_formatted = self.format_file_size(size)
         except:
             size_formatted = "N/A"
@@ -984,24 +1038,27 @@ class FileManagerWindow:
             success_count = 0
             error_count = 0
            
+            rows = []
             for file_path in file_paths:
                 filename = os.path.basename(file_path)
                
                 if self.file_handler.is_allowed_file(filename):
-                    success, dest_path = self.file_handler.save_file(
+                    stored = self.file_handler.store_file(
                         file_path,
                         filename,
-                        self.folder['name']
+                        self.folder.get('panel', 'interface_emp')
                     )
                    
-                    if success:
-                        self.db.add_file(self.folder['id'], filename, dest_path)
-                        success_count += 1
+                    if stored:
+                        rows.append((self.folder['id'], filename, stored['filepath'],
+                                     stored['file_hash'], stored['file_size']))
                     else:
                         error_count += 1
                 else:
                     error_count += 1
            
+            success_count = len(self.db.add_files_batch(rows))
+           
             if error_count == 0:
                 messagebox.showinfo(
                     "Succès",
@@ -1033,14 +1090,15 @@ class FileManagerWindow:
        
         response = messagebox.askyesno(
             "Confirmation",
-            f"⚠️ Supprimer :\n\n{file['filename']} ?",
+            f"⚠️ Supprimer :\n\n{file['filename']} ?\n\n"
+            f"♻️ Restaurable depuis la corbeille pendant {TRASH_RETENTION_DAYS} jours.",
             icon='warning'
         )
        
         if response:
             try:
                 self.db.delete_file(self.selected_file_id)
-                messagebox.showinfo("Succès", "✅ Fichier supprimé")
+                messagebox.showinfo("Succès", "✅ Fichier mis à la corbeille")
                 self.selected_file_id = None
                 self.load_files()
                 self.on_changes()
@@ -1058,11 +1116,11 @@ class FileManagerWindow:
             messagebox.showerror("Erreur", "❌ Fichier introuvable")
             return
        
-        if not os.path.exists(file['filepath']):
+        if not self.file_handler.file_exists(file['filepath']):
             messagebox.showerror("Erreur", "❌ Le fichier n'existe pas")
             return
        
-        success = self.file_handler.open_file(file['filepath'])
+        success = self.file_handler.open_file(file['filepath'], file['filename'])
         if not success:
             messagebox.showerror("Erreur", "❌ Impossible d'ouvrir le fichier")
    
@@ -1074,3 +1132,139 @@ class FileManagerWindow:
                 return f"{size:.1f} {unit}"
             size /= 1024.0
         return f"{size:.1f} TB"
+
+
+class TrashWindow:
+    """Corbeille d'un panel: restauration des dossiers et fichiers supprimés"""
+   
+    def __init__(self, root: ctk.CTkToplevel, db, panel: str, on_restored: Callable):
+        self.root = root
+        self.db = db
+        self.panel = panel
+        self.on_restored = on_restored
+       
+        self.root.title("Corbeille")
+        self.root.geometry("800x600")
+       
+        self.create_widgets()
+        self.load_trash()
+   
+    def create_widgets(self):
+        """Créer les widgets"""
+        header = ctk.CTkFrame(
+            self.root,
+            height=80,
+            corner_radius=0,
+            fg_color=("#fd7e14", "#dc6a0c")
+        )
+        header.pack(fill="x")
+        header.pack_propagate(False)
+       
+        ctk.CTkLabel(
+            header,
+            text="♻️ Corbeille",
+            font=ctk.CTkFont(size=22, weight="bold"),
+            text_color=("#ffffff", "#ffffff")
+        ).pack(side="left", padx=30, pady=20)
+       
+        ctk.CTkButton(
+            header,
+            text="✖️ Fermer",
+            width=120,
+            height=45,
+            font=ctk.CTkFont(size=14, weight="bold"),
+            fg_color=("#dc3545", "#b02a37"),
+            hover_color=("#e04555", "#c03545"),
+            command=self.root.destroy
+        ).pack(side="right", padx=30)
+       
+        ctk.CTkLabel(
+            self.root,
+            text=f"Les éléments sont effacés définitivement {TRASH_RETENTION_DAYS} jours après leur suppression.",
+            font=ctk.CTkFont(size=12),
+            text_color=("gray50", "gray60")
+        ).pack(pady=(10, 0))
+       
+        self.trash_list = ctk.CTkScrollableFrame(
+            self.root,
+            fg_color=("#f0f0f0", "#2b2b2b"),
+            corner_radius=15
+        )
+        self.trash_list.pack(fill="both", expand=True, padx=20, pady=(10, 20))
+   
+    def load_trash(self):
+        """Charger les dossiers et fichiers restaurables"""
+        for widget in self.trash_list.winfo_children():
+            widget.destroy()
+       
+        trash = self.db.get_trash(self.panel)
+        if not trash['folders'] and not trash['files']:
+            ctk.CTkLabel(
+                self.trash_list,
+                text="📭 La corbeille est vide",
+                font=ctk.CTkFont(size=16),
+                text_color=("gray50", "gray60")
+            ).pack(expand=True, pady=100)
+            return
+       
+        for folder in trash['folders']:
+            self.create_item_card("📁", folder['name'], folder['deleted_at'],
+                                  lambda f=folder: self.restore(self.db.restore_folder, f['id']))
+        for file in trash['files']:
+            self.create_item_card("📄", f"{file['filename']}  •  📁 {file['folder_name']}", file['deleted_at'],
+                                  lambda f=file: self.restore(self.db.restore_file, f['id']))
+   
+    def create_item_card(self, icon: str, title: str, deleted_at: str, command: Callable):
+        """Créer la carte d'un élément de la corbeille"""
+        card = ctk.CTkFrame(
+            self.trash_list,
+            height=60,
+            fg_color=("#ffffff", "#1e1e1e"),
+            corner_radius=10,
+            border_width=1,
+            border_color=("gray80", "gray30")
+        )
+        card.pack(fill="x", pady=5)
+        card.pack_propagate(False)
+       
+        ctk.CTkLabel(card, text=icon, font=ctk.CTkFont(size=24), width=50).pack(side="left", padx=15)
+       
+        info_frame = ctk.CTkFrame(card, fg_color="transparent")
+        info_frame.pack(side="left", fill="both", expand=True)
+        ctk.CTkLabel(
+            info_frame,
+            text=title,
+            font=ctk.CTkFont(size=13, weight="bold"),
+            anchor="w"
+        ).pack(anchor="w", pady=(8, 0))
+        ctk.CTkLabel(
+            info_frame,
+            text=f"Supprimé le {deleted_at[:16]}",
+            font=ctk.CTkFont(size=11),
+            text_color=("gray50", "gray60"),
+            anchor="w"
+        ).pack(anchor="w")
+       
+        ctk.CTkButton(
+            card,
+            text="♻️ Restaurer",
+            width=120,
+            height=36,
+            font=ctk.CTkFont(size=12, weight="bold"),
+            fg_color=("#28a745", "#1e7e34"),
+            hover_color=("#34ce57", "#28a745"),
+            command=command
+        ).pack(side="right", padx=15)
+   
+    def restore(self, restore_item: Callable, item_id: int):
+        """Restaurer un élément à sa place d'origine"""
+        if restore_item(item_id):
+            self.load_trash()
+            self.on_restored()
+        else:
+            messagebox.showerror(
+                "Erreur",
+                "❌ Restauration impossible\n\nL'élément a déjà été effacé, ou son dossier parent est\n"
+                "lui-même à la corbeille: restaurez-le d'abord.",
+                parent=self.root
+            )
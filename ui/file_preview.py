@@ -409,6 +409,6 @@ class FilePreviewWindow:
     
     def open_with_default_app(self):
         """Ouvrir le fichier avec l'application par défaut"""
-        success = self.file_handler.open_file(self.file['filepath'])
+        success = self.file_handler.open_file(self.file['filepath'], self.file['filename'])
         if not success:
             messagebox.showerror("Erreur", "Impossible d'ouvrir le fichier")
\ No newline at end of file
@@ -1,11 +1,13 @@
 import customtkinter as ctk
 from tkinter import messagebox
 from typing import Optional, Callable
-import os
 
 class FolderView(ctk.CTkFrame):
     """Vue d'un dossier avec support des panels"""
     
+    # Fichiers affichés par page (la suite est chargée à la demande)
+    FILES_PAGE_SIZE = 100
+    
     def __init__(self, parent, db, file_handler, folder_id: Optional[int], 
                  on_folder_open: Callable = None, notification_manager=None,
                  panel_type: str = 'interface_employes'):
@@ -91,12 +93,18 @@ class FolderView(ctk.CTkFrame):
         
         try:
             subfolders = self.db.get_subfolders(self.folder_id, self.panel_type)
-            files = self.db.get_files_in_folder(self.folder_id) if self.folder_id else []
+            if self.folder_id:
+                files, self.files_cursor = self.db.get_files_in_folder_page(self.folder_id, self.FILES_PAGE_SIZE)
+            else:
+                files, self.files_cursor = [], None
             
             if not subfolders and not files:
                 self.show_empty_state()
                 return
             
+            # Compteurs récursifs de toutes les cartes en une seule requête
+            self.folder_stats = self.db.get_folders_stats([folder['id'] for folder in subfolders])
+            
             if subfolders:
                 self.create_section_title("📁 Dossiers", len(subfolders))
                 
@@ -109,18 +117,49 @@ class FolderView(ctk.CTkFrame):
                     self.create_folder_card(folders_grid, folder, row, col)
             
             if files:
-                self.create_section_title("📄 Fichiers", len(files))
+                # Total lu dans les compteurs précalculés, pas dans la page chargée
+                self.create_section_title("📄 Fichiers", self.db.count_files_in_folder(self.folder_id))
                 
                 files_frame = ctk.CTkFrame(self.content_scrollable, fg_color="transparent")
                 files_frame.pack(fill="x", pady=10)
                 
                 for file in files:
                     self.create_file_card(files_frame, file)
+                self.add_load_more_button(files_frame)
                     
         except Exception as e:
             print(f"❌ Erreur lors du chargement du contenu: {e}")
             self.show_error_state(str(e))
     
+    def add_load_more_button(self, files_frame):
+        """Proposer la page suivante des fichiers s'il en reste"""
+        if self.files_cursor is None:
+            return
+        
+        button = ctk.CTkButton(
+            files_frame,
+            text="⬇️ Afficher plus de fichiers",
+            height=35,
+            font=ctk.CTkFont(size=12),
+            fg_color=("#6c757d", "#5a6268"),
+            hover_color=("#7c858d", "#6a7278"),
+            command=lambda: self.load_more_files(files_frame, button)
+        )
+        button.pack(pady=10)
+    
+    def load_more_files(self, files_frame, button):
+        """Charger et afficher la page suivante des fichiers"""
+        try:
+            button.destroy()
+            files, self.files_cursor = self.db.get_files_in_folder_page(
+                self.folder_id, self.FILES_PAGE_SIZE, self.files_cursor
+            )
+            for file in files:
+                self.create_file_card(files_frame, file)
+            self.add_load_more_button(files_frame)
+        except Exception as e:
+            print(f"❌ Erreur lors du chargement des fichiers: {e}")
+    
     def create_section_title(self, title: str, count: int):
         """Créer un titre de section"""
         section_frame = ctk.CTkFrame(self.content_scrollable, fg_color="transparent")
@@ -166,10 +205,7 @@ class FolderView(ctk.CTkFrame):
             wraplength=280
         ).pack(pady=(0, 5))
         
-        try:
-            file_count = self.db.count_files_in_folder(folder['id'], recursive=True)
-        except:
-            file_count = 0
+        file_count = self.folder_stats.get(folder['id'], {}).get('file_count', 0)
             
         ctk.CTkLabel(
             card,
@@ -228,8 +264,8 @@ class FolderView(ctk.CTkFrame):
         
         try:
             size = file.get('file_size', 0)
-            if size == 0 and os.path.exists(file['filepath']):
-                size = os.path.getsize(file['filepath'])
+            if size == 0:
+                size = self.file_handler.get_file_size(file['filepath'])
             size_formatted = self.format_file_size(size)
         except:
             size_formatted = "N/A"
@@ -262,7 +298,7 @@ class FolderView(ctk.CTkFrame):
     
     def open_file_with_viewer(self, file: dict):
         """Ouvrir un fichier avec le bon viewer"""
-        if not os.path.exists(file['filepath']):
+        if not self.file_handler.file_exists(file['filepath']):
             messagebox.showerror("Erreur", "❌ Le fichier n'existe plus")
             return
         
@@ -281,7 +317,7 @@ class FolderView(ctk.CTkFrame):
             try:
                 from ui.pdf_viewer import PDFViewer
                 pdf_window = ctk.CTkToplevel(self.winfo_toplevel())
-                PDFViewer(pdf_window, file['filepath'], file['filename'])
+                PDFViewer(pdf_window, file['filepath'], file['filename'], self.file_handler)
                 print(f"✅ PDF ouvert dans le viewer intégré: {file['filename']}")
             except ImportError:
                 messagebox.showerror(
@@ -292,7 +328,7 @@ class FolderView(ctk.CTkFrame):
                 messagebox.showerror("Erreur", f"❌ Impossible d'ouvrir le PDF:\n{e}")
                 print(f"❌ Erreur ouverture PDF: {e}")
         else:
-            success = self.file_handler.open_file(file['filepath'])
+            success = self.file_handler.open_file(file['filepath'], file['filename'])
             if not success:
                 messagebox.showerror("Erreur", "❌ Impossible d'ouvrir le fichier")
     
@@ -8,6 +8,9 @@ import threading
 class PanelView(ctk.CTkFrame):
     """Vue d'un panel avec import direct optimisé"""
     
+    # Fichiers affichés par page (la suite est chargée à la demande)
+    FILES_PAGE_SIZE = 100
+    
     def __init__(self, parent, db, file_handler, panel: str, 
                  folder_id: Optional[int] = None,
                  on_folder_open: Callable = None,
@@ -98,6 +101,19 @@ class PanelView(ctk.CTkFrame):
         )
         self.import_folder_button.pack(side="left", padx=5)
         
+        # Bouton Synchronisation (import incrémental d'un dossier source)
+        self.sync_folder_button = ctk.CTkButton(
+            action_frame,
+            text="🔄 Synchroniser",
+            width=140,
+            height=40,
+            font=ctk.CTkFont(size=14, weight="bold"),
+            fg_color=("#6f42c1", "#59359a"),
+            hover_color=("#7d52cf", "#6640ad"),
+            command=self.sync_folder
+        )
+        self.sync_folder_button.pack(side="left", padx=5)
+        
         # Bouton Nouveau Dossier
         self.new_folder_button = ctk.CTkButton(
             action_frame,
@@ -203,6 +219,81 @@ class PanelView(ctk.CTkFrame):
         except Exception as e:
             messagebox.showerror("Erreur", f"❌ Erreur lors de l'import de dossier:\n{e}")
     
+    def sync_folder(self):
+        """Synchroniser un dossier source: seuls les fichiers nouveaux ou modifiés sont importés"""
+        try:
+            folder_path = filedialog.askdirectory(
+                title="Sélectionner le dossier à synchroniser"
+            )
+            
+            if not folder_path:
+                return
+            
+            mark_deleted = messagebox.askyesno(
+                "Synchronisation",
+                "Retirer du panel les fichiers supprimés du dossier source\n"
+                "depuis la dernière synchronisation ?",
+                icon='question'
+            )
+            
+            # Créer une fenêtre de progression
+            progress_window = self.create_progress_window("Synchronisation de dossier")
+            
+            # Démarrer la synchronisation dans un thread
+            threading.Thread(
+                target=self._sync_folder_worker,
+                args=(folder_path, progress_window, mark_deleted),
+                daemon=True
+            ).start()
+            
+        except Exception as e:
+            messagebox.showerror("Erreur", f"❌ Erreur lors de la synchronisation:\n{e}")
+    
+    def _sync_folder_worker(self, folder_path: str, progress_window: dict, mark_deleted: bool):
+        """Worker pour la synchronisation de dossier"""
+        try:
+            def update_progress(current, total):
+                try:
+                    progress = current / max(total, 1)
+                    progress_window['bar'].set(progress)
+                    progress_window['label'].configure(text=f"Fichiers modifiés: {current}/{total}")
+                    progress_window['status'].configure(text=f"Progression: {progress*100:.1f}%")
+                except:
+                    pass
+            
+            stats = self.file_handler.sync_folder_direct(
+                folder_path,
+                self.db,
+                self.panel,
+                update_progress,
+                mark_deleted
+            )
+            
+            self.after(0, lambda: self._finalize_sync(progress_window, stats))
+            
+        except Exception as e:
+            self.after(0, lambda err=e: self._handle_import_error(progress_window, err))
+    
+    def _finalize_sync(self, progress_window: dict, stats: dict):
+        """Finaliser la synchronisation"""
+        try:
+            progress_window['window'].destroy()
+            
+            messagebox.showinfo(
+                "Synchronisation Terminée",
+                f"➕ {stats['added']} fichier(s) ajouté(s)\n"
+                f"✏️ {stats['updated']} fichier(s) mis à jour\n"
+                f"✅ {stats['unchanged']} fichier(s) inchangé(s)\n"
+                f"🗑️ {stats['deleted']} fichier(s) retiré(s)"
+                + (f"\n⚠️ {stats['failed']} erreur(s)" if stats['failed'] else "")
+            )
+            
+            if stats['added'] or stats['updated'] or stats['deleted']:
+                self.refresh_content()
+                
+        except Exception as e:
+            print(f"❌ Erreur finalisation synchronisation: {e}")
+    
     def create_progress_window(self, title: str):
         """Créer une fenêtre de progression"""
         progress_window = ctk.CTkToplevel(self)
@@ -278,13 +369,15 @@ class PanelView(ctk.CTkFrame):
             
             # Effectuer l'import
             if individual_files:
-                # Import de fichiers individuels
-                for file_path in paths:
-                    if self.file_handler.is_allowed_file(os.path.basename(file_path)):
-                        success = self._import_single_file_direct(file_path, update_progress, current_count, total_files)
-                        if success:
-                            total_imported += 1
-                            current_count += 1
+                # Import de fichiers individuels (hachage et chiffrement en parallèle)
+                target_folder_id = self.folder_id if self.folder_id else self._get_root_folder_id()
+                total_imported = self.file_handler.import_files(
+                    paths,
+                    self.db,
+                    target_folder_id,
+                    self.panel,
+                    update_progress
+                )
             else:
                 # Import de dossiers
                 for folder_path in paths:
@@ -300,40 +393,16 @@ class PanelView(ctk.CTkFrame):
             self.after(0, lambda: self._finalize_import(progress_window, total_imported))
             
         except Exception as e:
-            self.after(0, lambda: self._handle_import_error(progress_window, e))
+            self.after(0, lambda err=e: self._handle_import_error(progress_window, err))
     
-    def _import_single_file_direct(self, file_path: str, progress_callback, current: int, total: int) -> bool:
-        """Importer un fichier unique directement"""
-        try:
-            filename = os.path.basename(file_path)
-            
-            # Obtenir ou créer le dossier racine du panel
-            root_folders = self.db.get_subfolders(parent_id=None, panel=self.panel)
-            if not root_folders:
-                root_folder_id = self.db.create_folder(
-                    self.panel_names[self.panel], None, self.panel
-                )
-            else:
-                root_folder_id = root_folders[0]['id']
-            
-            # Sauvegarder le fichier crypté
-            success, dest_path = self.file_handler.save_file(file_path, filename, self.panel)
-            
-            if success:
-                # Enregistrer dans la base de données
-                target_folder_id = self.folder_id if self.folder_id else root_folder_id
-                self.db.add_file(target_folder_id, filename, dest_path)
-                
-                if progress_callback:
-                    progress_callback(current + 1, total)
-                
-                return True
-            
-            return False
-            
-        except Exception as e:
-            print(f"❌ Erreur import fichier direct {file_path}: {e}")
-            return False
+    def _get_root_folder_id(self) -> int:
+        """Obtenir ou créer le dossier racine du panel"""
+        root_folders = self.db.get_subfolders(parent_id=None, panel=self.panel)
+        if not root_folders:
+            return self.db.create_folder(
+                self.panel_names[self.panel], None, self.panel
+            )
+        return root_folders[0]['id']
     
     def _import_folder_traditional_worker(self, folder_path: str, progress_window: dict):
         """Worker pour l'import traditionnel avec dossier parent"""
@@ -363,7 +432,7 @@ class PanelView(ctk.CTkFrame):
             self.after(0, lambda: self._finalize_import(progress_window, total_imported))
             
         except Exception as e:
-            self.after(0, lambda: self._handle_import_error(progress_window, e))
+            self.after(0, lambda err=e: self._handle_import_error(progress_window, err))
     
     def _finalize_import(self, progress_window: dict, total_imported: int):
         """Finaliser l'import"""
@@ -437,7 +506,13 @@ class PanelView(ctk.CTkFrame):
             
             # Récupérer les dossiers et fichiers
             folders = self.db.get_subfolders(self.folder_id, self.panel)
-            files = self.db.get_files_in_folder(self.folder_id) if self.folder_id else []
+            if self.folder_id:
+                files, self.files_cursor = self.db.get_files_in_folder_page(self.folder_id, self.FILES_PAGE_SIZE)
+            else:
+                files, self.files_cursor = [], None
+            
+            # Compteurs récursifs de toutes les cartes en une seule requête
+            self.folder_stats = self.db.get_folders_stats([folder['id'] for folder in folders])
             
             if not folders and not files:
                 # Affichage d'état vide
@@ -499,10 +574,40 @@ class PanelView(ctk.CTkFrame):
                 # Liste des fichiers
                 for file in files:
                     self.create_file_card(files_frame, file)
+                self.add_load_more_button(files_frame)
                     
         except Exception as e:
             print(f"❌ Erreur rafraîchissement contenu: {e}")
     
+    def add_load_more_button(self, files_frame):
+        """Proposer la page suivante des fichiers s'il en reste"""
+        if self.files_cursor is None:
+            return
+        
+        button = ctk.CTkButton(
+            files_frame,
+            text="⬇️ Afficher plus de fichiers",
+            height=32,
+            font=ctk.CTkFont(size=12),
+            fg_color=("#6c757d", "#5a6268"),
+            hover_color=("#7c858d", "#6a7278"),
+            command=lambda: self.load_more_files(files_frame, button)
+        )
+        button.pack(pady=10)
+    
+    def load_more_files(self, files_frame, button):
+        """Charger et afficher la page suivante des fichiers"""
+        try:
+            button.destroy()
+            files, self.files_cursor = self.db.get_files_in_folder_page(
+                self.folder_id, self.FILES_PAGE_SIZE, self.files_cursor
+            )
+            for file in files:
+                self.create_file_card(files_frame, file)
+            self.add_load_more_button(files_frame)
+        except Exception as e:
+            print(f"❌ Erreur chargement des fichiers: {e}")
+    
     def create_folder_card(self, parent, folder: Dict[str, Any], index: int):
         """Créer une carte pour un dossier"""
         row = index // 3
@@ -534,7 +639,7 @@ class PanelView(ctk.CTkFrame):
         ).pack()
         
         # Compteur de fichiers
-        file_count = self.db.count_files_in_folder(folder['id'], recursive=True)
+        file_count = self.folder_stats.get(folder['id'], {}).get('file_count', 0)
         ctk.CTkLabel(
             card,
             text=f"{file_count} fichier(s)",
@@ -557,11 +662,8 @@ class PanelView(ctk.CTkFrame):
     
     def create_file_card(self, parent, file: Dict[str, Any]):
         """Créer une carte pour un fichier"""
-        # Récupérer le nom original pour les fichiers cryptés
-        if hasattr(self.file_handler, 'get_original_filename'):
-            display_name = self.file_handler.get_original_filename(file['filepath'])
-        else:
-            display_name = file['filename']
+        # Un blob dédupliqué peut être partagé: le nom fait foi en base
+        display_name = file['filename']
         
         extension = display_name.rsplit('.', 1)[-1].lower() if '.' in display_name else ''
         icon = self.file_handler.get_file_icon(extension)
@@ -641,15 +743,12 @@ class PanelView(ctk.CTkFrame):
     def open_file(self, file: Dict[str, Any]):
         """Ouvrir un fichier"""
         try:
-            if not os.path.exists(file['filepath']):
+            if not self.file_handler.file_exists(file['filepath']):
                 messagebox.showerror("Erreur", "❌ Le fichier n'existe plus")
                 return
             
-            # Récupérer le nom original pour les fichiers cryptés
-            if hasattr(self.file_handler, 'get_original_filename'):
-                display_name = self.file_handler.get_original_filename(file['filepath'])
-            else:
-                display_name = file['filename']
+            # Un blob dédupliqué peut être partagé: le nom fait foi en base
+            display_name = file['filename']
             
             extension = display_name.rsplit('.', 1)[-1].lower() if '.' in display_name else ''
             
@@ -657,10 +756,10 @@ class PanelView(ctk.CTkFrame):
             if extension == 'pdf':
                 from .pdf_viewer import PDFViewer
                 pdf_window = ctk.CTkToplevel(self.winfo_toplevel())
-                PDFViewer(pdf_window, file['filepath'], display_name)
+                PDFViewer(pdf_window, file['filepath'], display_name, self.file_handler)
             else:
                 # Pour les autres fichiers, utiliser le gestionnaire de fichiers
-                success = self.file_handler.open_file(file['filepath'])
+                success = self.file_handler.open_file(file['filepath'], display_name)
                 if not success:
                     messagebox.showerror("Erreur", "❌ Impossible d'ouvrir le fichier")
                     
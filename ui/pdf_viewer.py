@@ -8,11 +8,12 @@ import io
 class PDFViewer(ctk.CTkToplevel):
     """Viewer PDF modernisé avec CustomTkinter - Lecture seule"""
 
-    def __init__(self, parent, filepath: str, filename: str):
+    def __init__(self, parent, filepath: str, filename: str, file_handler=None):
         super().__init__(parent)
 
         self.filepath = filepath
         self.filename = filename
+        self.file_handler = file_handler
         self.pdf_document = None
         self.current_page = 0
         self.total_pages = 0
@@ -60,7 +61,13 @@ class PDFViewer(ctk.CTkToplevel):
     def load_pdf(self) -> bool:
         """Charger le document PDF"""
         try:
-            self.pdf_document = fitz.open(self.filepath)
+            if self.file_handler:
+                # Fichier chiffré: copie temporaire déchiffrée (tmpfs sous
+                # Linux) que PyMuPDF lit page par page; le gestionnaire des
+                # copies la supprime à son expiration
+                self.pdf_document = fitz.open(self.file_handler.decrypted_copy(self.filepath, self.filename))
+            else:
+                self.pdf_document = fitz.open(self.filepath)
             self.total_pages = len(self.pdf_document)
             print(f"✅ PDF chargé: {self.total_pages} pages - {self.filename}")
             return True
@@ -2,12 +2,21 @@
 import customtkinter as ctk
 from tkinter import messagebox
 from typing import Callable, Optional, List, Dict, Any
-import os
 import threading
 import time
 
 class SearchWindow:
-    """Fenêtre de recherche ultra-rapide avec pagination et cache"""
+    """Fenêtre de recherche ultra-rapide avec pagination"""
+    
+    # Choix des filtres: (libellé, valeur transmise à la base)
+    EXTENSION_CHOICES = [("Tous", ""), ("PDF", "pdf"), ("Word", "docx"), ("Excel", "xlsx")]
+    PANEL_CHOICES = [
+        ("Tous", None),
+        ("Certification", "certification"),
+        ("En-tête", "entete"),
+        ("Interface Employés", "interface_emp"),
+        ("Autre", "autre")
+    ]
     
     def __init__(self, root: ctk.CTkToplevel, db, file_handler, on_file_select: Callable):
         self.root = root
@@ -15,9 +24,15 @@ class SearchWindow:
         self.file_handler = file_handler
         self.on_file_select = on_file_select
         
-        # Cache pour la recherche
-        self.search_cache = {}
+        # Résultats chargés (le cache des requêtes est tenu par Database)
         self.current_results = []
+        self.current_criteria = None
+        self.next_cursor = None
+        self.total_results = 0
+        
+        # Valeurs affichées par les listes (libellé et compte) -> valeur du filtre
+        self.extension_values = dict(self.EXTENSION_CHOICES)
+        self.panel_values = dict(self.PANEL_CHOICES)
         self.search_thread = None
         self.search_delay_timer = None
         
@@ -132,7 +147,7 @@ class SearchWindow:
             width=130,
             height=32,
             font=ctk.CTkFont(size=11),
-            values=["Tous", "PDF", "Word", "Excel"]
+            values=list(self.extension_values)
         )
         self.extension_combo.pack(side="left")
         self.extension_combo.set("Tous")
@@ -152,11 +167,23 @@ class SearchWindow:
             width=140,
             height=32,
             font=ctk.CTkFont(size=11),
-            values=["Tous", "Certification", "En-tête", "Interface Employés", "Autre"]
+            values=list(self.panel_values)
         )
         self.panel_combo.pack(side="left")
         self.panel_combo.set("Tous")
         
+        # Recherche dans le contenu des documents (texte extrait en arrière-plan)
+        index_status = self.db.get_content_index_status()
+        indexed_percent = 100 * index_status['done'] // max(index_status['total'], 1)
+        
+        self.content_checkbox = ctk.CTkCheckBox(
+            criteria_row,
+            text=f"📄 Contenu ({indexed_percent}% indexé)",
+            font=ctk.CTkFont(size=11),
+            command=self.schedule_search
+        )
+        self.content_checkbox.pack(side="left", padx=(10, 0))
+        
         # ============= RÉSULTATS AVEC PAGINATION =============
         results_container = ctk.CTkFrame(
             self.root,
@@ -254,69 +281,51 @@ class SearchWindow:
         self.search_thread = threading.Thread(target=self.search_files_threaded, daemon=True)
         self.search_thread.start()
     
+    def get_search_criteria(self) -> Dict[str, Any]:
+        """Lire les critères de recherche saisis"""
+        return {
+            'filename': self.filename_entry.get().strip(),
+            'extension': self.extension_values.get(self.extension_combo.get(), ""),
+            'panel': self.panel_values.get(self.panel_combo.get()),
+            'include_content': bool(self.content_checkbox.get())
+        }
+    
     def search_files_threaded(self):
         """Effectuer la recherche dans un thread séparé"""
         try:
             start_time = time.time()
             
             # Récupérer les critères de recherche
-            filename = self.filename_entry.get().strip()
-            extension_type = self.extension_combo.get()
-            panel_type = self.panel_combo.get()
+            criteria = self.get_search_criteria()
             
-            # Créer une clé de cache
-            cache_key = f"{filename}_{extension_type}_{panel_type}"
+            # Première page seulement: la suite est chargée à la demande
+            results, next_cursor = self.db.search_files_page(
+                page_size=self.results_per_page,
+                **criteria
+            )
             
-            # Vérifier le cache
-            if cache_key in self.search_cache:
-                results = self.search_cache[cache_key]
-                search_time = 0.001  # Cache hit
-            else:
-                # Convertir les types
-                extension_map = {
-                    "Tous": "",
-                    "PDF": "pdf",
-                    "Word": "docx",
-                    "Excel": "xlsx"
-                }
-                
-                panel_map = {
-                    "Tous": None,
-                    "Certification": "certification",
-                    "En-tête": "entete",
-                    "Interface Employés": "interface_emp",
-                    "Autre": "autre"
-                }
-                
-                extension = extension_map.get(extension_type, "")
-                panel = panel_map.get(panel_type)
-                
-                # Effectuer la recherche ultra-rapide
-                results = self.db.search_files_fast(
-                    filename=filename,
-                    extension=extension,
-                    panel=panel,
-                    limit=200
-                )
-                
-                # Mettre en cache si moins de 200 résultats
-                if len(results) < 200:
-                    self.search_cache[cache_key] = results
-                
-                search_time = time.time() - start_time
+            # Comptes par panel et par extension pour les listes de filtres
+            facets = self.db.search_facets(**criteria)
+            
+            search_time = time.time() - start_time
             
             # Mettre à jour l'interface dans le thread principal
-            self.root.after(0, lambda: self.update_results(results, search_time))
+            self.root.after(0, lambda: self.update_results(criteria, results, next_cursor, search_time, facets))
             
         except Exception as e:
-            self.root.after(0, lambda: self.handle_search_error(e))
+            self.root.after(0, lambda err=e: self.handle_search_error(err))
     
-    def update_results(self, results: List[Dict[str, Any]], search_time: float):
+    def update_results(self, criteria: Dict[str, Any], results: List[Dict[str, Any]],
+                       next_cursor, search_time: float, facets: Dict[str, Any]):
         """Mettre à jour les résultats dans l'interface"""
         try:
-            self.current_results = results
+            self.current_criteria = criteria
+            self.current_results = list(results)
+            self.next_cursor = next_cursor
+            self.total_results = facets['total']
             self.current_page = 1
-            self.total_pages = max(1, (len(results) + self.results_per_page - 1) // self.results_per_page)
+            self.update_total_pages()
+            self.update_facets(criteria, facets)
             
             # Mettre à jour l'indicateur de performance
             if search_time < 0.1:
@@ -337,6 +346,26 @@ class SearchWindow:
         except Exception as e:
             print(f"❌ Erreur mise à jour résultats: {e}")
     
+    def update_facets(self, criteria: Dict[str, Any], facets: Dict[str, Any]):
+        """Afficher le nombre de résultats de chaque choix dans les listes de filtres"""
+        self.extension_values = self.fill_combo_counts(
+            self.extension_combo, self.EXTENSION_CHOICES, facets['extension'], criteria['extension']
+        )
+        self.panel_values = self.fill_combo_counts(
+            self.panel_combo, self.PANEL_CHOICES, facets['panel'], criteria['panel']
+        )
+    
+    @staticmethod
+    def fill_combo_counts(combo, choices, counts: Dict[str, int], selected) -> Dict[str, Any]:
+        values = {}
+        for label, key in choices:
+            count = sum(counts.values()) if not key else counts.get(key, 0)
+            values[f"{label} ({count})"] = key
+        
+        combo.configure(values=list(values))
+        combo.set(next(display for display, key in values.items() if key == selected))
+        return values
+    
     def handle_search_error(self, error):
         """Gérer les erreurs de recherche"""
         print(f"❌ Erreur recherche: {error}")
@@ -356,18 +385,20 @@ class SearchWindow:
             
             page_results = self.current_results[start_idx:end_idx]
             
-            # Mettre à jour les labels
-            total_count = len(self.current_results)
+            # Mettre à jour les labels (total exact donné par les facettes)
+            total_count = self.total_results
+            total_pages = max(1, (total_count + self.results_per_page - 1) // self.results_per_page)
             self.results_label.configure(
-                text=f"🔍 Résultats: {total_count} fichier(s) • Page {self.current_page}/{self.total_pages}"
+                text=f"🔍 Résultats: {total_count} fichier(s) • Page {self.current_page}/{total_pages}"
             )
-            self.page_label.configure(text=f"{self.current_page}/{self.total_pages}")
+            self.page_label.configure(text=f"{self.current_page}/{total_pages}")
             
             # Activer/désactiver les boutons de pagination
+            has_next = self.current_page < self.total_pages or self.next_cursor is not None
             self.prev_button.configure(state="normal" if self.current_page > 1 else "disabled")
-            self.next_button.configure(state="normal" if self.current_page < self.total_pages else "disabled")
+            self.next_button.configure(state="normal" if has_next else "disabled")
             
-            if total_count == 0:
+            if not page_results:
                 # Message d'état vide
                 self.create_empty_state()
                 return
@@ -407,11 +438,8 @@ class SearchWindow:
     def create_file_result_card_optimized(self, file: Dict[str, Any]):
         """Créer une carte de résultat ultra-optimisée"""
         try:
-            # Récupérer le nom original pour les fichiers cryptés
-            if hasattr(self.file_handler, 'get_original_filename'):
-                display_name = self.file_handler.get_original_filename(file['filepath'])
-            else:
-                display_name = file['filename']
+            # Un blob dédupliqué peut être partagé: le nom fait foi en base
+            display_name = file['filename']
             
             extension = display_name.rsplit('.', 1)[-1].lower() if '.' in display_name else ''
             icon = self.file_handler.get_file_icon(extension)
@@ -530,23 +558,54 @@ class SearchWindow:
             self.display_current_page()
     
     def next_page(self):
-        """Page suivante"""
+        """Page suivante (chargée depuis la base si elle ne l'est pas encore)"""
         if self.current_page < self.total_pages:
             self.current_page += 1
             self.display_current_page()
+        elif self.next_cursor is not None:
+            self.next_button.configure(state="disabled")
+            threading.Thread(
+                target=self.load_next_page_threaded,
+                args=(self.current_criteria, self.next_cursor),
+                daemon=True
+            ).start()
+    
+    def load_next_page_threaded(self, criteria: Dict[str, Any], after):
+        """Charger la page suivante des résultats dans un thread séparé"""
+        try:
+            results, next_cursor = self.db.search_files_page(
+                page_size=self.results_per_page,
+                after=after,
+                **criteria
+            )
+            self.root.after(0, lambda: self.append_page(criteria, results, next_cursor))
+        except Exception as e:
+            self.root.after(0, lambda err=e: self.handle_search_error(err))
+    
+    def append_page(self, criteria: Dict[str, Any], results: List[Dict[str, Any]], next_cursor):
+        """Ajouter une page chargée et l'afficher"""
+        if criteria != self.current_criteria:
+            return  # Une nouvelle recherche a remplacé celle-ci entre-temps
+        
+        self.current_results.extend(results)
+        self.next_cursor = next_cursor
+        self.update_total_pages()
+        if results:
+            self.current_page += 1
+        self.display_current_page()
+    
+    def update_total_pages(self):
+        self.total_pages = max(1, (len(self.current_results) + self.results_per_page - 1) // self.results_per_page)
     
     def open_file(self, file: Dict[str, Any]):
         """Ouvrir un fichier avec le bon viewer"""
         try:
-            if not os.path.exists(file['filepath']):
+            if not self.file_handler.file_exists(file['filepath']):
                 messagebox.showerror("Erreur", "❌ Le fichier n'existe plus")
                 return
             
-            # Récupérer le nom original pour les fichiers cryptés
-            if hasattr(self.file_handler, 'get_original_filename'):
-                display_name = self.file_handler.get_original_filename(file['filepath'])
-            else:
-                display_name = file['filename']
+            # Un blob dédupliqué peut être partagé: le nom fait foi en base
+            display_name = file['filename']
             
             extension = display_name.rsplit('.', 1)[-1].lower() if '.' in display_name else ''
             
@@ -554,10 +613,10 @@ class SearchWindow:
             if extension == 'pdf':
                 from .pdf_viewer import PDFViewer
                 pdf_window = ctk.CTkToplevel(self.root)
-                PDFViewer(pdf_window, file['filepath'], display_name)
+                PDFViewer(pdf_window, file['filepath'], display_name, self.file_handler)
             else:
                 # Pour les autres fichiers, utiliser le gestionnaire de fichiers
-                success = self.file_handler.open_file(file['filepath'])
+                success = self.file_handler.open_file(file['filepath'], display_name)
                 if not success:
                     messagebox.showerror("Erreur", "❌ Impossible d'ouvrir le fichier")
                     
@@ -0,0 +1,261 @@
+# utils/content_indexer.py
+"""
+Indexation du contenu des documents en arrière-plan
+
+Un thread parcourt les fichiers sans texte extrait, les déchiffre en flux
+(`FileHandler.open_stream`, rien n'est écrit en clair sur le disque) et
+enregistre leur texte dans `file_contents`, indexé en plein texte par
+`content_fts`. Chaque fichier a un statut (done, error, unsupported); un
+échec est retenté plus tard avec un délai croissant.
+"""
+
+import io
+import os
+import time
+import sqlite3
+import threading
+from typing import Callable, Optional
+
+# Taille maximale du texte conservé par document (borne l'index)
+MAX_CONTENT_CHARS = 2_000_000
+
+# Nouvelles tentatives après un échec: 1 min, 4 min, 16 min
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 60
+
+SUPPORTED_EXTENSIONS = {'pdf', 'docx', 'xlsx'}
+
+
+class UnsupportedDocument(Exception):
+    """Format sans extracteur (ou bibliothèque non installée)"""
+
+
+def _extract_pdf(stream) -> str:
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise UnsupportedDocument("PyMuPDF non installé")
+
+    try:
+        doc = fitz.open(stream=stream, filetype="pdf")
+    except Exception:
+        # Versions de PyMuPDF sans support des flux: charger en mémoire
+        stream.seek(0)
+        doc = fitz.open(stream=stream.read(), filetype="pdf")
+
+    parts = []
+    length = 0
+    try:
+        for page in doc:
+            text = page.get_text()
+            parts.append(text)
+            length += len(text)
+            if length >= MAX_CONTENT_CHARS:
+                break
+    finally:
+        doc.close()
+    return "\n".join(parts)
+
+
+def _extract_docx(stream) -> str:
+    try:
+        from docx import Document
+    except ImportError:
+        raise UnsupportedDocument("python-docx non installé")
+
+    doc = Document(stream)
+    parts = [para.text for para in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            parts.append(" ".join(cell.text for cell in row.cells))
+    return "\n".join(parts)
+
+
+def _extract_xlsx(stream) -> str:
+    try:
+        import openpyxl
+    except ImportError:
+        raise UnsupportedDocument("openpyxl non installé")
+
+    wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    parts = []
+    length = 0
+    try:
+        for sheet in wb.worksheets:
+            parts.append(sheet.title)
+            for row in sheet.iter_rows(values_only=True):
+                line = " ".join(str(value) for value in row if value is not None)
+                if line:
+                    parts.append(line)
+                    length += len(line)
+                if length >= MAX_CONTENT_CHARS:
+                    return "\n".join(parts)
+    finally:
+        wb.close()
+    return "\n".join(parts)
+
+
+EXTRACTORS = {
+    'pdf': _extract_pdf,
+    'docx': _extract_docx,
+    'xlsx': _extract_xlsx,
+}
+
+
+def extract_text(stream, extension: str) -> str:
+    """Extraire le texte d'un document ouvert en flux positionnable"""
+    extractor = EXTRACTORS.get(extension.lower())
+    if extractor is None:
+        raise UnsupportedDocument(f"Format .{extension} non indexé")
+    return extractor(stream)[:MAX_CONTENT_CHARS]
+
+
+class ContentIndexer:
+    """Thread d'extraction du contenu des fichiers vers l'index plein texte"""
+
+    def __init__(self, file_handler, db,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 on_pass_complete: Optional[Callable[[int], None]] = None,
+                 batch_size: int = 20,
+                 idle_interval: float = 30.0):
+        self.file_handler = file_handler
+        self.db = db
+        self.progress_callback = progress_callback
+        self.on_pass_complete = on_pass_complete
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="content-indexer", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Signaler de nouveaux fichiers (après un import)"""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def join(self, timeout: Optional[float] = None):
+        """Attendre la fin du thread après stop(), pour fermer la base ensuite"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        # Connexion propre à ce thread, fournie par Database
+        conn = self.db.conn
+        try:
+            while not self._stop.is_set():
+                indexed = self._index_pending(conn)
+                if indexed and self.on_pass_complete:
+                    self.on_pass_complete(indexed)
+
+                self._wake.wait(self.idle_interval)
+                self._wake.clear()
+        except Exception as e:
+            print(f"❌ Erreur de l'indexation du contenu: {e}")
+        finally:
+            self.db.release_connection()
+
+    def _pending_query(self, conn, count_only: bool = False):
+        columns = "COUNT(*)" if count_only else "f.id, f.filename, f.filepath, f.file_hash, c.attempts"
+        query = f"""
+            SELECT {columns}
+            FROM files f
+            INNER JOIN folders fo ON fo.id = f.folder_id
+            LEFT JOIN file_contents c ON c.file_id = f.id
+            WHERE f.deleted_at IS NULL AND fo.deleted_at IS NULL
+              AND (c.file_id IS NULL
+                   OR (c.status = 'error' AND c.attempts < ? AND c.next_attempt_at <= ?))
+        """
+        params = [MAX_ATTEMPTS, time.time()]
+        if count_only:
+            return conn.execute(query, params).fetchone()[0]
+        return conn.execute(query + " ORDER BY f.id LIMIT ?", params + [self.batch_size]).fetchall()
+
+    def _index_pending(self, conn) -> int:
+        """Traiter tous les fichiers en attente; retourne le nombre indexé"""
+        total = self._pending_query(conn, count_only=True)
+        if total == 0:
+            return 0
+
+        print(f"📑 Indexation du contenu: {total} fichier(s) en attente")
+        processed = 0
+        indexed = 0
+        while not self._stop.is_set():
+            rows = self._pending_query(conn)
+            if not rows:
+                break
+
+            # Écritures confiées au thread écrivain, validées ensemble par lot
+            writes = []
+            for row in rows:
+                if self._stop.is_set():
+                    break
+                status, future = self._index_file(conn, row)
+                writes.append(future)
+                if status == 'done':
+                    indexed += 1
+                processed += 1
+                if self.progress_callback:
+                    self.progress_callback(processed, total)
+            for future in writes:
+                try:
+                    future.result()
+                except sqlite3.IntegrityError:
+                    pass  # fichier purgé de la corbeille pendant l'extraction
+
+        print(f"✅ Indexation du contenu: {indexed} fichier(s) indexé(s)")
+        return indexed
+
+    def _index_file(self, conn, row):
+        extension = os.path.splitext(row['filename'])[1].lower().lstrip('.')
+        attempts = (row['attempts'] or 0) + 1
+        content = ""
+        error = ""
+        next_attempt_at = 0
+
+        # Un même contenu (blob dédupliqué) n'est extrait qu'une fois
+        reused = conn.execute(
+            "SELECT content FROM file_contents WHERE file_hash = ? AND file_hash != '' AND status = 'done' LIMIT 1",
+            (row['file_hash'],)
+        ).fetchone()
+
+        if reused is not None:
+            status, content = 'done', reused['content']
+        elif extension not in SUPPORTED_EXTENSIONS:
+            status = 'unsupported'
+        else:
+            try:
+                # Lectures complètes garanties (zipfile pour DOCX/XLSX)
+                with io.BufferedReader(self.file_handler.open_stream(row['filepath'])) as stream:
+                    content = extract_text(stream, extension)
+                status = 'done'
+            except UnsupportedDocument as e:
+                status, error = 'unsupported', str(e)
+            except Exception as e:
+                status, error = 'error', str(e)
+                next_attempt_at = time.time() + RETRY_BASE_DELAY * (4 ** (attempts - 1))
+                print(f"⚠️ Extraction impossible pour {row['filename']} (essai {attempts}/{MAX_ATTEMPTS}): {e}")
+
+        future = self.db.submit_write(self.db._execute, """
+            INSERT INTO file_contents
+                (file_id, file_hash, status, content, attempts, last_error, next_attempt_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(file_id) DO UPDATE SET
+                file_hash = excluded.file_hash,
+                status = excluded.status,
+                content = excluded.content,
+                attempts = excluded.attempts,
+                last_error = excluded.last_error,
+                next_attempt_at = excluded.next_attempt_at,
+                updated_at = excluded.updated_at
+        """, (row['id'], row['file_hash'] or '', status, content, attempts, error,
+              next_attempt_at, time.time()))
+        return status, future
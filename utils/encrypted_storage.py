@@ -0,0 +1,565 @@
+# utils/encrypted_storage.py
+"""
+Format de stockage chiffré segmenté (.enc)
+
+Structure d'un fichier :
+    En-tête  : MAGIC (5) | version (1) | algorithme (1) | compression (1)
+               | taille de segment (4) | sel (16) | taille en clair (8)
+    Segments : longueur (4) | nonce (12) | données chiffrées + tag (longueur)
+
+Les données sont stockées en binaire brut (sans encodage base64) et
+l'algorithme AEAD (AES-GCM ou ChaCha20-Poly1305) est choisi par fichier
+et enregistré dans l'en-tête.
+
+Chaque segment peut être compressé avant d'être chiffré (un contenu chiffré
+ne se compresse plus). Le codec (zlib, ou zstd si le module zstandard est
+installé) est choisi par fichier d'après un échantillon: les formats déjà
+compressés, comme les conteneurs ZIP .docx et .xlsx, sont stockés tels
+quels. L'octet réservé de la version 1 de l'en-tête porte le codec depuis
+la version 2; les fichiers en version 1 ne sont pas compressés.
+
+Chaque segment est authentifié indépendamment : l'en-tête, l'index du
+segment et un indicateur de dernier segment font partie des données
+associées, ce qui interdit la troncature et la permutation des segments.
+Le chiffrement et le déchiffrement se font segment par segment, en
+mémoire constante quelle que soit la taille du document.
+
+Les anciens fichiers Fernet (jeton base64 sans en-tête) restent lisibles
+de manière transparente.
+"""
+
+import hashlib
+import io
+import os
+import platform
+import struct
+import zlib
+from collections import OrderedDict
+from typing import BinaryIO, Iterator, Optional, Tuple, Dict, Any, Union
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b"PCENC"
+FORMAT_VERSION = 2
+SUPPORTED_VERSIONS = {1, 2}
+
+# Algorithmes AEAD supportés (identifiant stocké dans l'en-tête)
+CIPHER_AES_GCM = 1
+CIPHER_CHACHA20 = 2
+
+CIPHER_NAMES = {
+    CIPHER_AES_GCM: 'AES-256-GCM',
+    CIPHER_CHACHA20: 'ChaCha20-Poly1305'
+}
+
+# Compression des segments avant chiffrement (identifiant stocké dans l'en-tête)
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+CODEC_NAMES = {
+    CODEC_NONE: 'aucune',
+    CODEC_ZLIB: 'zlib',
+    CODEC_ZSTD: 'zstd'
+}
+
+# Échantillon lu pour choisir le codec, et gain minimal pour compresser
+SAMPLE_SIZE = 64 * 1024
+MIN_COMPRESSION_GAIN = 0.10
+
+# Signatures de formats déjà compressés (ZIP: .docx, .xlsx; gzip, zstd,
+# 7z, RAR, PNG, JPEG)
+COMPRESSED_SIGNATURES = (
+    b"PK\x03\x04", b"\x1f\x8b", b"\x28\xb5\x2f\xfd", b"7z\xbc\xaf",
+    b"Rar!", b"\x89PNG", b"\xff\xd8\xff"
+)
+
+DEFAULT_SEGMENT_SIZE = 1024 * 1024  # 1 Mo de données en clair par segment
+NONCE_SIZE = 12
+TAG_SIZE = 16
+SALT_SIZE = 16
+
+_HEADER = struct.Struct('>5sBBBI16sQ')
+_SIZE_FIELD = struct.Struct('>Q')
+_AAD_LENGTH = _HEADER.size - _SIZE_FIELD.size  # la taille en clair est écrite à la fin
+_SEGMENT = struct.Struct('>I12s')
+_SEGMENT_AAD = struct.Struct('>IB')
+
+HEADER_SIZE = _HEADER.size
+SEGMENT_OVERHEAD = _SEGMENT.size + TAG_SIZE
+
+
+def derive_file_key(master_key: bytes, salt: bytes) -> bytes:
+    """Dériver la clé propre à un fichier depuis la clé maître et le sel"""
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        info=b"panel-choice/enc/v1"
+    ).derive(master_key)
+
+
+def _new_aead(cipher: int, key: bytes):
+    """Instancier l'algorithme AEAD correspondant à l'identifiant"""
+    if cipher == CIPHER_AES_GCM:
+        return AESGCM(key)
+    if cipher == CIPHER_CHACHA20:
+        return ChaCha20Poly1305(key)
+    raise ValueError(f"Algorithme de chiffrement inconnu: {cipher}")
+
+
+_preferred_cipher = None
+
+
+def preferred_cipher() -> int:
+    """
+    Choisir l'algorithme le plus rapide pour la machine courante
+
+    AES-GCM est nettement plus rapide avec les instructions AES matérielles
+    (AES-NI sur x86, extensions crypto sur ARMv8) ; sans elles,
+    ChaCha20-Poly1305 est le meilleur choix.
+    """
+    global _preferred_cipher
+    if _preferred_cipher is not None:
+        return _preferred_cipher
+
+    has_aes = True
+    try:
+        if platform.system() == "Linux" and os.path.exists("/proc/cpuinfo"):
+            with open("/proc/cpuinfo", 'r', encoding='utf-8', errors='ignore') as f:
+                cpuinfo = f.read()
+            flags = set()
+            for line in cpuinfo.splitlines():
+                if line.startswith(("flags", "Features")):
+                    flags.update(line.split(":", 1)[1].split())
+            has_aes = 'aes' in flags
+    except Exception:
+        pass
+
+    _preferred_cipher = CIPHER_AES_GCM if has_aes else CIPHER_CHACHA20
+    return _preferred_cipher
+
+
+def choose_codec(sample: bytes) -> int:
+    """
+    Choisir la compression d'un fichier d'après un échantillon de son contenu
+
+    Un format déjà compressé, ou un échantillon qui gagne moins de
+    MIN_COMPRESSION_GAIN avec zlib en mode rapide, n'est pas compressé.
+    """
+    if not sample or sample.startswith(COMPRESSED_SIGNATURES):
+        return CODEC_NONE
+    if len(zlib.compress(sample, 1)) > len(sample) * (1 - MIN_COMPRESSION_GAIN):
+        return CODEC_NONE
+    return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def sample_file(filepath: str) -> bytes:
+    """Échantillon d'un fichier pour choose_codec: son début et son milieu"""
+    half = SAMPLE_SIZE // 2
+    with open(filepath, 'rb') as f:
+        sample = f.read(half)
+        size = f.seek(0, io.SEEK_END)
+        f.seek(max(half, size // 2))
+        return sample + f.read(half)
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 6)
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Compression inconnue: {codec}")
+
+
+def _decompress(codec: int, data: bytes, expected_size: int) -> bytes:
+    """
+    Décompresser un segment, sans jamais produire plus que sa taille attendue
+
+    La taille en clair de l'en-tête est écrite après le chiffrement, hors des
+    données associées: c'est la taille de chaque segment, authentifié, qui la
+    confirme. Un segment dont la longueur diffère est donc rejeté.
+    """
+    if codec == CODEC_NONE:
+        plain = data
+    elif codec == CODEC_ZLIB:
+        decompressor = zlib.decompressobj()
+        plain = decompressor.decompress(data, expected_size)
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ValueError("Segment compressé invalide")
+    elif codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Fichier compressé avec zstd: module zstandard non installé")
+        plain = zstandard.ZstdDecompressor().decompress(data, max_output_size=expected_size)
+    else:
+        raise ValueError(f"Compression inconnue: {codec}")
+    if len(plain) != expected_size:
+        raise ValueError("Taille de segment différente de la taille en clair de l'en-tête")
+    return plain
+
+
+def _segment_plain_size(header: Dict[str, Any], index: int) -> int:
+    """Taille en clair attendue d'un segment"""
+    return min(header['segment_size'], header['plaintext_size'] - index * header['segment_size'])
+
+
+def _read_full(stream: BinaryIO, size: int) -> bytes:
+    """Lire exactement `size` octets, sauf en fin de flux"""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_header(stream: BinaryIO) -> Optional[Dict[str, Any]]:
+    """
+    Lire l'en-tête d'un fichier chiffré
+
+    Returns:
+        Dictionnaire décrivant l'en-tête, ou None pour un fichier Fernet
+        (le flux est alors replacé à sa position initiale)
+    """
+    start = stream.tell()
+    raw = _read_full(stream, _HEADER.size)
+    if len(raw) < _HEADER.size or not raw.startswith(MAGIC):
+        stream.seek(start)
+        return None
+
+    magic, version, cipher, codec, segment_size, salt, plaintext_size = _HEADER.unpack(raw)
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Version de format non supportée: {version}")
+    if segment_size <= 0:
+        raise ValueError("Taille de segment invalide")
+    if version == 1:
+        codec = CODEC_NONE  # octet réservé, jamais compressé
+    elif codec not in CODEC_NAMES:
+        raise ValueError(f"Compression inconnue: {codec}")
+
+    return {
+        'version': version,
+        'cipher': cipher,
+        'codec': codec,
+        'segment_size': segment_size,
+        'salt': salt,
+        'plaintext_size': plaintext_size,
+        'segment_count': max(1, -(-plaintext_size // segment_size)),
+        'aad': raw[:_AAD_LENGTH],
+        'data_offset': start + _HEADER.size
+    }
+
+
+def encrypt_stream(source: BinaryIO, dest: BinaryIO, master_key: bytes,
+                   segment_size: int = DEFAULT_SEGMENT_SIZE,
+                   cipher: Optional[int] = None,
+                   codec: int = CODEC_NONE) -> Tuple[int, str]:
+    """
+    Chiffrer un flux segment par segment
+
+    Args:
+        source: Flux en clair (lecture)
+        dest: Flux de destination (écriture, doit être positionnable)
+        master_key: Clé maître
+        segment_size: Taille des segments en clair
+        cipher: Identifiant de l'algorithme AEAD (par défaut le plus rapide)
+        codec: Compression des segments avant chiffrement (voir choose_codec)
+
+    Returns:
+        Tuple (taille en clair, SHA-256 hexadécimal du contenu en clair)
+    """
+    if cipher is None:
+        cipher = preferred_cipher()
+    if codec == CODEC_ZSTD and zstandard is None:
+        codec = CODEC_ZLIB
+    salt = os.urandom(SALT_SIZE)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, cipher, codec, segment_size, salt, 0)
+    aad = header[:_AAD_LENGTH]
+    aead = _new_aead(cipher, derive_file_key(master_key, salt))
+
+    start = dest.tell()
+    dest.write(header)
+
+    digest = hashlib.sha256()
+    total_size = 0
+    index = 0
+    chunk = _read_full(source, segment_size)
+
+    while True:
+        # Lecture anticipée pour savoir si le segment courant est le dernier
+        following = _read_full(source, segment_size) if len(chunk) == segment_size else b""
+        is_last = not following
+
+        digest.update(chunk)
+        total_size += len(chunk)
+
+        nonce = os.urandom(NONCE_SIZE)
+        sealed = aead.encrypt(nonce, _compress(codec, chunk), aad + _SEGMENT_AAD.pack(index, is_last))
+        dest.write(_SEGMENT.pack(len(sealed), nonce))
+        dest.write(sealed)
+
+        if is_last:
+            break
+        chunk = following
+        index += 1
+
+    # Compléter l'en-tête avec la taille en clair
+    end = dest.tell()
+    dest.seek(start + _AAD_LENGTH)
+    dest.write(_SIZE_FIELD.pack(total_size))
+    dest.seek(end)
+
+    return total_size, digest.hexdigest()
+
+
+def iter_decrypted(source: BinaryIO, master_key: bytes) -> Iterator[bytes]:
+    """
+    Déchiffrer un flux segment par segment
+
+    Les fichiers Fernet hérités sont déchiffrés d'un bloc (le format ne
+    permet pas de faire mieux).
+    """
+    header = read_header(source)
+    if header is None:
+        yield Fernet(master_key).decrypt(source.read())
+        return
+
+    aead = _new_aead(header['cipher'], derive_file_key(master_key, header['salt']))
+    last_index = header['segment_count'] - 1
+
+    for index in range(header['segment_count']):
+        raw = _read_full(source, _SEGMENT.size)
+        if len(raw) < _SEGMENT.size:
+            raise ValueError("Fichier chiffré tronqué")
+        length, nonce = _SEGMENT.unpack(raw)
+        sealed = _read_full(source, length)
+        if len(sealed) < length:
+            raise ValueError("Fichier chiffré tronqué")
+
+        aad = header['aad'] + _SEGMENT_AAD.pack(index, index == last_index)
+        try:
+            payload = aead.decrypt(nonce, sealed, aad)
+        except InvalidTag:
+            raise ValueError(f"Segment {index} corrompu ou falsifié")
+        yield _decompress(header['codec'], payload, _segment_plain_size(header, index))
+
+    if source.read(1):
+        raise ValueError("Données inattendues après le dernier segment")
+
+
+def decrypt_stream(source: BinaryIO, dest: BinaryIO, master_key: bytes) -> Tuple[int, str]:
+    """
+    Déchiffrer un flux vers une destination en mémoire constante
+
+    Returns:
+        Tuple (taille en clair, SHA-256 hexadécimal du contenu en clair)
+    """
+    digest = hashlib.sha256()
+    total_size = 0
+    for chunk in iter_decrypted(source, master_key):
+        digest.update(chunk)
+        total_size += len(chunk)
+        dest.write(chunk)
+    return total_size, digest.hexdigest()
+
+
+class _ChunkReader(io.RawIOBase):
+    """Flux en lecture sur une suite de blocs (contenu déchiffré à la volée)"""
+
+    def __init__(self, first: bytes, chunks: Iterator[bytes]):
+        super().__init__()
+        self._buffer = memoryview(first)
+        self._chunks = chunks
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(chunk)
+        count = min(len(buffer), len(self._buffer))
+        buffer[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+
+def reencrypt_stream(source: BinaryIO, dest: BinaryIO, master_key: bytes) -> Tuple[int, str]:
+    """
+    Réécrire un contenu chiffré (Fernet ou format antérieur) au format courant
+
+    Le contenu est déchiffré et rechiffré segment par segment, jamais écrit
+    en clair; la compression est choisie d'après le premier segment.
+
+    Returns:
+        Tuple (taille en clair, SHA-256 hexadécimal du contenu en clair)
+    """
+    chunks = iter_decrypted(source, master_key)
+    first = next(chunks, b"")
+    codec = choose_codec(first[:SAMPLE_SIZE])
+    return encrypt_stream(_ChunkReader(first, chunks), dest, master_key, codec=codec)
+
+
+class EncryptedReader(io.RawIOBase):
+    """
+    Lecteur positionnable qui déchiffre à la demande
+
+    Seuls les segments couvrant les octets lus sont déchiffrés. L'index des
+    positions de segments est construit paresseusement en sautant d'en-tête
+    en en-tête de segment (4 octets lus par segment), puis conservé. Un
+    petit cache LRU garde les derniers segments déchiffrés, ce qui suffit
+    aux accès rapprochés d'un lecteur PDF.
+
+    Les fichiers Fernet hérités sont déchiffrés en mémoire à l'ouverture.
+    La source est un chemin, ou un flux binaire positionnable déjà ouvert
+    (un blob d'un fichier pack) dont le lecteur devient propriétaire.
+    """
+
+    def __init__(self, source: Union[str, BinaryIO], master_key: bytes, cache_segments: int = 8):
+        super().__init__()
+        self._file = open(source, 'rb') if isinstance(source, str) else source
+        self._position = 0
+        self._legacy = None
+        self._cache = OrderedDict()
+        self._cache_segments = cache_segments
+
+        try:
+            self._header = read_header(self._file)
+        except Exception:
+            self._file.close()
+            raise
+
+        if self._header is None:
+            self._legacy = io.BytesIO(Fernet(master_key).decrypt(self._file.read()))
+            self._file.close()
+            self._size = len(self._legacy.getbuffer())
+            return
+
+        self._size = self._header['plaintext_size']
+        self._segment_size = self._header['segment_size']
+        self._last_index = self._header['segment_count'] - 1
+        self._aead = _new_aead(self._header['cipher'],
+                               derive_file_key(master_key, self._header['salt']))
+        # Index des positions de segments dans le fichier chiffré
+        self._offsets = [self._header['data_offset']]
+
+    @property
+    def size(self) -> int:
+        """Taille du contenu en clair"""
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Valeur whence invalide: {whence}")
+        if position < 0:
+            raise ValueError("Position négative")
+        self._position = position
+        return position
+
+    def _segment_offset(self, index: int) -> int:
+        """Position d'un segment dans le fichier, en complétant l'index si besoin"""
+        while len(self._offsets) <= index:
+            offset = self._offsets[-1]
+            self._file.seek(offset)
+            raw = _read_full(self._file, _SEGMENT.size)
+            if len(raw) < _SEGMENT.size:
+                raise ValueError("Fichier chiffré tronqué")
+            length = _SEGMENT.unpack(raw)[0]
+            self._offsets.append(offset + _SEGMENT.size + length)
+        return self._offsets[index]
+
+    def _load_segment(self, index: int) -> bytes:
+        """Déchiffrer un segment (avec cache LRU)"""
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+
+        self._file.seek(self._segment_offset(index))
+        raw = _read_full(self._file, _SEGMENT.size)
+        if len(raw) < _SEGMENT.size:
+            raise ValueError("Fichier chiffré tronqué")
+        length, nonce = _SEGMENT.unpack(raw)
+        sealed = _read_full(self._file, length)
+        if len(sealed) < length:
+            raise ValueError("Fichier chiffré tronqué")
+
+        aad = self._header['aad'] + _SEGMENT_AAD.pack(index, index == self._last_index)
+        try:
+            payload = self._aead.decrypt(nonce, sealed, aad)
+        except InvalidTag:
+            raise ValueError(f"Segment {index} corrompu ou falsifié")
+        data = _decompress(self._header['codec'], payload, _segment_plain_size(self._header, index))
+
+        if len(self._offsets) == index + 1:
+            self._offsets.append(self._file.tell())
+
+        self._cache[index] = data
+        if len(self._cache) > self._cache_segments:
+            self._cache.popitem(last=False)
+        return data
+
+    def readinto(self, buffer) -> int:
+        if self._legacy is not None:
+            self._legacy.seek(self._position)
+            count = self._legacy.readinto(buffer)
+            self._position += count
+            return count
+
+        view = memoryview(buffer).cast('B')
+        written = 0
+        while written < len(view) and self._position < self._size:
+            index, start = divmod(self._position, self._segment_size)
+            segment = self._load_segment(index)
+            count = min(len(segment) - start, len(view) - written)
+            if count <= 0:
+                break
+            view[written:written + count] = segment[start:start + count]
+            written += count
+            self._position += count
+        return written
+
+    def close(self):
+        if not self.closed:
+            self._cache.clear()
+            if self._legacy is not None:
+                self._legacy.close()
+            else:
+                self._file.close()
+        super().close()
+
+
+def is_legacy_file(filepath: str) -> bool:
+    """Vérifier si un fichier utilise l'ancien format Fernet"""
+    with open(filepath, 'rb') as f:
+        return read_header(f) is None
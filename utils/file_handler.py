@@ -1,13 +1,134 @@
 # utils/file_handler.py
+import io
 import os
 import shutil
 import subprocess
 import platform
-from typing import Tuple, Optional
+import threading
+from typing import Tuple, Optional, Dict, Any, Iterable, BinaryIO
 from pathlib import Path
 from cryptography.fernet import Fernet
-import json
 import base64
+import hashlib
+import hmac
+
+from .encrypted_storage import (encrypt_stream, decrypt_stream, reencrypt_stream, read_header,
+                                choose_codec, sample_file, EncryptedReader, FORMAT_VERSION)
+from .metadata_store import MetadataStore
+from .import_journal import ImportJournal, list_interrupted_jobs
+from .temp_files import TempFileManager
+from .pack_store import PackStore, PACK_THRESHOLD, is_packed
+
+def encrypt_to_path(source_path: str, dest_path: str, master_key: bytes) -> Tuple[int, str]:
+    """
+    Chiffrer un fichier vers `dest_path` de manière atomique
+    
+    Le fichier est écrit sous un nom temporaire unique puis renommé: deux
+    imports concurrents du même contenu ne peuvent pas se corrompre. Il est
+    compressé avant chiffrement si son échantillon s'y prête.
+    
+    Returns:
+        Tuple (taille en clair, SHA-256 du contenu en clair)
+    """
+    codec = choose_codec(sample_file(source_path))
+    temp_path = f"{dest_path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with open(source_path, 'rb') as src, open(temp_path, 'wb') as dst:
+            result = encrypt_stream(src, dst, master_key, codec=codec)
+        os.replace(temp_path, dest_path)
+        return result
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def hash_source(source_path: str) -> Tuple[int, str]:
+    """Calculer la taille et le SHA-256 d'un fichier source en streaming"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(source_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def compute_blob_id(master_key: bytes, file_hash: str) -> str:
+    """
+    Identifiant de stockage d'un contenu
+    
+    HMAC du SHA-256 en clair: deux imports identiques partagent le même
+    blob, sans que le nom du fichier chiffré révèle l'empreinte du document.
+    """
+    return hmac.new(master_key, file_hash.encode(), hashlib.sha256).hexdigest()
+
+
+def shard_path(objects_dir: str, blob_name: str) -> str:
+    """
+    Chemin d'un blob dans l'arborescence répartie `objects/ab/cd/<id>.enc`
+    
+    Deux niveaux de 256 sous-dossiers, pris dans le préfixe de l'identifiant,
+    bornent le nombre d'entrées par répertoire quel que soit le volume. Les
+    anciens noms (uuid_empreinte.enc) sont répartis selon leur SHA-256.
+    """
+    stem = blob_name[:-4] if blob_name.endswith('.enc') else blob_name
+    if len(stem) < 4 or any(c not in '0123456789abcdef' for c in stem):
+        stem = hashlib.sha256(stem.encode()).hexdigest()
+    return os.path.join(objects_dir, stem[:2], stem[2:4], blob_name)
+
+
+def store_blob(source_path: str, objects_dir: str, master_key: bytes,
+               pack_threshold: int = PACK_THRESHOLD, packs_index: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stocker le contenu d'un fichier dans le stockage adressé par contenu
+    
+    Fonction autonome (sans état) pour pouvoir s'exécuter dans un processus
+    du pipeline d'import. Le contenu en clair est haché d'abord: si un blob
+    identique existe déjà, aucun chiffrement ni écriture n'est effectué.
+    
+    Un contenu de moins de `pack_threshold` octets est chiffré en mémoire et
+    retourné dans 'packed_data' sans être écrit: seul le processus principal
+    ajoute aux packs (voir FileHandler.pack_stored). `packs_index` (base des
+    métadonnées) permet de reconnaître un doublon déjà empaqueté.
+    
+    Returns:
+        Dictionnaire (filepath, file_hash, file_size, is_duplicate, created_at,
+        et packed_data pour un petit blob)
+    """
+    file_size, file_hash = hash_source(source_path)
+    dest_path = shard_path(objects_dir, f"{compute_blob_id(master_key, file_hash)}.enc")
+    stored = {
+        'filepath': dest_path,
+        'file_hash': file_hash,
+        'file_size': file_size,
+        'is_duplicate': os.path.exists(dest_path) or bool(packs_index and is_packed(packs_index, dest_path)),
+        'created_at': os.path.getctime(source_path)
+    }
+    if stored['is_duplicate']:
+        return stored
+    
+    if file_size < pack_threshold:
+        packed = io.BytesIO()
+        with open(source_path, 'rb') as src:
+            plain_size, plain_hash = encrypt_stream(src, packed, master_key,
+                                                    codec=choose_codec(sample_file(source_path)))
+        stored['packed_data'] = packed.getvalue()
+    else:
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        plain_size, plain_hash = encrypt_to_path(source_path, dest_path, master_key)
+        if plain_hash != file_hash:
+            os.remove(dest_path)
+    
+    if plain_hash != file_hash:
+        raise ValueError("Fichier source modifié pendant l'import")
+    return stored
+
+
+class _NullWriter:
+    """Destination qui ignore les données (mesure d'un contenu déchiffré)"""
+    def write(self, data):
+        return len(data)
+
 
 class FileHandler:
     """Gestionnaire de fichiers avec cryptage et structure invisible optimisée"""
@@ -15,6 +136,9 @@ class FileHandler:
     # Extensions autorisées
     ALLOWED_EXTENSIONS = {'.pdf', '.docx', '.xlsx', '.doc', '.xls'}
     
+    # Formats déjà compressés (conteneurs ZIP)
+    COMPRESSED_EXTENSIONS = {'.docx', '.xlsx'}
+    
     # Icônes par extension
     FILE_ICONS = {
         'pdf': '📕',
@@ -37,7 +161,13 @@ class FileHandler:
     def __init__(self, upload_dir: str = "uploads"):
         self.upload_dir = upload_dir
         self.crypto_dir = os.path.join(upload_dir, ".encrypted")
-        self.metadata_file = os.path.join(upload_dir, ".metadata.json")
+        self.objects_dir = os.path.join(self.crypto_dir, "objects")
+        self.packs_dir = os.path.join(self.objects_dir, "packs")
+        self.metadata_file = os.path.join(upload_dir, ".metadata.db")
+        self.legacy_metadata_file = os.path.join(upload_dir, ".metadata.json")
+        self.jobs_dir = os.path.join(upload_dir, ".jobs")
+        # Version du format atteinte par tout le stockage (conversion terminée)
+        self.format_marker_file = os.path.join(upload_dir, ".format_version")
         
         # Initialiser le cryptage
         self.encryption_key = self._get_or_create_encryption_key()
@@ -45,6 +175,9 @@ class FileHandler:
         
         self.ensure_directory_structure()
         self.load_metadata()
+        
+        # Copies déchiffrées pour les applications externes (un seul planificateur)
+        self.temp_files = TempFileManager(os.path.join(upload_dir, ".temp"))
     
     def _get_or_create_encryption_key(self) -> bytes:
         """Générer ou récupérer la clé de chiffrement"""
@@ -81,10 +214,8 @@ class FileHandler:
         # Dossier de fichiers cryptés
         os.makedirs(self.crypto_dir, exist_ok=True)
         
-        # Dossiers pour chaque panel
-        for panel_key, panel_name in self.PANEL_FOLDERS.items():
-            panel_path = os.path.join(self.crypto_dir, panel_key)
-            os.makedirs(panel_path, exist_ok=True)
+        # Stockage adressé par contenu (partagé entre les panels)
+        os.makedirs(self.objects_dir, exist_ok=True)
         
         # Masquer les dossiers système sur Windows
         if platform.system() == "Windows":
@@ -98,23 +229,15 @@ class FileHandler:
         print("✅ Structure de dossiers invisibles créée")
     
     def load_metadata(self):
-        """Charger les métadonnées des fichiers"""
-        try:
-            if os.path.exists(self.metadata_file):
-                with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    self.metadata = json.load(f)
-            else:
-                self.metadata = {}
-        except:
-            self.metadata = {}
+        """Ouvrir l'index des métadonnées (et migrer l'ancien JSON si présent)"""
+        self.metadata = MetadataStore(self.metadata_file)
+        self.metadata.migrate_from_json(self.legacy_metadata_file)
+        # Index des petits blobs empaquetés, dans la même base
+        self.packs = PackStore(self.packs_dir, self.metadata_file)
     
     def save_metadata(self):
-        """Sauvegarder les métadonnées"""
-        try:
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(self.metadata, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"⚠️ Erreur sauvegarde métadonnées: {e}")
+        """Conservé pour compatibilité: chaque écriture de l'index est déjà persistée"""
+        pass
     
     def get_file_icon(self, extension: str) -> str:
         """Récupérer l'icône correspondant à une extension"""
@@ -125,27 +248,237 @@ class FileHandler:
         ext = os.path.splitext(filename)[1].lower()
         return ext in self.ALLOWED_EXTENSIONS
     
-    def encrypt_file(self, source_path: str) -> bytes:
-        """Chiffrer un fichier"""
+    def encrypt_file(self, source_path: str, dest_path: str) -> Tuple[int, str]:
+        """
+        Chiffrer un fichier par segments, en mémoire constante
+        
+        Returns:
+            Tuple (taille en clair, SHA-256 du contenu en clair)
+        """
         try:
-            with open(source_path, 'rb') as f:
-                file_data = f.read()
-            return self.fernet.encrypt(file_data)
+            return encrypt_to_path(source_path, dest_path, self.encryption_key)
         except Exception as e:
             print(f"❌ Erreur chiffrement: {e}")
             raise
     
-    def decrypt_file(self, encrypted_data: bytes) -> bytes:
-        """Déchiffrer un fichier"""
+    def decrypt_file(self, encrypted_path: str, dest_path: str) -> Tuple[int, str]:
+        """
+        Déchiffrer un fichier (segmenté ou Fernet hérité) vers une destination
+        
+        Returns:
+            Tuple (taille en clair, SHA-256 du contenu en clair)
+        """
         try:
-            return self.fernet.decrypt(encrypted_data)
+            with self._open_encrypted(encrypted_path) as src, open(dest_path, 'wb') as dst:
+                return decrypt_stream(src, dst, self.encryption_key)
         except Exception as e:
             print(f"❌ Erreur déchiffrement: {e}")
             raise
     
-    def save_file(self, source_path: str, filename: str, panel: str = "interface_emp") -> Tuple[bool, str]:
+    def open_stream(self, encrypted_path: str) -> EncryptedReader:
         """
-        Enregistrer un fichier crypté dans la structure invisible
+        Ouvrir un fichier chiffré comme un flux positionnable en lecture
+        
+        Seules les plages d'octets effectivement lues sont déchiffrées,
+        sans jamais écrire le contenu en clair sur le disque.
+        """
+        return EncryptedReader(self._open_encrypted(encrypted_path), self.encryption_key)
+    
+    def hash_file(self, encrypted_path: str) -> str:
+        """Calculer le SHA-256 du contenu en clair d'un fichier chiffré"""
+        return self.measure_file(encrypted_path)[1]
+    
+    def measure_file(self, encrypted_path: str) -> Tuple[int, str]:
+        """
+        Déchiffrer un fichier sans l'écrire pour mesurer son contenu en clair
+        
+        Returns:
+            Tuple (taille en clair, SHA-256 du contenu en clair)
+        """
+        with self._open_encrypted(encrypted_path) as src:
+            return decrypt_stream(src, _NullWriter(), self.encryption_key)
+    
+    def _open_encrypted(self, encrypted_path: str) -> BinaryIO:
+        """Ouvrir un blob chiffré, empaqueté ou isolé, en lecture binaire"""
+        return self.packs.open_entry(encrypted_path) or open(encrypted_path, 'rb')
+    
+    def file_exists(self, encrypted_path: str) -> bool:
+        """Le blob est-il stocké (isolé ou dans un pack) ?"""
+        return encrypted_path in self.packs or os.path.exists(encrypted_path)
+    
+    def iter_encrypted_files(self):
+        """Parcourir tous les fichiers chiffrés du stockage"""
+        for root, dirs, files in os.walk(self.crypto_dir):
+            for name in files:
+                if name.endswith('.enc'):
+                    yield os.path.join(root, name)
+    
+    def convert_legacy_file(self, filepath: str) -> Tuple[int, int]:
+        """
+        Convertir un fichier Fernet ou d'une version antérieure du format
+        vers le format courant (segmenté, compressé si le contenu s'y prête)
+        
+        Le fichier garde le même chemin, la base de données reste donc valide.
+        
+        Returns:
+            Tuple (taille avant, taille après)
+        """
+        size_before = os.path.getsize(filepath)
+        
+        temp_path = filepath + ".part"
+        try:
+            with open(filepath, 'rb') as src, open(temp_path, 'wb') as dst:
+                reencrypt_stream(src, dst, self.encryption_key)
+            os.replace(temp_path, filepath)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        
+        return size_before, os.path.getsize(filepath)
+    
+    def _needs_conversion(self, filepath: str) -> bool:
+        """Vérifier si un fichier est au format Fernet ou dans une version antérieure"""
+        with open(filepath, 'rb') as f:
+            header = read_header(f)
+        if header is None:
+            return True
+        if header['version'] >= FORMAT_VERSION:
+            return False
+        
+        # Version 1, jamais compressée: inutile de réécrire un conteneur ZIP
+        entry = self.metadata.get(os.path.basename(filepath))
+        extension = Path(entry['original_name']).suffix.lower() if entry else ''
+        return extension not in self.COMPRESSED_EXTENSIONS
+    
+    def convert_legacy_files(self, progress_callback=None) -> Dict[str, int]:
+        """
+        Migrer tous les fichiers Fernet ou non compressés vers le format courant
+        
+        Args:
+            progress_callback: Fonction appelée avec (courant, total)
+            
+        Returns:
+            Statistiques: fichiers convertis, échecs et octets récupérés
+        """
+        stats = {'converted': 0, 'failed': 0, 'bytes_before': 0, 'bytes_after': 0, 'reclaimed': 0}
+        
+        # Conversion déjà terminée lors d'un démarrage précédent: pas de parcours des en-têtes
+        if self._read_format_marker() >= FORMAT_VERSION:
+            return stats
+        
+        legacy_files = []
+        for filepath in self.iter_encrypted_files():
+            try:
+                if self._needs_conversion(filepath):
+                    legacy_files.append(filepath)
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"⚠️ Fichier illisible ignoré {filepath}: {e}")
+        
+        for index, filepath in enumerate(legacy_files, start=1):
+            try:
+                size_before, size_after = self.convert_legacy_file(filepath)
+                stats['converted'] += 1
+                stats['bytes_before'] += size_before
+                stats['bytes_after'] += size_after
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"❌ Erreur conversion {filepath}: {e}")
+            
+            if progress_callback:
+                progress_callback(index, len(legacy_files))
+        
+        stats['reclaimed'] = stats['bytes_before'] - stats['bytes_after']
+        
+        # Les nouveaux blobs sont toujours écrits au format courant: un parcours
+        # sans échec suffit, les suivants seraient inutiles
+        if stats['failed'] == 0:
+            self._write_format_marker(FORMAT_VERSION)
+        
+        if legacy_files:
+            print(f"♻️ Conversion terminée: {stats['converted']} fichier(s), "
+                  f"{self.format_file_size(stats['reclaimed'])} récupérés")
+        return stats
+    
+    def _read_format_marker(self) -> int:
+        """Version du format de tout le stockage (0 si la conversion n'a jamais abouti)"""
+        try:
+            with open(self.format_marker_file, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+    
+    def _write_format_marker(self, version: int):
+        """Enregistrer la fin de la conversion vers `version`"""
+        temp_path = self.format_marker_file + ".part"
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(str(version))
+            os.replace(temp_path, self.format_marker_file)
+        except OSError as e:
+            print(f"⚠️ Impossible d'enregistrer la fin de la conversion: {e}")
+    
+    def start_legacy_conversion(self, on_complete=None, progress_callback=None) -> threading.Thread:
+        """
+        Lancer la conversion des fichiers Fernet ou non compressés dans un thread d'arrière-plan
+        
+        Args:
+            on_complete: Fonction appelée avec les statistiques de conversion
+            progress_callback: Fonction appelée avec (courant, total)
+        """
+        def worker():
+            stats = self.convert_legacy_files(progress_callback)
+            if on_complete:
+                on_complete(stats)
+        
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return thread
+    
+    def blob_id(self, file_hash: str) -> str:
+        """Identifiant de stockage d'un contenu (voir compute_blob_id)"""
+        return compute_blob_id(self.encryption_key, file_hash)
+    
+    def pack_stored(self, results: Iterable[Dict[str, Any]]):
+        """
+        Écrire dans un pack les petits blobs chiffrés en mémoire par store_blob
+        
+        Un seul ajout (une synchronisation disque) pour tout le lot; un blob
+        déjà empaqueté devient un doublon. À appeler avant d'enregistrer les
+        fichiers en base: une erreur d'écriture est propagée.
+        """
+        pending = [result for result in results if 'packed_data' in result]
+        if not pending:
+            return
+        
+        added = set(self.packs.append_many((result['filepath'], result['packed_data']) for result in pending))
+        for result in pending:
+            # Deux fichiers identiques dans le lot: seul le premier est nouveau
+            result['is_duplicate'] = result['filepath'] not in added
+            added.discard(result['filepath'])
+            del result['packed_data']
+    
+    def record_metadata(self, stored: Dict[str, Any], filename: str, panel: str):
+        """Enregistrer les métadonnées d'un blob nouvellement stocké"""
+        self.metadata.set_many([self._metadata_entry(stored, filename, panel)])
+    
+    def _metadata_entry(self, stored: Dict[str, Any], filename: str, panel: str) -> Tuple[str, Dict[str, Any]]:
+        encrypted_filename = os.path.basename(stored['filepath'])
+        return encrypted_filename, {
+            'original_name': filename,
+            'panel': panel,
+            'size': stored['file_size'],
+            'sha256': stored['file_hash'],
+            'created_at': stored['created_at'],
+            'file_id': encrypted_filename[:-4]
+        }
+    
+    def store_file(self, source_path: str, filename: str, panel: str = "interface_emp") -> Optional[Dict[str, Any]]:
+        """
+        Enregistrer un fichier dans le stockage chiffré dédupliqué
+        
+        Le contenu en clair est haché d'abord: si un blob identique existe déjà,
+        aucun chiffrement ni écriture n'est effectué.
         
         Args:
             source_path: Chemin source du fichier
@@ -153,53 +486,52 @@ class FileHandler:
             panel: Panel de destination
             
         Returns:
-            Tuple (succès, chemin_crypté)
+            Dictionnaire (filepath, file_hash, file_size, is_duplicate, created_at) ou None
         """
         try:
             if not os.path.exists(source_path):
                 print(f"❌ Fichier source introuvable: {source_path}")
-                return False, ""
+                return None
             
             if not self.is_allowed_file(filename):
                 print(f"❌ Type de fichier non autorisé: {filename}")
-                return False, ""
-            
-            # Générer un nom de fichier crypté unique
-            import uuid
-            import hashlib
-            
-            file_id = str(uuid.uuid4())
-            original_hash = hashlib.sha256(filename.encode()).hexdigest()[:8]
-            encrypted_filename = f"{file_id}_{original_hash}.enc"
-            
-            # Déterminer le dossier de destination
-            panel_dir = os.path.join(self.crypto_dir, panel)
-            dest_path = os.path.join(panel_dir, encrypted_filename)
-            
-            # Chiffrer et sauvegarder le fichier
-            encrypted_data = self.encrypt_file(source_path)
-            with open(dest_path, 'wb') as f:
-                f.write(encrypted_data)
-            
-            # Sauvegarder les métadonnées
-            self.metadata[encrypted_filename] = {
-                'original_name': filename,
-                'panel': panel,
-                'size': os.path.getsize(source_path),
-                'created_at': os.path.getctime(source_path),
-                'file_id': file_id
-            }
-            self.save_metadata()
-            
-            print(f"✅ Fichier crypté sauvegardé: {filename} -> {encrypted_filename}")
-            return True, dest_path
+                return None
+            
+            stored = store_blob(source_path, self.objects_dir, self.encryption_key,
+                                packs_index=self.metadata_file)
+            self.pack_stored([stored])
+            
+            if stored['is_duplicate']:
+                print(f"♻️ Contenu déjà stocké, import sans écriture: {filename}")
+            else:
+                self.record_metadata(stored, filename, panel)
+                print(f"✅ Fichier crypté sauvegardé: {filename} -> {os.path.basename(stored['filepath'])}")
+            
+            return stored
             
         except Exception as e:
             print(f"❌ Erreur lors de la sauvegarde cryptée: {e}")
+            return None
+    
+    def save_file(self, source_path: str, filename: str, panel: str = "interface_emp") -> Tuple[bool, str]:
+        """
+        Enregistrer un fichier crypté dans la structure invisible
+        
+        Args:
+            source_path: Chemin source du fichier
+            filename: Nom du fichier
+            panel: Panel de destination
+            
+        Returns:
+            Tuple (succès, chemin_crypté)
+        """
+        stored = self.store_file(source_path, filename, panel)
+        if not stored:
             return False, ""
+        return True, stored['filepath']
     
     def save_files_from_folder_direct(self, folder_path: str, db, panel: str = 'interface_emp', 
-                                    progress_callback=None) -> int:
+                                    progress_callback=None, journal: Optional[ImportJournal] = None) -> int:
         """
         Importer des fichiers directement dans un panel sans créer de dossier parent
         
@@ -208,6 +540,7 @@ class FileHandler:
             db: Instance de la base de données
             panel: Panel de destination
             progress_callback: Fonction de callback pour la progression
+            journal: Journal d'un import interrompu à reprendre (sinon un nouveau est créé)
             
         Returns:
             Nombre total de fichiers importés
@@ -221,30 +554,45 @@ class FileHandler:
             
             # Compter le nombre total de fichiers à importer
             total_count = self._count_files_recursive(folder_path)
-            current_count = [0]  # Liste mutable pour partager entre fonctions
+            
+            if journal is None:
+                journal = ImportJournal.create(
+                    self.jobs_dir, 'folder', {'source': folder_path, 'panel': panel}, total_count
+                )
+            elif journal.processed:
+                print(f"🔁 Reprise de l'import: {len(journal.completed)} fichier(s) déjà importé(s), "
+                      f"{len(journal.failed)} en échec")
+            
+            # Liste mutable pour partager entre fonctions (les fichiers repris comptent comme faits)
+            current_count = [journal.processed]
             
             print(f"📊 Import direct de {total_count} fichiers dans le panel {panel}")
             
             # Obtenir ou créer le dossier racine du panel
-            root_folders = db.get_subfolders(parent_id=None, panel=panel)
-            if not root_folders:
-                # Créer le dossier racine du panel s'il n'existe pas
-                root_folder_id = db.create_folder(self.PANEL_FOLDERS[panel], None, panel)
-            else:
-                root_folder_id = root_folders[0]['id']
+            root_folder_id = self._get_panel_root_folder_id(db, panel)
             
             # Importer tous les fichiers directement
             if os.path.isfile(folder_path):
                 # C'est un fichier unique
                 total_files = self._import_single_file(
-                    folder_path, db, root_folder_id, panel, progress_callback, total_count, current_count
+                    folder_path, db, root_folder_id, panel, progress_callback, total_count, current_count,
+                    journal
                 )
             else:
                 # C'est un dossier - importer récursivement
                 total_files = self._import_folder_contents_direct(
-                    folder_path, db, root_folder_id, panel, progress_callback, total_count, current_count
+                    folder_path, db, root_folder_id, panel, progress_callback, total_count, current_count,
+                    journal
                 )
             
+            if not journal.is_complete:
+                # Erreur en cours d'import: le journal reste pour une reprise au prochain démarrage
+                print(f"⚠️ Import incomplet: {journal.processed}/{journal.total} fichier(s), reprise possible")
+                return total_files
+            
+            if journal.failed:
+                print(f"⚠️ {len(journal.failed)} fichier(s) illisible(s) non importé(s)")
+            journal.finish()
             print(f"✅ Import direct terminé: {total_files} fichier(s) dans {panel}")
             return total_files
             
@@ -253,6 +601,100 @@ class FileHandler:
             import traceback
             traceback.print_exc()
             return total_files
+        finally:
+            # Un journal non terminé reste sur disque pour une reprise ultérieure
+            if journal is not None:
+                journal.close()
+    
+    def _get_panel_root_folder_id(self, db, panel: str) -> int:
+        """Obtenir ou créer le dossier racine du panel"""
+        root_folders = db.get_subfolders(parent_id=None, panel=panel)
+        if not root_folders:
+            # Créer le dossier racine du panel s'il n'existe pas
+            return db.create_folder(self.PANEL_FOLDERS[panel], None, panel)
+        return root_folders[0]['id']
+    
+    def sync_folder_direct(self, folder_path: str, db, panel: str = 'interface_emp',
+                           progress_callback=None, mark_deleted: bool = False) -> Dict[str, int]:
+        """
+        Synchroniser un dossier source avec un panel (import incrémental)
+        
+        Un manifeste (chemin, taille, date de modification, empreinte) garde
+        l'état de chaque source au dernier passage: seules les sources
+        nouvelles ou modifiées sont hachées et chiffrées.
+        
+        Args:
+            folder_path: Dossier source à synchroniser
+            db: Instance de la base de données
+            panel: Panel de destination
+            progress_callback: Fonction de callback pour la progression
+            mark_deleted: Retirer du panel les fichiers disparus de la source
+            
+        Returns:
+            Statistiques (added, updated, unchanged, deleted, failed)
+        """
+        from .import_pipeline import SyncPipeline
+        
+        stats = {'added': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'failed': 0}
+        
+        try:
+            if not os.path.isdir(folder_path):
+                print(f"❌ Dossier introuvable: {folder_path}")
+                return stats
+            
+            source_root = os.path.abspath(folder_path)
+            root_folder_id = self._get_panel_root_folder_id(db, panel)
+            manifest = db.get_sync_manifest(source_root, panel)
+            
+            # Comparer l'arborescence au manifeste sans lire le contenu
+            tasks, changes, seen = [], {}, set()
+            for source_path, filename, folder_id in self._iter_folder_tasks_direct(source_root, root_folder_id):
+                seen.add(source_path)
+                try:
+                    st = os.stat(source_path)
+                except OSError as e:
+                    print(f"⚠️ Source illisible {source_path}: {e}")
+                    stats['failed'] += 1
+                    continue
+                
+                entry = manifest.get(source_path)
+                if entry and not entry['file_exists']:
+                    entry = None  # supprimé du portail depuis: le réimporter
+                if entry and entry['file_size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+                    stats['unchanged'] += 1
+                    continue
+                
+                tasks.append((source_path, filename, folder_id))
+                changes[source_path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'entry': entry}
+            
+            print(f"🔄 Synchronisation de {source_root}: {len(tasks)} fichier(s) à traiter, "
+                  f"{stats['unchanged']} inchangé(s)")
+            
+            pipeline = SyncPipeline(self, db, panel, source_root, changes,
+                                    progress_callback=progress_callback)
+            written = pipeline.run(tasks, len(tasks))
+            for key in ('added', 'updated', 'unchanged'):
+                stats[key] += pipeline.stats[key]
+            stats['failed'] += len(tasks) - written - pipeline.stats['unchanged']
+            
+            # Sources disparues depuis la dernière synchronisation
+            removed = [path for path in manifest if path not in seen]
+            if removed and mark_deleted:
+                for path in removed:
+                    file_id = manifest[path]['file_id']
+                    if manifest[path]['file_exists'] and db.delete_file(file_id):
+                        stats['deleted'] += 1
+                db.delete_sync_entries(panel, removed)
+            
+            print(f"✅ Synchronisation terminée: {stats['added']} ajouté(s), {stats['updated']} mis à jour, "
+                  f"{stats['unchanged']} inchangé(s), {stats['deleted']} retiré(s)")
+            return stats
+            
+        except Exception as e:
+            print(f"❌ Erreur lors de la synchronisation: {e}")
+            import traceback
+            traceback.print_exc()
+            return stats
     
     def _count_files_recursive(self, path: str) -> int:
         """Compter récursivement tous les fichiers valides"""
@@ -270,19 +712,29 @@ class FileHandler:
             return 0
     
     def _import_single_file(self, file_path: str, db, folder_id: int, panel: str,
-                          progress_callback, total: int, current_count: list) -> int:
+                          progress_callback, total: int, current_count: list,
+                          journal: Optional[ImportJournal] = None) -> int:
         """Importer un fichier unique"""
         try:
             filename = os.path.basename(file_path)
             if not self.is_allowed_file(filename):
                 return 0
+            if journal and journal.is_done(file_path):
+                return 0
             
             # Sauvegarder le fichier crypté
-            success, dest_path = self.save_file(file_path, filename, panel)
+            stored = self.store_file(file_path, filename, panel)
+            if not stored and journal:
+                # Source introuvable ou illisible: échec définitif
+                journal.record_failed([(file_path, "Fichier source illisible")])
             
-            if success:
+            if stored:
                 # Enregistrer dans la base de données
-                db.add_file(folder_id, filename, dest_path)
+                new_ids = db.add_files_batch([
+                    (folder_id, filename, stored['filepath'], stored['file_hash'], stored['file_size'])
+                ])
+                if journal:
+                    journal.record_done([(file_path, new_ids[0])])
                 current_count[0] += 1
                 
                 if progress_callback:
@@ -296,91 +748,147 @@ class FileHandler:
             print(f"❌ Erreur import fichier {file_path}: {e}")
             return 0
     
+    def _iter_folder_tasks_direct(self, folder_path: str, root_folder_id: int):
+        """Générer les tâches d'import d'un dossier, à plat avec préfixes"""
+        for root, dirs, files in os.walk(folder_path):
+            # Calculer le chemin relatif pour créer un préfixe
+            relative_path = os.path.relpath(root, folder_path)
+            if relative_path == ".":
+                prefix = ""
+            else:
+                prefix = relative_path.replace(os.sep, "_") + "_"
+            
+            for filename in files:
+                if self.is_allowed_file(filename):
+                    # Créer un nom avec préfixe pour éviter les conflits
+                    yield os.path.join(root, filename), f"{prefix}{filename}", root_folder_id
+    
+    def _run_import_pipeline(self, tasks, db, panel: str, progress_callback,
+                             total: int, current_count: list,
+                             journal: Optional[ImportJournal] = None) -> int:
+        """Exécuter le pipeline parallèle en conservant le compteur partagé"""
+        from .import_pipeline import ImportPipeline
+        
+        if journal and journal.processed:
+            # Reprise: ne pas retraiter les sources déjà enregistrées ou en échec
+            tasks = (task for task in tasks if not journal.is_done(task[0]))
+        
+        offset = current_count[0]
+        
+        def on_progress(processed, _):
+            current_count[0] = offset + processed
+            if progress_callback:
+                progress_callback(current_count[0], total)
+        
+        return ImportPipeline(self, db, panel, on_progress, journal=journal).run(tasks, total)
+    
     def _import_folder_contents_direct(self, folder_path: str, db, root_folder_id: int, panel: str,
-                                     progress_callback, total: int, current_count: list) -> int:
+                                     progress_callback, total: int, current_count: list,
+                                     journal: Optional[ImportJournal] = None) -> int:
         """Importer le contenu d'un dossier de manière directe et plate"""
-        total_files = 0
-        
         try:
-            # Créer une structure plate des fichiers avec préfixes
-            folder_name = os.path.basename(folder_path)
-            
-            for root, dirs, files in os.walk(folder_path):
-                # Calculer le chemin relatif pour créer un préfixe
-                relative_path = os.path.relpath(root, folder_path)
-                if relative_path == ".":
-                    prefix = ""
-                else:
-                    prefix = relative_path.replace(os.sep, "_") + "_"
-                
-                # Traiter chaque fichier
-                for filename in files:
-                    if self.is_allowed_file(filename):
-                        file_path = os.path.join(root, filename)
-                        
-                        # Créer un nom avec préfixe pour éviter les conflits
-                        if prefix:
-                            prefixed_filename = f"{prefix}{filename}"
-                        else:
-                            prefixed_filename = filename
-                        
-                        # Sauvegarder le fichier crypté
-                        success, dest_path = self.save_file(file_path, prefixed_filename, panel)
-                        
-                        if success:
-                            # Enregistrer dans la base de données
-                            db.add_file(root_folder_id, prefixed_filename, dest_path)
-                            total_files += 1
-                            current_count[0] += 1
-                            
-                            if progress_callback:
-                                progress_callback(current_count[0], total)
-                            
-                            print(f"✅ Fichier importé: {prefixed_filename}")
-            
-            return total_files
-            
+            return self._run_import_pipeline(
+                self._iter_folder_tasks_direct(folder_path, root_folder_id),
+                db, panel, progress_callback, total, current_count, journal
+            )
         except Exception as e:
             print(f"❌ Erreur import dossier {folder_path}: {e}")
-            return total_files
+            return 0
+    
+    def import_files(self, file_paths, db, folder_id: int, panel: str = 'interface_emp',
+                     progress_callback=None, journal: Optional[ImportJournal] = None) -> int:
+        """
+        Importer une sélection de fichiers en parallèle dans un dossier
+        
+        Returns:
+            Nombre de fichiers importés
+        """
+        tasks = [
+            (path, os.path.basename(path), folder_id)
+            for path in file_paths
+            if self.is_allowed_file(os.path.basename(path))
+        ]
+        if journal is None:
+            journal = ImportJournal.create(
+                self.jobs_dir, 'files',
+                {'sources': [task[0] for task in tasks], 'folder_id': folder_id, 'panel': panel},
+                len(tasks)
+            )
+        try:
+            imported = self._run_import_pipeline(
+                tasks, db, panel, progress_callback, len(tasks), [journal.processed], journal
+            )
+            if journal.is_complete:
+                if journal.failed:
+                    print(f"⚠️ {len(journal.failed)} fichier(s) illisible(s) non importé(s)")
+                journal.finish()
+            else:
+                print(f"⚠️ Import incomplet: {journal.processed}/{journal.total} fichier(s), reprise possible")
+            return imported
+        except Exception as e:
+            print(f"❌ Erreur import fichiers: {e}")
+            return 0
+        finally:
+            journal.close()
+    
+    def interrupted_import_jobs(self):
+        """Imports interrompus (application fermée ou plantée en cours d'import)"""
+        return list_interrupted_jobs(self.jobs_dir)
     
-    def open_file(self, filepath: str) -> bool:
+    def resume_import_job(self, journal: ImportJournal, db, progress_callback=None) -> int:
+        """
+        Reprendre un import interrompu là où il s'était arrêté
+        
+        Returns:
+            Nombre de fichiers importés lors de la reprise
+        """
+        params = journal.params
+        if journal.kind == 'folder':
+            if not os.path.exists(params['source']):
+                print(f"⚠️ Source de l'import introuvable, reprise abandonnée: {params['source']}")
+                journal.finish()
+                return 0
+            return self.save_files_from_folder_direct(
+                params['source'], db, params['panel'], progress_callback, journal=journal
+            )
+        if journal.kind == 'files':
+            return self.import_files(
+                params['sources'], db, params['folder_id'], params['panel'], progress_callback, journal=journal
+            )
+        
+        print(f"⚠️ Type d'import inconnu dans le journal {journal.job_id}: {journal.kind}")
+        return 0
+    
+    def discard_import_job(self, journal: ImportJournal):
+        """Abandonner la reprise d'un import interrompu"""
+        journal.finish()
+    
+    def open_file(self, filepath: str, original_name: Optional[str] = None) -> bool:
         """
         Ouvrir un fichier crypté en le déchiffrant temporairement
         
         Args:
             filepath: Chemin du fichier crypté
+            original_name: Nom d'affichage (un blob partagé peut avoir plusieurs noms)
             
         Returns:
             True si succès, False sinon
         """
         try:
-            if not os.path.exists(filepath):
+            if not self.file_exists(filepath):
                 print(f"❌ Fichier crypté introuvable: {filepath}")
                 return False
             
             # Récupérer le nom original depuis les métadonnées
-            encrypted_filename = os.path.basename(filepath)
-            if encrypted_filename not in self.metadata:
-                print(f"❌ Métadonnées introuvables pour: {encrypted_filename}")
-                return False
-            
-            original_name = self.metadata[encrypted_filename]['original_name']
-            
-            # Créer un fichier temporaire déchiffré
-            temp_dir = os.path.join(self.upload_dir, ".temp")
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            temp_file = os.path.join(temp_dir, original_name)
-            
-            # Déchiffrer et sauvegarder temporairement
-            with open(filepath, 'rb') as f:
-                encrypted_data = f.read()
-            
-            decrypted_data = self.decrypt_file(encrypted_data)
+            if not original_name:
+                encrypted_filename = os.path.basename(filepath)
+                if encrypted_filename not in self.metadata:
+                    print(f"❌ Métadonnées introuvables pour: {encrypted_filename}")
+                    return False
+                
+                original_name = self.metadata[encrypted_filename]['original_name']
             
-            with open(temp_file, 'wb') as f:
-                f.write(decrypted_data)
+            temp_file = self.decrypted_copy(filepath, original_name)
             
             # Ouvrir le fichier temporaire
             system = platform.system()
@@ -392,22 +900,6 @@ class FileHandler:
             else:  # Linux
                 subprocess.run(['xdg-open', temp_file])
             
-            # Programmer la suppression du fichier temporaire après 30 secondes
-            import threading
-            import time
-            
-            def cleanup_temp_file():
-                time.sleep(30)
-                try:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                        print(f"🧹 Fichier temporaire supprimé: {original_name}")
-                except:
-                    pass
-            
-            cleanup_thread = threading.Thread(target=cleanup_temp_file, daemon=True)
-            cleanup_thread.start()
-            
             print(f"✅ Fichier déchiffré et ouvert: {original_name}")
             return True
             
@@ -415,6 +907,20 @@ class FileHandler:
             print(f"❌ Erreur lors de l'ouverture du fichier crypté: {e}")
             return False
     
+    def decrypted_copy(self, filepath: str, display_name: str) -> str:
+        """
+        Copie déchiffrée temporaire d'un blob, réutilisée si le document est
+        déjà ouvert et supprimée à son expiration par le gestionnaire des copies
+        
+        Returns:
+            Chemin de la copie temporaire
+        """
+        return self.temp_files.acquire(
+            filepath, display_name,
+            lambda dest: self.decrypt_file(filepath, dest),
+            source_version=self.packs.locate(filepath)
+        )
+    
     def delete_file(self, filepath: str) -> bool:
         """
         Supprimer un fichier crypté et ses métadonnées
@@ -428,15 +934,15 @@ class FileHandler:
         try:
             encrypted_filename = os.path.basename(filepath)
             
-            # Supprimer le fichier physique
+            # Supprimer le fichier physique (ou l'entrée de son pack)
             if os.path.exists(filepath):
                 os.remove(filepath)
                 print(f"✅ Fichier crypté supprimé: {encrypted_filename}")
+            self.packs.delete_many([filepath])
             
             # Supprimer les métadonnées
             if encrypted_filename in self.metadata:
                 del self.metadata[encrypted_filename]
-                self.save_metadata()
                 print(f"✅ Métadonnées supprimées: {encrypted_filename}")
             
             return True
@@ -444,12 +950,60 @@ class FileHandler:
             print(f"❌ Erreur lors de la suppression: {e}")
             return False
     
+    def delete_files(self, filepaths: Iterable[str]) -> int:
+        """
+        Supprimer plusieurs fichiers cryptés, leurs métadonnées étant
+        retirées en une seule transaction
+        
+        Returns:
+            Nombre de fichiers supprimés du disque
+        """
+        removed, discarded = self._discard_blobs(filepaths)
+        try:
+            self.metadata.delete_many(os.path.basename(filepath) for filepath in discarded)
+        except Exception as e:
+            print(f"❌ Erreur lors de la suppression des métadonnées: {e}")
+        return removed
+    
+    def discard_blobs(self, filepaths: Iterable[str]) -> int:
+        """
+        Supprimer des blobs, isolés ou empaquetés, sans toucher aux métadonnées
+        (un blob déplacé garde les siennes)
+        
+        Returns:
+            Nombre de blobs supprimés
+        """
+        return self._discard_blobs(filepaths)[0]
+    
+    def _discard_blobs(self, filepaths: Iterable[str]) -> Tuple[int, list]:
+        """Retourne (nombre supprimé, chemins désormais absents du stockage)"""
+        removed = 0
+        discarded = []
+        for filepath in filepaths:
+            try:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                    removed += 1
+            except OSError as e:
+                print(f"⚠️ Impossible de supprimer {os.path.basename(filepath)}: {e}")
+                continue
+            discarded.append(filepath)
+        
+        try:
+            removed += self.packs.delete_many(discarded)
+        except Exception as e:
+            print(f"❌ Erreur lors de la mise à jour de l'index des packs: {e}")
+        return removed, discarded
+    
     def get_file_size(self, filepath: str) -> int:
         """Récupérer la taille d'un fichier crypté depuis les métadonnées"""
         try:
             encrypted_filename = os.path.basename(filepath)
             if encrypted_filename in self.metadata:
                 return self.metadata[encrypted_filename].get('size', 0)
+            location = self.packs.locate(filepath)
+            if location:
+                return location[2]
             return os.path.getsize(filepath) if os.path.exists(filepath) else 0
         except:
             return 0
@@ -0,0 +1,167 @@
+# utils/import_journal.py
+"""
+Journal de reprise des imports
+
+Chaque import écrit un fichier `uploads/.jobs/<id>.jsonl` en ajout seul:
+
+    {"job": "folder", "params": {...}, "total": 1200, "created_at": ...}
+    {"done": "/chemin/source.pdf", "id": 42}
+    {"failed": "/chemin/illisible.pdf", "error": "..."}
+    ...
+
+La première ligne décrit le travail prévu, les suivantes les fichiers déjà
+enregistrés en base et les sources en échec définitif (illisibles), qui ne
+seront pas retentées. Un journal dont toutes les sources sont enregistrées
+ou en échec est supprimé: tout journal restant au démarrage correspond à un
+import interrompu, que l'on peut reprendre en sautant les sources déjà
+marquées.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+
+class ImportJournal:
+    """Journal persistant d'un import (fichiers prévus et terminés)"""
+
+    def __init__(self, path: str, header: Dict[str, Any], completed: Optional[set] = None,
+                 failed: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.header = header
+        self.completed = completed or set()
+        self.failed = failed or {}  # source -> message d'erreur
+        self._lock = threading.Lock()
+        self._file = None  # ouvert à la première écriture
+
+    @property
+    def job_id(self) -> str:
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    @property
+    def kind(self) -> str:
+        return self.header['job']
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return self.header['params']
+
+    @property
+    def total(self) -> int:
+        return self.header.get('total', 0)
+
+    @classmethod
+    def create(cls, jobs_dir: str, kind: str, params: Dict[str, Any], total: int = 0) -> 'ImportJournal':
+        """Démarrer un nouveau journal"""
+        os.makedirs(jobs_dir, exist_ok=True)
+        path = os.path.join(jobs_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl")
+        header = {'job': kind, 'params': params, 'total': total, 'created_at': time.time()}
+
+        journal = cls(path, header)
+        journal._append([header])
+        return journal
+
+    @classmethod
+    def load(cls, path: str) -> Optional['ImportJournal']:
+        """Rouvrir un journal existant pour reprendre l'import"""
+        header = None
+        completed = set()
+        failed = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Dernière ligne tronquée par un arrêt brutal
+                        continue
+                    if header is None:
+                        header = record
+                    elif 'done' in record:
+                        completed.add(record['done'])
+                    elif 'failed' in record:
+                        failed[record['failed']] = record.get('error', '')
+        except OSError as e:
+            print(f"⚠️ Journal d'import illisible {path}: {e}")
+            return None
+
+        if not header or 'job' not in header:
+            print(f"⚠️ Journal d'import invalide ignoré: {path}")
+            return None
+        return cls(path, header, completed, failed)
+
+    def _append(self, records: Iterable[Dict[str, Any]]):
+        """Ajouter des lignes et les rendre durables avant de rendre la main"""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            for record in records:
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def is_done(self, source_path: str) -> bool:
+        """Source enregistrée ou en échec définitif: à ne pas retraiter"""
+        return source_path in self.completed or source_path in self.failed
+
+    @property
+    def processed(self) -> int:
+        """Nombre de sources enregistrées ou en échec définitif"""
+        return len(self.completed) + len(self.failed)
+
+    @property
+    def is_complete(self) -> bool:
+        """Toutes les sources prévues sont enregistrées en base ou en échec"""
+        return self.processed >= self.total
+
+    def record_done(self, entries: Iterable[Tuple[str, int]]):
+        """Marquer des sources comme enregistrées (après le commit en base)"""
+        records = [{'done': source_path, 'id': file_id} for source_path, file_id in entries]
+        if not records:
+            return
+        self._append(records)
+        self.completed.update(record['done'] for record in records)
+
+    def record_failed(self, entries: Iterable[Tuple[str, str]]):
+        """
+        Marquer des sources en échec définitif (source illisible ou refusée)
+
+        Une erreur d'écriture en base n'en fait pas partie: la source reste
+        à reprendre.
+        """
+        records = [{'failed': source_path, 'error': error} for source_path, error in entries]
+        if not records:
+            return
+        self._append(records)
+        self.failed.update((record['failed'], record['error']) for record in records)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def finish(self):
+        """Import terminé: le journal n'est plus nécessaire"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def list_interrupted_jobs(jobs_dir: str) -> List[ImportJournal]:
+    """Journaux restants, c'est-à-dire imports interrompus, du plus ancien au plus récent"""
+    if not os.path.isdir(jobs_dir):
+        return []
+
+    journals = []
+    for name in sorted(os.listdir(jobs_dir)):
+        if name.endswith('.jsonl'):
+            journal = ImportJournal.load(os.path.join(jobs_dir, name))
+            if journal:
+                journals.append(journal)
+    return journals
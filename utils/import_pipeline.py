@@ -0,0 +1,217 @@
+# utils/import_pipeline.py
+"""
+Pipeline d'import massif en parallèle
+
+    parcours des sources -> pool de processus (hachage + chiffrement)
+                         -> écrivain unique (métadonnées + base de données)
+
+Le travail coûteux en CPU (SHA-256, AEAD) est réparti sur tous les cœurs ;
+les écritures SQLite restent sur un seul thread et sont groupées par lots.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, Tuple, List, Dict, Any, Optional, Callable
+
+from .file_handler import store_blob
+
+# (chemin source, nom enregistré, dossier de destination)
+ImportTask = Tuple[str, str, int]
+
+
+def _store_task(source_path: str, objects_dir: str, master_key: bytes, packs_index: str) -> Dict[str, Any]:
+    """Exécuté dans un processus du pool: stocker un fichier sans lever d'exception"""
+    try:
+        return store_blob(source_path, objects_dir, master_key, packs_index=packs_index)
+    except Exception as e:
+        return {'error': str(e)}
+
+
+class ImportPipeline:
+    """Import parallèle d'un ensemble de fichiers dans un panel"""
+
+    def __init__(self, file_handler, db, panel: str,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 max_workers: Optional[int] = None,
+                 batch_size: int = 200,
+                 journal=None):
+        self.file_handler = file_handler
+        self.db = db
+        self.panel = panel
+        self.progress_callback = progress_callback
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.journal = journal
+
+    def _create_executor(self):
+        """Pool de processus, ou de threads si la plateforme l'interdit"""
+        try:
+            # spawn et non fork: l'application a déjà plusieurs threads (écrivain de
+            # la base, tâches de fond) dont un verrou copié pris bloquerait l'enfant
+            return ProcessPoolExecutor(max_workers=self.max_workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, NotImplementedError) as e:
+            print(f"⚠️ Pool de processus indisponible, repli sur des threads: {e}")
+            return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def run(self, tasks: Iterable[ImportTask], total: int) -> int:
+        """
+        Importer les fichiers décrits par `tasks`
+
+        Args:
+            tasks: Itérable de (chemin source, nom enregistré, dossier)
+            total: Nombre total de fichiers (pour la progression)
+
+        Returns:
+            Nombre de fichiers importés
+        """
+        objects_dir = self.file_handler.objects_dir
+        master_key = self.file_handler.encryption_key
+        packs_index = self.file_handler.metadata_file
+        max_in_flight = self.max_workers * 4  # borne la mémoire sur les gros arbres
+
+        task_iter = iter(tasks)
+        pending = {}
+        batch = []
+        processed = 0
+        imported = 0
+
+        with self._create_executor() as executor:
+            while True:
+                # Alimenter le pool sans matérialiser toute la liste des tâches
+                while len(pending) < max_in_flight:
+                    task = next(task_iter, None)
+                    if task is None:
+                        break
+                    future = executor.submit(_store_task, task[0], objects_dir, master_key, packs_index)
+                    pending[future] = task
+
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = pending.pop(future)
+                    result = future.result()
+                    processed += 1
+
+                    if 'error' in result:
+                        print(f"❌ Erreur import fichier {task[0]}: {result['error']}")
+                        # Échec définitif: la source ne bloque pas la fin du journal
+                        if self.journal:
+                            self.journal.record_failed([(task[0], result['error'])])
+                    else:
+                        batch.append((task, result))
+
+                    if self.progress_callback:
+                        self.progress_callback(processed, total)
+
+                if len(batch) >= self.batch_size:
+                    imported += self._write_batch(batch)
+                    batch = []
+
+        imported += self._write_batch(batch)
+        return imported
+
+    def _pack_batch(self, batch: List[Tuple[ImportTask, Dict[str, Any]]]) -> bool:
+        """Écrire les petits blobs du lot dans un pack, avant toute référence en base"""
+        try:
+            self.file_handler.pack_stored(result for _, result in batch)
+            return True
+        except Exception as e:
+            print(f"❌ Erreur d'écriture d'un pack pour un lot de {len(batch)} fichier(s): {e}")
+            return False
+
+    def _record_metadata(self, batch: List[Tuple[ImportTask, Dict[str, Any]]]):
+        """Indexer les nouveaux blobs (un doublon est déjà connu)"""
+        self.file_handler.metadata.set_many(
+            self.file_handler._metadata_entry(result, task[1], self.panel)
+            for task, result in batch
+            if not result['is_duplicate']
+        )
+
+    def _write_batch(self, batch: List[Tuple[ImportTask, Dict[str, Any]]]) -> int:
+        """Écrivain unique: packs, métadonnées puis lignes de la base, en une transaction chacune"""
+        if not batch or not self._pack_batch(batch):
+            return 0
+
+        self._record_metadata(batch)
+
+        rows = [
+            (folder_id, filename, result['filepath'], result['file_hash'], result['file_size'])
+            for (source_path, filename, folder_id), result in batch
+        ]
+        try:
+            new_ids = self.db.add_files_batch(rows)
+        except Exception as e:
+            print(f"❌ Erreur enregistrement d'un lot de {len(rows)} fichier(s): {e}")
+            return 0
+
+        # Point de reprise: ces sources ne seront pas réimportées
+        if self.journal:
+            self.journal.record_done(zip((task[0] for task, _ in batch), new_ids))
+
+        print(f"✅ {len(new_ids)} fichier(s) importé(s)")
+        return len(new_ids)
+
+
+class SyncPipeline(ImportPipeline):
+    """
+    Pipeline de synchronisation d'un dossier source
+
+    Seules les sources nouvelles ou modifiées (taille ou date) lui sont
+    confiées. Une source déjà connue met à jour son fichier existant au lieu
+    d'en créer un second ; si son contenu n'a pas changé, seul le manifeste
+    est rafraîchi.
+    """
+
+    def __init__(self, file_handler, db, panel: str, source_root: str,
+                 changes: Dict[str, Dict[str, Any]], **kwargs):
+        super().__init__(file_handler, db, panel, **kwargs)
+        self.source_root = source_root
+        self.changes = changes  # source -> {'size', 'mtime_ns', 'entry'}
+        self.stats = {'added': 0, 'updated': 0, 'unchanged': 0}
+
+    def _write_batch(self, batch: List[Tuple[ImportTask, Dict[str, Any]]]) -> int:
+        if not batch or not self._pack_batch(batch):
+            return 0
+
+        self._record_metadata(batch)
+
+        new_rows, new_sources, updates, manifest = [], [], [], []
+        for (source_path, filename, folder_id), result in batch:
+            change = self.changes[source_path]
+            entry = change['entry']
+            if entry is None:
+                new_rows.append((folder_id, filename, result['filepath'],
+                                 result['file_hash'], result['file_size']))
+                new_sources.append((source_path, change, result))
+                continue
+
+            if entry['file_hash'] != result['file_hash']:
+                updates.append((entry['file_id'], result['filepath'],
+                                result['file_hash'], result['file_size']))
+                self.stats['updated'] += 1
+            else:
+                # Date modifiée mais contenu identique
+                self.stats['unchanged'] += 1
+            manifest.append((source_path, change['size'], change['mtime_ns'],
+                             result['file_hash'], entry['file_id']))
+
+        try:
+            new_ids = self.db.add_files_batch(new_rows)
+            self.db.update_files_content(updates)
+        except Exception as e:
+            print(f"❌ Erreur synchronisation d'un lot de {len(batch)} fichier(s): {e}")
+            return 0
+
+        for (source_path, change, result), file_id in zip(new_sources, new_ids):
+            manifest.append((source_path, change['size'], change['mtime_ns'],
+                             result['file_hash'], file_id))
+        self.stats['added'] += len(new_ids)
+
+        # Le manifeste n'avance qu'après l'écriture des fichiers: une
+        # synchronisation interrompue reprend naturellement au prochain passage
+        self.db.save_sync_entries(self.source_root, self.panel, manifest)
+        return len(new_ids) + len(updates)
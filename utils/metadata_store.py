@@ -0,0 +1,150 @@
+# utils/metadata_store.py
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Any, Iterator, Iterable, Tuple, Optional
+
+
+class MetadataStore:
+    """
+    Métadonnées des fichiers chiffrés dans une table SQLite indexée
+
+    S'utilise comme un dictionnaire {nom_chiffré: métadonnées}: chaque
+    écriture ne touche qu'une ligne, et une lecture est une recherche par
+    clé primaire, sans charger toute la table au démarrage.
+    """
+
+    COLUMNS = ('original_name', 'panel', 'size', 'sha256', 'created_at', 'file_id')
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_metadata (
+                encrypted_name TEXT PRIMARY KEY,
+                original_name TEXT NOT NULL,
+                panel TEXT,
+                size INTEGER DEFAULT 0,
+                sha256 TEXT DEFAULT '',
+                created_at REAL,
+                file_id TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        Importer un ancien fichier .metadata.json puis le renommer
+
+        Returns:
+            Nombre d'entrées importées
+        """
+        if not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Métadonnées JSON illisibles, migration ignorée: {e}")
+            return 0
+
+        self.set_many(legacy.items())
+        os.replace(json_path, json_path + ".migrated")
+        print(f"✅ {len(legacy)} métadonnée(s) migrée(s) vers l'index SQLite")
+        return len(legacy)
+
+    def _row_values(self, encrypted_name: str, entry: Dict[str, Any]) -> Tuple:
+        return (encrypted_name,) + tuple(entry.get(column) for column in self.COLUMNS)
+
+    def set_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Écrire plusieurs entrées dans une seule transaction"""
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_metadata "
+                "(encrypted_name, original_name, panel, size, sha256, created_at, file_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._row_values(name, entry) for name, entry in items)
+            )
+            self.conn.commit()
+
+    def get(self, encrypted_name: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM file_metadata WHERE encrypted_name = ?",
+                (encrypted_name,)
+            ).fetchone()
+        if row is None:
+            return default
+        entry = dict(row)
+        del entry['encrypted_name']
+        return entry
+
+    def __getitem__(self, encrypted_name: str) -> Dict[str, Any]:
+        entry = self.get(encrypted_name)
+        if entry is None:
+            raise KeyError(encrypted_name)
+        return entry
+
+    def __setitem__(self, encrypted_name: str, entry: Dict[str, Any]):
+        self.set_many([(encrypted_name, entry)])
+
+    def __delitem__(self, encrypted_name: str):
+        with self._lock:
+            cursor = self.conn.execute(
+                "DELETE FROM file_metadata WHERE encrypted_name = ?",
+                (encrypted_name,)
+            )
+            self.conn.commit()
+        if cursor.rowcount == 0:
+            raise KeyError(encrypted_name)
+
+    def delete_many(self, encrypted_names: Iterable[str]) -> int:
+        """Supprimer plusieurs entrées dans une seule transaction; retourne le nombre supprimé"""
+        with self._lock:
+            cursor = self.conn.executemany(
+                "DELETE FROM file_metadata WHERE encrypted_name = ?",
+                ((name,) for name in encrypted_names)
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def __contains__(self, encrypted_name: str) -> bool:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM file_metadata WHERE encrypted_name = ?",
+                (encrypted_name,)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM file_metadata").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def keys(self) -> Iterator[str]:
+        """Parcourir les noms chiffrés par pages, sans tout charger"""
+        last_name = ""
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT encrypted_name FROM file_metadata WHERE encrypted_name > ? "
+                    "ORDER BY encrypted_name LIMIT 500",
+                    (last_name,)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[0]
+            last_name = rows[-1][0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
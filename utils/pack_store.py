@@ -0,0 +1,380 @@
+# utils/pack_store.py
+"""
+Fichiers pack des petits blobs
+
+Un modèle Word ou un PDF d'une page pèse quelques dizaines de Ko: stocké
+seul, il coûte un inode, une entrée de répertoire et une ouverture de
+fichier par document, et ralentit les sauvegardes. Les blobs de moins de
+PACK_THRESHOLD octets sont donc ajoutés bout à bout dans des fichiers pack:
+
+    objects/packs/pack-000001.pack = PACK_MAGIC (8) | blob | blob | ...
+
+Chaque blob y garde exactement le format .enc (en-tête, segments
+authentifiés), il se déchiffre donc comme un fichier isolé. Un pack n'est
+jamais réécrit: les ajouts se font en fin de fichier, synchronisés sur le
+disque avant d'être indexés. L'index (chemin virtuel du blob -> pack,
+position, longueur) est une table de la base des métadonnées; le chemin
+virtuel est celui qu'aurait le blob isolé, si bien que la base principale
+ne fait pas la différence.
+
+Supprimer un blob ne fait que retirer son entrée de l'index; `compact`
+recopie les blobs encore vivants des packs majoritairement vides dans le
+pack courant, puis supprime les anciens.
+"""
+
+import io
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Taille sous laquelle un blob est stocké dans un pack plutôt qu'isolé
+PACK_THRESHOLD = 50 * 1024
+
+# Taille au-delà de laquelle un nouveau pack est commencé
+MAX_PACK_SIZE = 64 * 1024 * 1024
+
+PACK_MAGIC = b"PCPACK\x00\x01"
+
+# Emplacement d'un blob: (chemin du pack, position, longueur)
+PackLocation = Tuple[str, int, int]
+
+
+def is_packed(index_path: str, filepath: str) -> bool:
+    """
+    Le blob est-il dans un pack ? Lecture seule de l'index, sans PackStore,
+    pour un processus du pipeline d'import
+    """
+    uri = f"file:{urllib.parse.quote(os.path.abspath(index_path))}?mode=ro"
+    try:
+        conn = sqlite3.connect(uri, uri=True)
+    except sqlite3.Error:
+        return False  # index pas encore créé: aucun pack
+    try:
+        return conn.execute("SELECT 1 FROM packed_blobs WHERE filepath = ?", (filepath,)).fetchone() is not None
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+
+
+class PackEntry(io.RawIOBase):
+    """Flux positionnable limité à un blob d'un fichier pack"""
+
+    def __init__(self, location: PackLocation):
+        super().__init__()
+        pack_path, self._offset, self._length = location
+        self._file = open(pack_path, 'rb')
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._length + offset
+        else:
+            raise ValueError(f"Valeur whence invalide: {whence}")
+        if position < 0:
+            raise ValueError("Position négative")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        count = min(len(view), self._length - self._position)
+        if count <= 0:
+            return 0
+        self._file.seek(self._offset + self._position)
+        count = self._file.readinto(view[:count])
+        self._position += count
+        return count
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+class PackStore:
+    """Index et fichiers pack des petits blobs"""
+
+    def __init__(self, packs_dir: str, index_path: str, max_pack_size: int = MAX_PACK_SIZE):
+        self.packs_dir = packs_dir
+        self.max_pack_size = max_pack_size
+        # Un seul ajout ou compactage à la fois; les lectures ne le prennent pas
+        self._append_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(index_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS packs (
+                pack_id INTEGER PRIMARY KEY,
+                filename TEXT NOT NULL DEFAULT '',
+                size INTEGER NOT NULL DEFAULT 0,
+                live_bytes INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS packed_blobs (
+                filepath TEXT PRIMARY KEY,
+                pack_id INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                stored_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_packed_blobs_pack ON packed_blobs(pack_id)")
+        self.conn.commit()
+        self._remove_retired_packs()
+
+    def _pack_path(self, filename: str) -> str:
+        return os.path.join(self.packs_dir, filename)
+
+    def _remove_retired_packs(self):
+        """Supprimer les packs compactés qu'un lecteur empêchait d'effacer"""
+        if not os.path.isdir(self.packs_dir):
+            return
+        with self._lock:
+            known = {row[0] for row in self.conn.execute("SELECT filename FROM packs")}
+        for name in os.listdir(self.packs_dir):
+            if name.endswith('.pack') and name not in known:
+                try:
+                    os.remove(self._pack_path(name))
+                except OSError:
+                    pass
+
+    # ==================== LECTURE ====================
+
+    def locate(self, filepath: str) -> Optional[PackLocation]:
+        """Emplacement d'un blob empaqueté, ou None s'il est stocké isolé"""
+        with self._lock:
+            row = self.conn.execute("""
+                SELECT p.filename, b.offset, b.length
+                FROM packed_blobs b
+                INNER JOIN packs p ON p.pack_id = b.pack_id
+                WHERE b.filepath = ?
+            """, (filepath,)).fetchone()
+        if row is None:
+            return None
+        return self._pack_path(row['filename']), row['offset'], row['length']
+
+    def __contains__(self, filepath: str) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM packed_blobs WHERE filepath = ?", (filepath,)).fetchone()
+        return row is not None
+
+    def open_entry(self, filepath: str) -> Optional[PackEntry]:
+        """Ouvrir un blob empaqueté en lecture, ou None s'il est stocké isolé"""
+        for _ in range(2):
+            location = self.locate(filepath)
+            if location is None:
+                return None
+            try:
+                return PackEntry(location)
+            except FileNotFoundError:
+                continue  # pack compacté entre la recherche et l'ouverture
+        raise FileNotFoundError(f"Pack introuvable pour {filepath}")
+
+    def iter_entries(self) -> Iterator[Tuple[str, float]]:
+        """Parcourir les blobs empaquetés par pages: (chemin virtuel, date d'ajout)"""
+        last_filepath = ""
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT filepath, stored_at FROM packed_blobs WHERE filepath > ? "
+                    "ORDER BY filepath LIMIT 500",
+                    (last_filepath,)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row['filepath'], row['stored_at'] or 0
+            last_filepath = rows[-1]['filepath']
+
+    # ==================== ÉCRITURE ====================
+
+    def _current_pack(self) -> Tuple[int, str, int]:
+        """Pack ouvert aux ajouts (pack_id, chemin, taille validée), créé si besoin"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT pack_id, filename, size FROM packs ORDER BY pack_id DESC LIMIT 1"
+            ).fetchone()
+        if row is not None and row['size'] < self.max_pack_size:
+            return row['pack_id'], self._pack_path(row['filename']), row['size']
+
+        os.makedirs(self.packs_dir, exist_ok=True)
+        with self._lock:
+            cursor = self.conn.execute("INSERT INTO packs (size) VALUES (?)", (len(PACK_MAGIC),))
+            pack_id = cursor.lastrowid
+            filename = f"pack-{pack_id:06d}.pack"
+            self.conn.execute("UPDATE packs SET filename = ? WHERE pack_id = ?", (filename, pack_id))
+            with open(self._pack_path(filename), 'wb') as f:
+                f.write(PACK_MAGIC)
+                f.flush()
+                os.fsync(f.fileno())
+            self.conn.commit()
+        return pack_id, self._pack_path(filename), len(PACK_MAGIC)
+
+    def _write_entries(self, entries: List[Tuple[str, bytes]]) -> List[Tuple[str, int, int, int]]:
+        """
+        Ajouter des blobs en fin du pack courant et les synchroniser sur le disque
+
+        Returns:
+            Liste de (chemin virtuel, pack_id, position, longueur), à indexer
+        """
+        pack_id, pack_path, size = self._current_pack()
+        placed = []
+        with open(pack_path, 'ab') as f:
+            # Des octets non indexés (ajout interrompu) restent en fin de
+            # pack: ils sont comptés comme espace mort
+            offset = f.seek(0, io.SEEK_END)
+            for filepath, data in entries:
+                f.write(data)
+                placed.append((filepath, pack_id, offset, len(data)))
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return placed
+
+    def _index_entries(self, placed: List[Tuple[str, int, int, int]]):
+        """Enregistrer des blobs nouvellement ajoutés, avec la taille de leur pack"""
+        now = time.time()
+        with self._lock:
+            for filepath, pack_id, offset, length in placed:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO packed_blobs (filepath, pack_id, offset, length, stored_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (filepath, pack_id, offset, length, now)
+                )
+                self._grow_pack(pack_id, offset + length, length)
+            self.conn.commit()
+
+    def _move_entries(self, placed: List[Tuple[str, int, int, int]], old_pack_id: int):
+        """Repointer les blobs recopiés par le compactage (sauf ceux supprimés entre-temps)"""
+        with self._lock:
+            for filepath, pack_id, offset, length in placed:
+                cursor = self.conn.execute(
+                    "UPDATE packed_blobs SET pack_id = ?, offset = ? WHERE filepath = ? AND pack_id = ?",
+                    (pack_id, offset, filepath, old_pack_id)
+                )
+                self._grow_pack(pack_id, offset + length, length if cursor.rowcount else 0)
+            self.conn.commit()
+
+    def _grow_pack(self, pack_id: int, end: int, live_bytes: int):
+        self.conn.execute(
+            "UPDATE packs SET size = MAX(size, ?), live_bytes = live_bytes + ? WHERE pack_id = ?",
+            (end, live_bytes, pack_id)
+        )
+
+    def append_many(self, entries: Iterable[Tuple[str, bytes]]) -> List[str]:
+        """
+        Empaqueter des blobs chiffrés en un seul ajout (une synchronisation disque)
+
+        Args:
+            entries: Itérable de (chemin virtuel, contenu chiffré)
+
+        Returns:
+            Chemins effectivement ajoutés (un blob déjà empaqueté est ignoré)
+        """
+        with self._append_lock:
+            new_entries = []
+            seen = set()
+            for filepath, data in entries:
+                if filepath in seen or filepath in self:
+                    continue
+                seen.add(filepath)
+                new_entries.append((filepath, data))
+            if not new_entries:
+                return []
+
+            self._index_entries(self._write_entries(new_entries))
+            return [filepath for filepath, _ in new_entries]
+
+    def delete_many(self, filepaths: Iterable[str]) -> int:
+        """Retirer des blobs de l'index (leur place est récupérée au compactage)"""
+        deleted = 0
+        with self._lock:
+            for filepath in filepaths:
+                row = self.conn.execute(
+                    "SELECT pack_id, length FROM packed_blobs WHERE filepath = ?", (filepath,)
+                ).fetchone()
+                if row is None:
+                    continue
+                self.conn.execute("DELETE FROM packed_blobs WHERE filepath = ?", (filepath,))
+                self.conn.execute(
+                    "UPDATE packs SET live_bytes = live_bytes - ? WHERE pack_id = ?",
+                    (row['length'], row['pack_id'])
+                )
+                deleted += 1
+            self.conn.commit()
+        return deleted
+
+    # ==================== COMPACTAGE ====================
+
+    def compact(self, min_dead_ratio: float = 0.5) -> int:
+        """
+        Réécrire les packs dont au moins `min_dead_ratio` de l'espace est mort
+
+        Les blobs vivants sont recopiés dans le pack courant et l'index est
+        repointé avant la suppression de l'ancien pack: une lecture en cours
+        retrouve le blob à sa nouvelle place.
+
+        Returns:
+            Nombre d'octets récupérés
+        """
+        reclaimed = 0
+        with self._append_lock:
+            current_id = self._current_pack()[0]
+            with self._lock:
+                candidates = self.conn.execute("""
+                    SELECT pack_id, filename, size, live_bytes FROM packs
+                    WHERE pack_id <> ? AND size - ? - live_bytes >= (size - ?) * ?
+                """, (current_id, len(PACK_MAGIC), len(PACK_MAGIC), min_dead_ratio)).fetchall()
+
+            for pack in candidates:
+                pack_path = self._pack_path(pack['filename'])
+                with self._lock:
+                    rows = self.conn.execute(
+                        "SELECT filepath, offset, length FROM packed_blobs WHERE pack_id = ? ORDER BY offset",
+                        (pack['pack_id'],)
+                    ).fetchall()
+
+                if rows:
+                    entries = []
+                    with open(pack_path, 'rb') as f:
+                        for row in rows:
+                            f.seek(row['offset'])
+                            entries.append((row['filepath'], f.read(row['length'])))
+                    self._move_entries(self._write_entries(entries), pack['pack_id'])
+
+                with self._lock:
+                    self.conn.execute("DELETE FROM packs WHERE pack_id = ?", (pack['pack_id'],))
+                    self.conn.commit()
+                reclaimed += pack['size'] - pack['live_bytes']
+                try:
+                    os.remove(pack_path)
+                except OSError:
+                    pass  # encore ouvert en lecture: supprimé au prochain démarrage
+
+        if reclaimed:
+            print(f"📦 Packs compactés: {len(candidates)} pack(s), {reclaimed} octet(s) récupéré(s)")
+        return reclaimed
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
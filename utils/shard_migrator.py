@@ -0,0 +1,197 @@
+# utils/shard_migrator.py
+"""
+Migration en ligne des blobs vers l'arborescence répartie
+
+Les blobs étaient rangés à plat (`.encrypted/<panel>/`, puis `objects/`):
+un seul répertoire pour des dizaines de milliers de fichiers, lent à lister
+et à parcourir sur NTFS comme sur les partages réseau. Ils sont désormais
+écrits sous `objects/ab/cd/<id>.enc` (voir `shard_path`).
+
+Ce thread déplace les blobs existants par lots, pendant que l'application
+reste utilisable: chaque blob reçoit d'abord un lien physique (ou une copie)
+à sa nouvelle place, puis le thread écrivain repointe files.filepath; l'ancien
+chemin n'est supprimé qu'après le commit. Un arrêt à tout moment laisse donc
+chaque fichier lisible, et la passe suivante reprend où elle s'était arrêtée.
+Les petits blobs sont empaquetés au passage (voir pack_store.py).
+
+Un blob dont l'empreinte en clair est connue est rangé à son adresse de
+contenu (`compute_blob_id`), comme un blob importé aujourd'hui: un nouvel
+import du même document est alors reconnu comme doublon, et deux anciens
+blobs identiques n'en font plus qu'un. Les métadonnées suivent le nouveau
+nom. Sans empreinte connue, le blob est seulement réparti sous son nom.
+"""
+
+import os
+import shutil
+import threading
+from typing import Callable, Optional
+
+from .file_handler import shard_path
+from .pack_store import PACK_THRESHOLD
+
+
+def _glob_literal(path: str) -> str:
+    """Chemin dont les métacaractères GLOB sont pris littéralement"""
+    return "".join(f"[{c}]" if c in "[*?" else c for c in path)
+
+
+def sharded_pattern(objects_dir: str) -> str:
+    """Motif GLOB (SQLite) des chemins déjà rangés dans l'arborescence répartie"""
+    return os.path.join(_glob_literal(objects_dir), "[0-9a-f][0-9a-f]", "[0-9a-f][0-9a-f]", "*.enc")
+
+
+def content_pattern(objects_dir: str) -> str:
+    """Motif GLOB (SQLite) des chemins rangés à leur adresse de contenu"""
+    return os.path.join(_glob_literal(objects_dir), "[0-9a-f][0-9a-f]", "[0-9a-f][0-9a-f]",
+                        "[0-9a-f]" * 64 + ".enc")
+
+
+class ShardMigrator:
+    """Thread de déplacement des blobs rangés à plat"""
+
+    def __init__(self, file_handler, db,
+                 batch_size: int = 200,
+                 pause: float = 0.05,
+                 on_complete: Optional[Callable[[int], None]] = None):
+        self.file_handler = file_handler
+        self.db = db
+        self.batch_size = batch_size
+        self.pause = pause
+        self.on_complete = on_complete
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="shard-migrator", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        """Attendre la fin du thread après stop()"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            moved = self.migrate()
+            if moved and self.on_complete and not self._stop.is_set():
+                self.on_complete(moved)
+        except Exception as e:
+            print(f"❌ Erreur de la réorganisation du stockage: {e}")
+        finally:
+            self.db.release_connection()
+
+    def migrate(self) -> int:
+        """Déplacer tous les blobs hors de leur place; retourne le nombre déplacé"""
+        objects_dir = self.file_handler.objects_dir
+        patterns = (sharded_pattern(objects_dir), content_pattern(objects_dir))
+        total = self.db.count_unsharded_blobs(*patterns)
+        if total == 0:
+            self._remove_empty_legacy_dirs()
+            return 0
+
+        print(f"📦 Réorganisation du stockage: {total} blob(s) à répartir")
+        moved = 0
+        failed = 0
+        after = ""
+        while not self._stop.is_set():
+            blobs = self.db.get_unsharded_blobs(*patterns, after, self.batch_size)
+            if not blobs:
+                break
+            after = blobs[-1]['filepath']
+
+            moves = []
+            packed = []
+            targets = set()
+            renamed = {}
+            for blob in blobs:
+                filepath = blob['filepath']
+                if blob['file_hash']:
+                    new_filepath = shard_path(objects_dir, f"{self.file_handler.blob_id(blob['file_hash'])}.enc")
+                    renamed[filepath] = blob['file_hash']
+                else:
+                    new_filepath = shard_path(objects_dir, os.path.basename(filepath))
+                try:
+                    if new_filepath in targets or self.file_handler.file_exists(new_filepath):
+                        # Même contenu déjà stocké: les fichiers partagent ce blob
+                        pass
+                    elif os.path.getsize(filepath) < PACK_THRESHOLD:
+                        with open(filepath, 'rb') as f:
+                            packed.append((new_filepath, f.read()))
+                    else:
+                        self._link(filepath, new_filepath)
+                    moves.append((filepath, new_filepath))
+                    targets.add(new_filepath)
+                except OSError as e:
+                    # Blob absent ou illisible: signalé par la vérification du stockage
+                    failed += 1
+                    print(f"⚠️ Blob non déplacé {filepath}: {e}")
+
+            # Un seul ajout au pack pour tous les petits blobs du lot
+            self.file_handler.packs.append_many(packed)
+            # Métadonnées lisibles sous le nouveau nom avant le commit, et
+            # retirées de l'ancien une fois les fichiers repointés
+            self._copy_metadata(moves, renamed)
+            moved += self.db.relocate_blobs(moves)
+            self.file_handler.metadata.delete_many(
+                os.path.basename(filepath) for filepath, _ in moves if filepath in renamed
+            )
+            self._stop.wait(self.pause)
+
+        if not self._stop.is_set() and failed == 0:
+            self._remove_empty_legacy_dirs()
+        print(f"✅ Réorganisation du stockage: {moved} blob(s) déplacé(s)"
+              + (f", {failed} échec(s)" if failed else ""))
+        return moved
+
+    def _copy_metadata(self, moves, renamed):
+        """Écrire les métadonnées des blobs renommés sous leur nouveau nom"""
+        metadata = self.file_handler.metadata
+        entries = []
+        for filepath, new_filepath in moves:
+            new_name = os.path.basename(new_filepath)
+            if filepath not in renamed or new_name in metadata:
+                continue
+            entry = metadata.get(os.path.basename(filepath))
+            if entry is not None:
+                entry.update(sha256=renamed[filepath], file_id=new_name[:-4])
+                entries.append((new_name, entry))
+        metadata.set_many(entries)
+
+    @staticmethod
+    def _link(filepath: str, new_filepath: str):
+        """Rendre le blob disponible à sa nouvelle place sans toucher à l'ancienne"""
+        os.makedirs(os.path.dirname(new_filepath), exist_ok=True)
+        try:
+            os.link(filepath, new_filepath)
+        except FileExistsError:
+            # Même nom, même contenu: identifiant dérivé du contenu, ou uuid
+            # des anciens noms (un import concurrent l'a déjà écrit ici)
+            return
+        except OSError:
+            if not os.path.exists(filepath):
+                raise
+            # Système de fichiers sans liens physiques
+            temp_path = new_filepath + ".part"
+            try:
+                shutil.copyfile(filepath, temp_path)
+                os.replace(temp_path, new_filepath)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        # Le lien partage la date de l'ancien fichier: le rajeunir pour que
+        # le ramasse-miettes des orphelins respecte son délai de grâce
+        os.utime(new_filepath)
+
+    def _remove_empty_legacy_dirs(self):
+        """Supprimer les anciens dossiers de panels devenus vides"""
+        for panel in self.file_handler.PANEL_FOLDERS:
+            try:
+                os.rmdir(os.path.join(self.file_handler.crypto_dir, panel))
+            except OSError:
+                pass  # absent ou encore utilisé
@@ -0,0 +1,381 @@
+# utils/storage_scrubber.py
+"""
+Vérification de l'intégrité du stockage et ramasse-miettes des orphelins
+
+Trois sources doivent rester cohérentes: la table blobs de la base (un
+contenu chiffré par ligne, compté par référence), les fichiers .enc sous
+`FileHandler.crypto_dir` ou dans les packs, et l'index des métadonnées. Une
+passe les parcourt en flux (pages de la table, os.walk, pages des index) et
+signale les blobs absents du disque, les compteurs de références faux, les
+blobs inconnus de la base, les métadonnées sans blob et inversement.
+
+L'authenticité des blobs (étiquettes AEAD, puis SHA-256 du contenu en clair
+comparé à file_hash) est vérifiée dans un pool de processus, à débit de
+lecture borné et de façon incrémentale: chaque passe reprend les blobs le
+moins récemment vérifiés (blobs.verified_at). Sans réparation demandée, une
+passe ne modifie rien d'autre que ces dates de vérification.
+
+La comparaison suppose que blobs.file_hash est l'empreinte du contenu en
+clair: c'est le cas depuis la migration des empreintes (_backfill_files),
+qui remesure les anciens fichiers hachés chiffrés et vide l'empreinte des
+blobs illisibles. Un blob sans empreinte est seulement authentifié; avec
+réparation, l'empreinte mesurée est enregistrée.
+"""
+
+import os
+import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from .encrypted_storage import iter_decrypted
+from .pack_store import PackEntry, PackLocation
+
+# Incohérences signalées, dans l'ordre du rapport
+CATEGORY_LABELS = {
+    'dangling': "Blobs absents du disque",
+    'bad_refcount': "Compteurs de références faux",
+    'unreferenced': "Blobs qui ne sont plus référencés",
+    'orphan_blobs': "Blobs stockés inconnus de la base",
+    'orphan_metadata': "Métadonnées sans blob",
+    'missing_metadata': "Blobs sans métadonnées",
+    'corrupt': "Blobs corrompus",
+}
+
+# Chemins conservés par catégorie pour le rapport (les comptes restent exacts)
+MAX_REPORTED = 20
+
+PAGE_SIZE = 500
+
+
+def verify_blob(filepath: str, master_key: bytes, expected_hash: str,
+                location: Optional[PackLocation] = None) -> Dict[str, Any]:
+    """
+    Exécuté dans un processus du pool: authentifier un blob sans lever d'exception
+
+    `location` désigne l'emplacement d'un blob empaqueté (None: fichier isolé).
+    L'empreinte en clair n'est comparée que si `expected_hash` est connue; le
+    résultat porte l'empreinte et la taille mesurées.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with (PackEntry(location) if location else open(filepath, 'rb')) as source:
+            for chunk in iter_decrypted(source, master_key):
+                digest.update(chunk)
+                size += len(chunk)
+    except FileNotFoundError:
+        return {'filepath': filepath, 'missing': True, 'error': "Fichier absent"}
+    except Exception as e:
+        return {'filepath': filepath, 'missing': False, 'error': f"Déchiffrement impossible: {e or type(e).__name__}"}
+
+    if expected_hash and digest.hexdigest() != expected_hash:
+        return {'filepath': filepath, 'missing': False, 'error': "Empreinte SHA-256 différente de la base"}
+    return {'filepath': filepath, 'missing': False, 'error': '',
+            'file_hash': digest.hexdigest(), 'file_size': size}
+
+
+class StorageScrubber:
+    """Contrôle de cohérence base / métadonnées / blobs, ponctuel ou périodique"""
+
+    def __init__(self, file_handler, db,
+                 max_workers: Optional[int] = None,
+                 verify_limit: Optional[int] = 500,
+                 max_bytes_per_second: Optional[float] = 8 * 1024 * 1024,
+                 orphan_grace: float = 3600.0,
+                 initial_delay: float = 600.0,
+                 interval: float = 6 * 3600.0,
+                 on_complete: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.file_handler = file_handler
+        self.db = db
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.verify_limit = verify_limit
+        self.max_bytes_per_second = max_bytes_per_second
+        # Un blob tout juste écrit par un import n'est pas encore en base
+        self.orphan_grace = orphan_grace
+        self.initial_delay = initial_delay
+        self.interval = interval
+        self.on_complete = on_complete
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Lancer les passes périodiques (signalement seul) en arrière-plan"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="storage-scrubber", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        """Attendre la fin du thread après stop()"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            self._stop.wait(self.initial_delay)
+            while not self._stop.is_set():
+                report = self.run(verify_limit=self.verify_limit)
+                if self.on_complete and not self._stop.is_set():
+                    self.on_complete(report)
+                self._stop.wait(self.interval)
+        except Exception as e:
+            print(f"❌ Erreur de la vérification du stockage: {e}")
+        finally:
+            self.db.release_connection()
+
+    @staticmethod
+    def problem_count(report: Dict[str, Any]) -> int:
+        return sum(report[category]['count'] for category in CATEGORY_LABELS)
+
+    def run(self, repair: bool = False, verify_limit: Optional[int] = 500) -> Dict[str, Any]:
+        """
+        Effectuer une passe de vérification
+
+        Args:
+            repair: Corriger ce qui peut l'être (compteurs, orphelins,
+                    métadonnées, empreintes inconnues); les fichiers
+                    dont le blob a disparu sont mis à la corbeille
+            verify_limit: Nombre de blobs à authentifier (None: tous)
+
+        Returns:
+            Rapport {catégorie: {'count', 'examples'}, 'verified', 'repaired'}
+        """
+        started = time.time()
+        report = {category: {'count': 0, 'examples': []} for category in CATEGORY_LABELS}
+        report['verified'] = 0
+        report['repaired'] = 0
+
+        print(f"🩺 Vérification du stockage ({'avec réparation' if repair else 'sans modification'})...")
+        known = self._check_references(report, repair)
+        on_disk = set()
+        if not self._stop.is_set():
+            on_disk = self._check_disk(report, known, repair)
+        if not self._stop.is_set():
+            self._check_metadata(report, known, on_disk, repair)
+        if not self._stop.is_set():
+            self._verify_blobs(report, verify_limit, repair)
+
+        self._print_report(report, time.time() - started)
+        return report
+
+    def _flag(self, report: Dict[str, Any], category: str, filepath: str):
+        entry = report[category]
+        entry['count'] += 1
+        if len(entry['examples']) < MAX_REPORTED:
+            entry['examples'].append(filepath)
+
+    def _check_references(self, report: Dict[str, Any], repair: bool) -> Dict[str, str]:
+        """
+        Parcourir la table blobs par pages
+
+        Returns:
+            {nom du fichier chiffré: chemin} des blobs connus de la base
+        """
+        known = {}
+        if repair:
+            # Compteurs corrigés d'abord: un blob sans fichier peut alors être libéré
+            fixed = self.db.repair_blob_refs()
+            report['bad_refcount']['count'] = fixed
+            report['repaired'] += fixed
+        else:
+            report['bad_refcount']['count'] = self.db.count_unregistered_blobs()
+
+        after = ""
+        while not self._stop.is_set():
+            rows = self.db.get_blobs_page(after, PAGE_SIZE)
+            if not rows:
+                break
+            after = rows[-1]['filepath']
+
+            dangling = []
+            unreferenced = []
+            for row in rows:
+                filepath = row['filepath']
+                known[os.path.basename(filepath)] = filepath
+                if row['ref_count'] != row['file_count']:
+                    report['bad_refcount']['count'] += 1
+                if row['file_count'] == 0:
+                    self._flag(report, 'unreferenced', filepath)
+                    unreferenced.append(filepath)
+                elif not self.file_handler.file_exists(filepath):
+                    self._flag(report, 'dangling', filepath)
+                    dangling.append(filepath)
+
+            if repair:
+                report['repaired'] += self.db.trash_files_by_filepath(dangling)
+                if unreferenced:
+                    released = self.db.release_unreferenced_blobs(unreferenced)
+                    # Un import a pu reprendre ces blobs depuis leur libération
+                    self.db.remove_unreferenced_blobs(released, self.file_handler.delete_files)
+                    report['repaired'] += len(released)
+        return known
+
+    def _check_disk(self, report: Dict[str, Any], known: Dict[str, str], repair: bool) -> set:
+        """
+        Parcourir les fichiers .enc du stockage et les blobs empaquetés
+
+        Returns:
+            Noms des blobs présents sur le disque
+        """
+        on_disk = set()
+        cutoff = time.time() - self.orphan_grace
+        orphans = []
+        stale = []
+        for filepath, stored_at in self._iter_stored():
+            name = os.path.basename(filepath)
+            on_disk.add(name)
+            known_path = known.get(name)
+            if known_path == filepath or stored_at is None or stored_at > cutoff:
+                continue
+
+            self._flag(report, 'orphan_blobs', filepath)
+            # Un ancien emplacement laissé par la répartition des blobs est
+            # périmé: le blob et ses métadonnées restent valides ailleurs
+            (stale if known_path else orphans).append(filepath)
+            if repair and len(orphans) + len(stale) >= PAGE_SIZE:
+                report['repaired'] += self._remove_orphans(orphans, stale)
+                orphans, stale = [], []
+
+        if repair:
+            report['repaired'] += self._remove_orphans(orphans, stale)
+        return on_disk
+
+    def _iter_stored(self):
+        """(chemin, date d'écriture) des fichiers .enc puis des blobs empaquetés"""
+        for filepath in self.file_handler.iter_encrypted_files():
+            try:
+                yield filepath, os.path.getmtime(filepath)
+            except OSError:
+                yield filepath, None
+        yield from self.file_handler.packs.iter_entries()
+
+    def _remove_orphans(self, orphans: List[str], stale: List[str]) -> int:
+        removed = self.file_handler.delete_files(orphans) if orphans else 0
+        if stale:
+            removed += self.file_handler.discard_blobs(stale)
+        return removed
+
+    def _check_metadata(self, report: Dict[str, Any], known: Dict[str, str], on_disk: set, repair: bool):
+        """Rapprocher l'index des métadonnées des fichiers présents sur le disque"""
+        metadata = self.file_handler.metadata
+
+        orphans = []
+        for name in metadata.keys():
+            if name not in on_disk:
+                self._flag(report, 'orphan_metadata', name)
+                orphans.append(name)
+        if repair and orphans:
+            report['repaired'] += metadata.delete_many(orphans)
+
+        entries = []
+        for name in on_disk:
+            if name not in known or name in metadata:
+                continue
+            self._flag(report, 'missing_metadata', known[name])
+            owner = self.db.get_blob_owner(known[name]) if repair else None
+            if owner:
+                entries.append((name, {
+                    'original_name': owner['filename'],
+                    'panel': owner['panel'],
+                    'size': owner['file_size'],
+                    'sha256': owner['file_hash'],
+                    # Un blob empaqueté n'a pas de date propre sur le disque
+                    'created_at': os.path.getctime(known[name]) if os.path.exists(known[name]) else time.time(),
+                    'file_id': name[:-4]
+                }))
+        if entries:
+            metadata.set_many(entries)
+            report['repaired'] += len(entries)
+
+    def _create_executor(self):
+        """Pool de processus, ou de threads si la plateforme l'interdit"""
+        try:
+            # spawn et non fork: l'application a déjà plusieurs threads (écrivain de
+            # la base, tâches de fond) dont un verrou copié pris bloquerait l'enfant
+            return ProcessPoolExecutor(max_workers=self.max_workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, NotImplementedError) as e:
+            print(f"⚠️ Pool de processus indisponible, repli sur des threads: {e}")
+            return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def _throttle(self, started: float, bytes_submitted: int):
+        """Attendre que le débit de lecture repasse sous la limite"""
+        if not self.max_bytes_per_second:
+            return
+        delay = bytes_submitted / self.max_bytes_per_second - (time.monotonic() - started)
+        if delay > 0:
+            self._stop.wait(delay)
+
+    def _verify_blobs(self, report: Dict[str, Any], verify_limit: Optional[int], repair: bool = False):
+        """Authentifier les blobs le moins récemment vérifiés"""
+        rows = self.db.get_blobs_to_verify(verify_limit)
+        if not rows:
+            return
+
+        master_key = self.file_handler.encryption_key
+        max_in_flight = self.max_workers * 2
+        started = time.monotonic()
+        bytes_submitted = 0
+        pending = {}
+        results: List[tuple] = []
+        measured: List[tuple] = []
+        row_iter = iter(rows)
+
+        with self._create_executor() as executor:
+            while True:
+                while len(pending) < max_in_flight and not self._stop.is_set():
+                    row = next(row_iter, None)
+                    if row is None:
+                        break
+                    self._throttle(started, bytes_submitted)
+                    location = self.file_handler.packs.locate(row['filepath'])
+                    try:
+                        bytes_submitted += location[2] if location else os.path.getsize(row['filepath'])
+                    except OSError:
+                        pass
+                    future = executor.submit(verify_blob, row['filepath'], master_key, row['file_hash'], location)
+                    pending[future] = row
+
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pending_row = pending.pop(future)
+                    result = future.result()
+                    report['verified'] += 1
+                    if result['error'] and not result['missing']:
+                        self._flag(report, 'corrupt', result['filepath'])
+                        print(f"⚠️ Blob corrompu {os.path.basename(result['filepath'])}: {result['error']}")
+                    results.append((result['filepath'], time.time(), result['error']))
+                    if repair and not result['error'] and not pending_row['file_hash']:
+                        measured.append((result['filepath'], result['file_hash'], result['file_size']))
+
+                if len(results) >= PAGE_SIZE:
+                    self.db.record_blob_verifications(results)
+                    results = []
+
+        self.db.record_blob_verifications(results)
+        if measured:
+            report['repaired'] += self.db.record_blob_hashes(measured)
+
+    def _print_report(self, report: Dict[str, Any], elapsed: float):
+        problems = self.problem_count(report)
+        if problems == 0:
+            print(f"✅ Stockage cohérent ({report['verified']} blob(s) authentifié(s) en {elapsed:.1f}s)")
+            return
+
+        print(f"⚠️ Stockage: {problems} incohérence(s) ({report['verified']} blob(s) authentifié(s) "
+              f"en {elapsed:.1f}s, {report['repaired']} réparation(s))")
+        for category, label in CATEGORY_LABELS.items():
+            entry = report[category]
+            if entry['count']:
+                print(f"   • {label}: {entry['count']}")
+                for example in entry['examples']:
+                    print(f"       {example}")
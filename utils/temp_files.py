@@ -0,0 +1,168 @@
+# utils/temp_files.py
+"""
+Cycle de vie des copies déchiffrées temporaires
+
+Un seul thread planificateur supprime les copies expirées, dans l'ordre d'une
+file de priorité (heapq) des échéances. Sous Linux les copies sont écrites en
+mémoire (tmpfs /dev/shm) plutôt que sur le disque, et une copie encore
+présente est réutilisée quand le même document est rouvert.
+"""
+
+import os
+import time
+import heapq
+import shutil
+import hashlib
+import platform
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+
+def _default_temp_root(fallback_dir: str) -> str:
+    """Répertoire des copies: tmpfs sous Linux si disponible, sinon le dossier fourni"""
+    if platform.system() == "Linux" and os.access("/dev/shm", os.W_OK):
+        return os.path.join("/dev/shm", f"panel-choice-{os.getuid()}")
+    return fallback_dir
+
+
+class TempFileManager:
+    """Copies déchiffrées temporaires avec expiration centralisée"""
+
+    def __init__(self, fallback_dir: str, ttl: float = 30.0, temp_root: Optional[str] = None):
+        self.ttl = ttl
+        self.temp_root = temp_root or _default_temp_root(fallback_dir)
+
+        # clé -> (chemin de la copie, date du chiffré source, échéance)
+        self._entries: Dict[str, Tuple[str, float, float]] = {}
+        self._heap = []  # (échéance, clé)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+        os.makedirs(self.temp_root, exist_ok=True)
+        if platform.system() != "Windows":
+            os.chmod(self.temp_root, 0o700)
+
+        # Copies laissées par une session interrompue
+        self._purge_directory()
+
+    def _purge_directory(self):
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.temp_root):
+            path = os.path.join(self.temp_root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _key(source_path: str, display_name: str) -> str:
+        return hashlib.sha256(f"{source_path}\0{display_name}".encode()).hexdigest()[:24]
+
+    def acquire(self, source_path: str, display_name: str,
+                materialize: Callable[[str], object],
+                source_version: Optional[object] = None) -> str:
+        """
+        Obtenir une copie en clair de `source_path` nommée `display_name`
+
+        Une copie encore présente et à jour est réutilisée, sinon
+        `materialize(dest)` est appelé pour la produire. Dans les deux cas
+        l'échéance est repoussée de `ttl` secondes.
+
+        Args:
+            source_version: Version de la source si ce n'est pas un fichier
+                            (blob empaqueté); par défaut sa date de modification
+
+        Returns:
+            Chemin de la copie temporaire
+        """
+        key = self._key(source_path, display_name)
+        source_mtime = os.path.getmtime(source_path) if source_version is None else source_version
+
+        with self._cond:
+            # Vérifier et repousser l'échéance sous le même verrou: le
+            # planificateur ne peut pas supprimer la copie entre les deux
+            entry = self._entries.get(key)
+            if entry and entry[1] == source_mtime and os.path.exists(entry[0]):
+                self._schedule(key, entry[0], source_mtime)
+                print(f"♻️ Copie temporaire réutilisée: {display_name}")
+                return entry[0]
+
+        # Un sous-dossier par document: deux fichiers homonymes ne se chevauchent pas
+        entry_dir = os.path.join(self.temp_root, key)
+        os.makedirs(entry_dir, exist_ok=True)
+        temp_path = os.path.join(entry_dir, display_name)
+        part_path = f"{temp_path}.{threading.get_ident()}.part"
+        try:
+            materialize(part_path)
+            if platform.system() != "Windows":
+                os.chmod(part_path, 0o600)
+            os.replace(part_path, temp_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+        with self._cond:
+            self._schedule(key, temp_path, source_mtime)
+        return temp_path
+
+    def _schedule(self, key: str, temp_path: str, source_mtime: float):
+        """Programmer (ou repousser) l'expiration d'une copie; verrou déjà acquis"""
+        deadline = time.monotonic() + self.ttl
+        self._entries[key] = (temp_path, source_mtime, deadline)
+        heapq.heappush(self._heap, (deadline, key))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="temp-reaper", daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def _run(self):
+        """Thread planificateur unique: dort jusqu'à la prochaine échéance"""
+        with self._cond:
+            while not self._closed:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                deadline, key = self._heap[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+
+                heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry[2] != deadline:
+                    continue  # échéance repoussée par une réouverture
+
+                if self._remove(entry[0]):
+                    del self._entries[key]
+                else:
+                    # Encore verrouillé par l'application (Windows): réessayer plus tard
+                    retry = time.monotonic() + self.ttl
+                    self._entries[key] = (entry[0], entry[1], retry)
+                    heapq.heappush(self._heap, (retry, key))
+
+    @staticmethod
+    def _remove(temp_path: str) -> bool:
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+                print(f"🧹 Fichier temporaire supprimé: {os.path.basename(temp_path)}")
+            os.rmdir(os.path.dirname(temp_path))
+            return True
+        except OSError:
+            return not os.path.exists(temp_path)
+
+    def close(self):
+        """Arrêter le planificateur et supprimer toutes les copies restantes"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._heap.clear()
+
+        for temp_path, _, _ in entries:
+            self._remove(temp_path)
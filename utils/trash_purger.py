@@ -0,0 +1,102 @@
+# utils/trash_purger.py
+"""
+Purge de la corbeille en arrière-plan
+
+Supprimer un dossier ou un fichier ne fait que le marquer (deleted_at), si
+bien que l'interface ne se fige pas, même pour un dossier de plusieurs
+dizaines de milliers de fichiers, et que l'élément reste restaurable à sa
+place (Database.restore_folder, restore_file). Une fois le délai de
+conservation écoulé, ce thread efface les lignes par lots via le thread
+écrivain, puis supprime du disque et des métadonnées les blobs qu'aucun
+fichier ne référence plus. Une pause entre deux lots laisse
+passer les autres écritures et borne les entrées/sorties.
+
+Les packs de petits blobs dont la majeure partie est devenue de l'espace
+mort sont ensuite compactés (PackStore.compact).
+"""
+
+import threading
+from typing import Optional
+
+# Délai pendant lequel un élément mis à la corbeille peut être restauré
+TRASH_RETENTION_DAYS = 7
+
+
+class TrashPurger:
+    """Thread d'effacement définitif des éléments mis à la corbeille"""
+
+    def __init__(self, file_handler, db,
+                 batch_size: int = 200,
+                 pause: float = 0.05,
+                 idle_interval: float = 300.0,
+                 retention_days: float = TRASH_RETENTION_DAYS):
+        self.file_handler = file_handler
+        self.db = db
+        self.batch_size = batch_size
+        self.pause = pause
+        self.idle_interval = idle_interval
+        self.retention_days = retention_days
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trash-purger", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Signaler une mise à la corbeille"""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def join(self, timeout: Optional[float] = None):
+        """Attendre la fin du thread après stop()"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                self.purge_pending()
+                self._compact_packs()
+
+                self._wake.wait(self.idle_interval)
+                self._wake.clear()
+        except Exception as e:
+            print(f"❌ Erreur de la purge de la corbeille: {e}")
+        finally:
+            self.db.release_connection()
+
+    def purge_pending(self) -> int:
+        """Effacer lot par lot les éléments expirés; retourne le nombre de blobs supprimés du disque"""
+        purged = 0
+        removed = 0
+        while not self._stop.is_set():
+            count, filepaths = self.db.purge_trash_batch(self.batch_size, self.retention_days)
+            if count == 0:
+                break
+            purged += count
+            removed += self._remove_blobs(filepaths)
+            self._stop.wait(self.pause)
+
+        if purged:
+            print(f"🗑️ Corbeille purgée: {purged} élément(s), {removed} fichier(s) supprimé(s) du disque")
+        return removed
+
+    def _compact_packs(self):
+        try:
+            self.file_handler.packs.compact()
+        except Exception as e:
+            print(f"⚠️ Compactage des packs impossible: {e}")
+
+    def _remove_blobs(self, filepaths) -> int:
+        # Un contenu identique a pu être réimporté depuis le lot: son blob
+        # est de nouveau référencé et doit rester. La vérification et la
+        # suppression passent par le thread écrivain pour qu'un import ne
+        # reprenne pas le blob entre les deux
+        return self.db.remove_unreferenced_blobs(filepaths, self.file_handler.delete_files)